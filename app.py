@@ -1,20 +1,22 @@
 import streamlit as st
 import psycopg2
 import pandas as pd
-import plotly.express as px
-import plotly.graph_objects as go
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, time
 import sys
 import os
 import hashlib
+from contextlib import contextmanager
 
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
-try:
-    from optimizer import ExamScheduler
-except ImportError:
-    st.error("Impossible d'importer optimizer.py")
-    ExamScheduler = None
+from snapshot import ScheduleSnapshot, schedule_version
+from versions import ensure_schema, rollback_publication
+import validator
+from cache_bus import CacheBus
+from queries import student_queries, student_tags, professor_queries, department_queries
+
+# plotly, optimizer (numpy, multiprocessing) et export (openpyxl) sont importés
+# par les vues qui s'en servent: la connexion et la vue étudiant n'en ont pas besoin
 
 st.set_page_config(
     page_title="ExamPro - Gestion des Examens",
@@ -30,6 +32,22 @@ DB_CONFIG = {
         'host': 'localhost',
         'port': '5432'
     }
+
+# Réplicas en lecture seule pour les vues (DSN libpq séparés par des ';'),
+# ex. EXAMENS_REPLICAS="host=replica1 dbname=examens_db user=lecture;host=replica2 ..."
+REPLICA_DSNS = [dsn.strip() for dsn in os.environ.get('EXAMENS_REPLICAS', '').split(';') if dsn.strip()]
+
+# Libellés des étapes de génération (progression)
+GENERATION_STEPS = {
+    'chargement': "Chargement des données",
+    'placement': "Placement des examens",
+    'amelioration': "Amélioration du planning (s)",
+    'ecriture': "Écriture des examens",
+    'validation': "Validation du planning",
+    'publication': "Publication",
+    'termine': "Terminé",
+}
+
 # FONCTIONS DE BASE DE DONNÉES
 @st.cache_resource
 def get_connection():
@@ -40,6 +58,20 @@ def get_connection():
         st.error(f"Erreur de connexion: {str(e)}")
         return None
 
+@contextmanager
+def dedicated_connection():
+    """Connexion propre à une opération
+    
+    La connexion de get_connection est partagée par toutes les sessions:
+    une opération qui change l'isolation, valide ou annule sa transaction
+    (snapshot, validation, notifications) ne doit pas y toucher.
+    """
+    conn = psycopg2.connect(**DB_CONFIG)
+    try:
+        yield conn
+    finally:
+        conn.close()
+
 def execute_query(query, params=None):
     """Exécute une requête SQL et retourne un DataFrame"""
     conn = get_connection()
@@ -52,12 +84,91 @@ def execute_query(query, params=None):
         st.error(f" Erreur SQL: {str(e)}")
         return pd.DataFrame()
 
+@st.cache_resource
+def get_data_access():
+    """Pool asynchrone partagé par les sessions (None sans psycopg 3)
+    
+    Les lectures des vues vont aux réplicas à jour; les écritures, l'authentification
+    et ExamScheduler restent sur le primaire (get_connection).
+    """
+    try:
+        from data_access import DataAccess
+    except ImportError:
+        return None
+    try:
+        data = DataAccess(DB_CONFIG, replicas=REPLICA_DSNS)
+        if REPLICA_DSNS:
+            # Une publication rend les réplicas suspects jusqu'à leur rejeu
+            get_cache_bus().subscribe(data.recheck)
+        return data
+    except Exception as e:
+        st.error(f"Erreur de connexion: {str(e)}")
+        return None
+
+def execute_queries(queries, raise_errors=False):
+    """Exécute des requêtes indépendantes en parallèle
+    
+    `queries` est {nom: (requête, params)}; retourne {nom: DataFrame}. Sans
+    pool asynchrone, les requêtes sont exécutées l'une après l'autre. Avec
+    `raise_errors`, une erreur est levée au lieu d'être affichée (résultats
+    destinés au cache).
+    """
+    data = get_data_access()
+    if data is None:
+        if raise_errors:
+            return {name: pd.read_sql_query(query, get_connection(), params=params)
+                    for name, (query, params) in queries.items()}
+        return {name: execute_query(query, params=params)
+                for name, (query, params) in queries.items()}
+    
+    results = data.fetch_many(queries)
+    for name, result in results.items():
+        if isinstance(result, Exception):
+            if raise_errors:
+                raise result
+            st.error(f" Erreur SQL: {str(result)}")
+            results[name] = pd.DataFrame()
+    return results
+
+@st.cache_resource
+def get_cache_bus():
+    """Cache invalidé par les publications des autres processus (un par processus)"""
+    return CacheBus(DB_CONFIG)
+
+@st.cache_resource
+def init_versions_schema():
+    """Tables de versions et de validations du planning (une fois par processus)"""
+    conn = get_connection()
+    if conn is not None:
+        ensure_schema(conn)
+        validator.ensure_schema(conn)
+    return True
+
+@st.cache_resource(max_entries=2)
+def load_snapshot(version):
+    """Charge le snapshot colonnaire d'une version du planning (une fois par version)"""
+    with dedicated_connection() as conn:
+        return ScheduleSnapshot.load(conn)
+
+def get_snapshot():
+    """Retourne le snapshot de la version courante du planning"""
+    conn = get_connection()
+    if conn is None:
+        return None
+    try:
+        # Sans écoute active, la version publiée est relue à chaque appel
+        return get_cache_bus().get(('snapshot',), lambda: load_snapshot(schedule_version(conn)))
+    except Exception as e:
+        st.error(f" Erreur SQL: {str(e)}")
+        return None
+
 def hash_password(password):
     """Hash le mot de passe"""
     return hashlib.sha256(password.encode()).hexdigest()
 
+@st.cache_resource
 def init_users_table():
-    """Initialise la table users si elle n'existe pas"""
+    """Initialise la table users si elle n'existe pas (une fois par processus)"""
     conn = get_connection()
     if conn:
         try:
@@ -74,6 +185,12 @@ def init_users_table():
                     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
                 )
             """)
+            # Tables créées par schema.sql sans les colonnes d'identité
+            cur.execute("""
+                ALTER TABLE users
+                    ADD COLUMN IF NOT EXISTS nom VARCHAR(100),
+                    ADD COLUMN IF NOT EXISTS prenom VARCHAR(100)
+            """)
             users_demo = [
                 ('admin', 'admin123', 'admin', None, 'Admin', 'Système'),
                 ('doyen', 'doyen123', 'doyen', None, 'Benali', 'Ahmed'),
@@ -91,241 +208,21 @@ def init_users_table():
             
             conn.commit()
             cur.close()
-        except Exception as e:
-            pass
+        except Exception:
+            conn.rollback()
+    return True
+
+STYLESHEET = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static', 'style.css')
+
+@st.cache_resource
+def read_stylesheet():
+    """Feuille de style lue une fois par processus"""
+    with open(STYLESHEET, encoding='utf-8') as f:
+        return f.read()
 
 def load_css():
-    st.markdown("""
-    <style>
-    @import url('https://fonts.googleapis.com/css2?family=Inter:wght@400;600;700;800&display=swap');
-    
-    * {
-        font-family: 'Inter', sans-serif;
-    }
-    
-    /* Variables */
-    :root {
-        --primary: #6366f1;
-        --secondary: #8b5cf6;
-        --accent: #ec4899;
-        --success: #10b981;
-        --warning: #f59e0b;
-        --danger: #ef4444;
-    }
-    
-    /* Header principal */
-    .main-header {
-        background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-        padding: 2rem;
-        border-radius: 15px;
-        color: white;
-        margin-bottom: 2rem;
-        box-shadow: 0 10px 30px rgba(0,0,0,0.1);
-        animation: slideDown 0.5s ease-out;
-    }
-    
-    .main-header h1 {
-        font-size: 2.5rem;
-        font-weight: 800;
-        margin: 0;
-        text-shadow: 2px 2px 4px rgba(0,0,0,0.2);
-    }
-    
-    .main-header p {
-        font-size: 1.1rem;
-        margin: 0.5rem 0 0 0;
-        opacity: 0.95;
-    }
-    
-    /* Cards statistiques */
-    .stat-card {
-        background: white;
-        border-radius: 15px;
-        padding: 1.5rem;
-        box-shadow: 0 4px 6px rgba(0,0,0,0.07);
-        border-left: 4px solid var(--primary);
-        transition: all 0.3s ease;
-        margin-bottom: 1rem;
-    }
-    
-    .stat-card:hover {
-        transform: translateY(-5px);
-        box-shadow: 0 12px 24px rgba(0,0,0,0.15);
-    }
-    
-    .stat-card h3 {
-        color: #64748b;
-        font-size: 0.85rem;
-        font-weight: 600;
-        margin: 0 0 0.5rem 0;
-        text-transform: uppercase;
-        letter-spacing: 0.5px;
-    }
-    
-    .stat-card .stat-value {
-        font-size: 2.5rem;
-        font-weight: 800;
-        background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-        -webkit-background-clip: text;
-        -webkit-text-fill-color: transparent;
-        margin: 0;
-        line-height: 1;
-    }
-    
-    /* Page de connexion */
-    .login-container {
-        max-width: 450px;
-        margin: 5rem auto;
-        padding: 3rem;
-        background: white;
-        border-radius: 20px;
-        box-shadow: 0 20px 60px rgba(0,0,0,0.15);
-    }
-    
-    .login-header {
-        text-align: center;
-        margin-bottom: 2rem;
-    }
-    
-    .login-header h1 {
-        background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-        -webkit-background-clip: text;
-        -webkit-text-fill-color: transparent;
-        font-size: 2.5rem;
-        font-weight: 800;
-        margin: 0;
-    }
-    
-    .login-header p {
-        color: #64748b;
-        margin-top: 0.5rem;
-        font-size: 0.95rem;
-    }
-    
-    /* Boutons */
-    .stButton>button {
-        background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-        color: white !important;
-        border: none;
-        border-radius: 10px;
-        padding: 0.75rem 2rem;
-        font-weight: 600;
-        transition: all 0.3s;
-        box-shadow: 0 4px 15px rgba(102, 126, 234, 0.4);
-        width: 100%;
-    }
-    
-    .stButton>button:hover {
-        transform: translateY(-2px);
-        box-shadow: 0 6px 20px rgba(102, 126, 234, 0.6);
-    }
-    
-    /* Sidebar */
-    [data-testid="stSidebar"] {
-        background: linear-gradient(180deg, #1e1b4b 0%, #312e81 100%);
-    }
-    
-    [data-testid="stSidebar"] * {
-        color: white !important;
-    }
-    
-    /* Inputs */
-    .stTextInput>div>div>input {
-        border-radius: 10px;
-        border: 2px solid #e2e8f0;
-        padding: 0.75rem;
-        transition: all 0.3s;
-    }
-    
-    .stTextInput>div>div>input:focus {
-        border-color: #6366f1;
-        box-shadow: 0 0 0 3px rgba(99, 102, 241, 0.1);
-    }
-    
-    /* Selectbox */
-    .stSelectbox>div>div {
-        border-radius: 10px;
-    }
-    
-    /* Animations */
-    @keyframes fadeIn {
-        from {
-            opacity: 0;
-            transform: translateY(20px);
-        }
-        to {
-            opacity: 1;
-            transform: translateY(0);
-        }
-    }
-    
-    @keyframes slideDown {
-        from {
-            opacity: 0;
-            transform: translateY(-30px);
-        }
-        to {
-            opacity: 1;
-            transform: translateY(0);
-        }
-    }
-    
-    .fade-in {
-        animation: fadeIn 0.5s ease-out;
-    }
-    
-    /* Dataframe */
-    .dataframe {
-        border-radius: 10px !important;
-        overflow: hidden;
-    }
-    
-    /* Tabs */
-    .stTabs [data-baseweb="tab-list"] {
-        gap: 8px;
-    }
-    
-    .stTabs [data-baseweb="tab"] {
-        border-radius: 10px 10px 0 0;
-        padding: 10px 20px;
-        background-color: #f1f5f9;
-        font-weight: 600;
-    }
-    
-    .stTabs [aria-selected="true"] {
-        background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-        color: white !important;
-    }
-    
-    /* Expander */
-    .streamlit-expanderHeader {
-        border-radius: 10px;
-        background-color: #f8fafc;
-        font-weight: 600;
-    }
-    
-    /* Metric cards */
-    [data-testid="stMetricValue"] {
-        font-size: 2rem;
-        font-weight: 800;
-        background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-        -webkit-background-clip: text;
-        -webkit-text-fill-color: transparent;
-    }
-    
-    /* Messages */
-    .stSuccess, .stError, .stWarning, .stInfo {
-        border-radius: 10px;
-        padding: 1rem;
-        border-left: 4px solid;
-    }
-    
-    /* Progress bar */
-    .stProgress > div > div {
-        background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-    }
-    </style>
-    """, unsafe_allow_html=True)
+    st.markdown(f"<style>{read_stylesheet()}</style>", unsafe_allow_html=True)
+
 # GESTION DE SESSION
 if 'logged_in' not in st.session_state:
     st.session_state.logged_in = False
@@ -436,23 +333,24 @@ def display_kpis():
     """Affiche les KPIs"""
     col1, col2, col3, col4 = st.columns(4)
     
-    queries = [
-        ("SELECT COUNT(*) FROM examens", "Total Examens"),
-        ("SELECT ROUND(CAST(AVG(nb_inscrits::NUMERIC / l.capacite_examen * 100) AS NUMERIC), 2) FROM examens e JOIN lieux_examen l ON e.lieu_id = l.id", " Taux Occupation"),
-        ("SELECT COUNT(*) FROM examens e1 JOIN examens e2 ON e1.date_examen = e2.date_examen AND e1.lieu_id = e2.lieu_id AND e1.id < e2.id", " Conflits"),
-        ("SELECT COUNT(DISTINCT professeur_id) FROM affectations_surveillance", " Professeurs")
+    snapshot = get_snapshot()
+    kpis = snapshot.kpis() if snapshot is not None else {}
+    
+    values = [
+        (kpis.get('total_examens', 0), "Total Examens"),
+        (kpis.get('taux_occupation', 0), " Taux Occupation"),
+        (kpis.get('conflits', 0), " Conflits"),
+        (kpis.get('professeurs', 0), " Professeurs")
     ]
     
-    for i, (query, label) in enumerate(queries):
-        result = execute_query(query)
-        if not result.empty:
-            value = result.iloc[0, 0] if result.iloc[0, 0] is not None else 0
-            if "Taux" in label:
-                value_str = f"{value}%"
-            else:
-                value_str = f"{int(value):,}"
+    for i, (value, label) in enumerate(values):
+        if "Taux" in label:
+            value_str = f"{value}%"
+        elif value is None:
+            # Planning publié pas encore validé
+            value_str = "—"
         else:
-            value_str = "0"
+            value_str = f"{int(value):,}"
         
         [col1, col2, col3, col4][i].markdown(f"""
         <div class="stat-card">
@@ -461,6 +359,79 @@ def display_kpis():
         </div>
         """, unsafe_allow_html=True)
 
+FEASIBILITY_BOUNDS = {
+    'clique': "Modules deux à deux en conflit",
+    'etudiant': "Examens d'un même étudiant (équité comprise)",
+    'salles': "Minutes de salles assez grandes",
+    'places': "Places x minutes",
+    'surveillants': "Surveillances (3 par jour et par professeur)",
+}
+
+
+def feasibility_panel(result):
+    """Fenêtre minimale estimée avant génération"""
+    col1, col2, col3 = st.columns(3)
+    col1.metric("Fenêtre minimale (jours)", result['jours_min'])
+    col2.metric("Jours disponibles", result['max_days'],
+                delta=result['max_days'] - result['jours_min'])
+    col3.metric("Examens max. / étudiant", result['max_examens_etudiant'])
+    
+    if result['jours_min'] > result['max_days']:
+        st.error(f" Fenêtre trop courte: au moins {result['jours_min']} jours sont nécessaires")
+    else:
+        st.success("Fenêtre compatible avec les bornes (la génération peut encore "
+                   "laisser des modules sans créneau)")
+    
+    st.dataframe(pd.DataFrame([
+        {'Borne': FEASIBILITY_BOUNDS[name], 'Jours min.': jours}
+        for name, jours in result['bornes'].items()
+    ]), use_container_width=True, hide_index=True)
+    if result['salles']:
+        salles = result['salles']
+        st.caption(f"Modules de {salles['seuil']} inscrits et plus: "
+                   f"{salles['minutes_demandees']} min pour {salles['salles']} salles "
+                   f"({salles['minutes_par_jour']} min / jour) • "
+                   f"plus grande clique: {', '.join(result['clique'])} • "
+                   f"calcul en {result['temps']}s")
+    
+    if result['modules_trop_grands']:
+        st.warning(f"{len(result['modules_trop_grands'])} modules dépassent la plus grande "
+                   f"salle ({result['capacite_max']} places)")
+        st.dataframe(pd.DataFrame(result['modules_trop_grands']), use_container_width=True,
+                     hide_index=True)
+    if result['modules_hors_grille']:
+        st.warning(f"{len(result['modules_hors_grille'])} modules trop longs pour la grille horaire")
+        st.dataframe(pd.DataFrame(result['modules_hors_grille']), use_container_width=True,
+                     hide_index=True)
+
+
+def notify_changes_panel(annee, session):
+    """Notifie les personnes touchées par la dernière publication (boîte d'envoi locale)"""
+    try:
+        from schedule_diff import notify_changes, CHANGE_LABELS
+    except ImportError:
+        st.error(" Module schedule_diff indisponible")
+        return
+    
+    try:
+        with dedicated_connection() as conn:
+            summary = notify_changes(conn, annee, session)
+    except Exception as e:
+        st.error(f" Notifications: {str(e)}")
+        return
+    if summary is None:
+        return
+    
+    col1, col2, col3 = st.columns(3)
+    col1.metric("Examens modifiés", summary['examens'])
+    col2.metric("Étudiants notifiés", summary['etudiants'])
+    col3.metric("Professeurs notifiés", summary['professeurs'])
+    if summary['changements']:
+        st.caption(" • ".join(f"{CHANGE_LABELS[change]}: {nb}"
+                              for change, nb in summary['changements'].items())
+                   + f" • boîte d'envoi: {summary['dossier']}")
+
+
 def admin_view():
     """Vue Administrateur"""
     st.markdown("## Administration des Examens")
@@ -470,127 +441,329 @@ def admin_view():
     with tab1:
         st.markdown("### Génération Automatique du Planning")
         
-        col1, col2, col3 = st.columns(3)
+        col1, col2, col3, col4 = st.columns(4)
         with col1:
             annee = st.text_input(" Année", "2024-2025")
         with col2:
             session = st.selectbox("Session", ["normale", "rattrapage"])
         with col3:
             start_date = st.date_input("Date début", datetime.now() + timedelta(days=30))
+        with col4:
+            max_days = st.number_input("Jours disponibles", min_value=1, max_value=120, value=45)
+        
+        with st.expander("Grille horaire"):
+            col1, col2, col3, col4 = st.columns(4)
+            with col1:
+                grid_start = st.time_input("Début journée", time(8, 0))
+            with col2:
+                grid_end = st.time_input("Fin journée", time(18, 0))
+            with col3:
+                grid_step = st.number_input("Pas (min)", min_value=5, max_value=120, value=30, step=5)
+            with col4:
+                grid_turnover = st.number_input("Battement (min)", min_value=0, max_value=120, value=30, step=5)
+            col1, col2 = st.columns(2)
+            with col1:
+                pause_start = st.time_input("Début pause", time(12, 30))
+            with col2:
+                pause_end = st.time_input("Fin pause", time(13, 30))
+        
+        with st.expander("Équité étudiants"):
+            col1, col2, col3 = st.columns(3)
+            with col1:
+                min_gap = st.number_input("Jours de repos min.", min_value=0, max_value=5, value=0)
+            with col2:
+                max_window = st.number_input("Max examens / 3 jours (0 = libre)", min_value=0, max_value=3, value=0)
+            with col3:
+                no_consecutive = st.checkbox("Formation: pas de jours consécutifs")
+            hard_constraints = st.multiselect(
+                "Contraintes dures (les autres sont pénalisées)",
+                ["min_gap", "max_window", "formation_consecutive"]
+            )
         
-        if st.button(" Générer", type="primary", use_container_width=True):
-            if ExamScheduler is None:
+        with st.expander("Recherche"):
+            time_budget = st.number_input(
+                "Budget de temps (s, 0 = un seul passage glouton)",
+                min_value=0, max_value=3600, value=0, step=30,
+                help="Le meilleur planning trouvé dans ce délai est publié. "
+                     "Une génération interrompue reprend sa recherche."
+            )
+        
+        def scheduling_options(DayGrid, FairnessPolicy):
+            day_grid = DayGrid(
+                start=grid_start,
+                end=grid_end,
+                breaks=((pause_start, pause_end),) if pause_start < pause_end else (),
+                granularity=int(grid_step),
+                turnover=int(grid_turnover)
+            )
+            fairness = FairnessPolicy(
+                min_gap_days=int(min_gap),
+                max_per_window=int(max_window) or None,
+                no_consecutive_formation=no_consecutive,
+                hard=hard_constraints
+            )
+            return day_grid, fairness
+        
+        col1, col2 = st.columns([1, 3])
+        with col1:
+            check = st.button("Vérifier la faisabilité", use_container_width=True)
+        with col2:
+            generate = st.button(" Générer", type="primary", use_container_width=True)
+        
+        if check:
+            try:
+                from optimizer import ExamScheduler, DayGrid, FairnessPolicy
+            except ImportError:
                 st.error(" Module optimizer indisponible")
                 return
             
-            with st.spinner("Génération en cours..."):
-                try:
-                    scheduler = ExamScheduler(DB_CONFIG)
-                    start_time = datetime.now()
-                    
-                    scheduled, conflicts = scheduler.generate_schedule(
-                        annee_academique=annee,
-                        session=session,
-                        start_date=start_date,
-                        max_days=45
-                    )
-                    
-                    end_time = datetime.now()
-                    execution_time = (end_time - start_time).total_seconds()
-                    
-                    stats = scheduler.get_statistics()
+            scheduler = None
+            try:
+                scheduler = ExamScheduler(DB_CONFIG)
+                day_grid, fairness = scheduling_options(DayGrid, FairnessPolicy)
+                with st.spinner("Calcul des bornes..."):
+                    result = scheduler.check_feasibility(annee, session, int(max_days),
+                                                         day_grid, fairness)
+                feasibility_panel(result)
+            except Exception as e:
+                st.error(f" {str(e)}")
+            finally:
+                if scheduler is not None:
                     scheduler.close()
-                    
+        
+        if generate:
+            try:
+                from optimizer import ExamScheduler, DayGrid, FairnessPolicy
+                from generation_lock import GenerationCoordinator, GenerationBusy
+            except ImportError:
+                st.error(" Module optimizer indisponible")
+                return
+            
+            progress_bar = st.progress(0.0, text="Génération en cours...")
+            
+            def show_progress(etape, fait, total):
+                progress_bar.progress(fait / total if total else 0.0,
+                                      text=f"{GENERATION_STEPS.get(etape, etape)} ({fait}/{total})")
+            
+            scheduler = None
+            try:
+                scheduler = ExamScheduler(DB_CONFIG)
+                start_time = datetime.now()
+                
+                day_grid, fairness = scheduling_options(DayGrid, FairnessPolicy)
+                job, conflicts, attached = GenerationCoordinator(DB_CONFIG).generate(
+                    scheduler,
+                    annee,
+                    session,
+                    on_progress=show_progress,
+                    start_date=start_date,
+                    max_days=int(max_days),
+                    day_grid=day_grid,
+                    workers=os.cpu_count() or 1,
+                    fairness=fairness,
+                    time_budget=int(time_budget) or None
+                )
+                progress_bar.empty()
+                
+                if job['statut'] != 'termine':
+                    st.error(f" Génération {job['id']} en échec: {job['erreur']}")
+                    return
+                
+                end_time = datetime.now()
+                execution_time = (end_time - start_time).total_seconds()
+                
+                stats = scheduler.get_statistics()
+                fairness_stats = scheduler.get_fairness_statistics()
+                
+                if attached:
+                    st.info(f"Génération identique déjà en cours (job {job['id']}): résultat repris")
+                else:
                     st.balloons()
-                    st.success(f"Planning généré en {execution_time:.2f}s!")
-                    
+                st.success(f"Planning généré en {execution_time:.2f}s "
+                           f"et publié (version {job['version_id']})")
+                if not attached:
+                    notify_changes_panel(annee, session)
+                
+                col1, col2, col3 = st.columns(3)
+                col1.metric("Planifiés", job['nb_planifies'])
+                col2.metric("Conflits", job['nb_conflits'])
+                col3.metric("Jours", stats.get('nb_jours', 0))
+                
+                if fairness_stats:
                     col1, col2, col3 = st.columns(3)
-                    col1.metric("Planifiés", scheduled)
-                    col2.metric("Conflits", len(conflicts))
-                    col3.metric("Jours", stats.get('nb_jours', 0))
-                    
-                    if conflicts:
-                        st.warning(f"{len(conflicts)} modules non planifiés")
-                        st.dataframe(pd.DataFrame(conflicts), use_container_width=True)
-                except Exception as e:
-                    st.error(f" {str(e)}")
+                    col1.metric("Écart min. moyen (jours)", fairness_stats['ecart_min_moyen'])
+                    col2.metric("Étudiants jours consécutifs", fairness_stats['etudiants_jours_consecutifs'])
+                    col3.metric("Max examens / 3 jours", fairness_stats['max_examens_3_jours'])
+                
+                if conflicts:
+                    st.warning(f"{len(conflicts)} modules non planifiés")
+                    st.dataframe(pd.DataFrame(conflicts), use_container_width=True)
+            except GenerationBusy as e:
+                progress_bar.empty()
+                st.warning(f" {str(e)}. Réessayez à la fin de cette génération.")
+            except Exception as e:
+                progress_bar.empty()
+                st.error(f" {str(e)}")
+            finally:
+                if scheduler is not None:
+                    scheduler.close()
+    
+    # Requêtes des onglets Conflits et Gestion, lancées ensemble
+    results = execute_queries({
+        'validations': (validator.LATEST_VALIDATIONS, None),
+        'violations': ("""
+            SELECT vv.contrainte, p.annee_academique, p.session, vv.date_examen,
+                m.code, m.nom as module, am.code as autre_module,
+                et.matricule as etudiant, pr.matricule as professeur, vv.detail
+            FROM validation_violations vv
+            JOIN validations v ON v.id = vv.validation_id
+            JOIN plannings_publies p ON p.version_id = v.version_id
+            LEFT JOIN examens e ON e.id = vv.examen_id
+            LEFT JOIN modules m ON m.id = e.module_id
+            LEFT JOIN examens ae ON ae.id = vv.autre_examen_id
+            LEFT JOIN modules am ON am.id = ae.module_id
+            LEFT JOIN etudiants et ON et.id = vv.etudiant_id
+            LEFT JOIN professeurs pr ON pr.id = vv.professeur_id
+            WHERE v.id = (SELECT MAX(id) FROM validations WHERE version_id = v.version_id)
+            ORDER BY vv.contrainte, vv.date_examen
+        """, None),
+        'examens': ("""
+            SELECT e.id, m.code, m.nom as module, f.nom as formation, e.date_examen,
+                e.heure_debut, l.nom as lieu, e.nb_inscrits
+            FROM examens_publies e
+            JOIN modules m ON e.module_id = m.id
+            JOIN formations f ON m.formation_id = f.id
+            JOIN lieux_examen l ON e.lieu_id = l.id
+            ORDER BY e.date_examen, e.heure_debut
+            LIMIT 100
+        """, None),
+        'versions': ("""
+            SELECT v.id, v.annee_academique, v.session, v.statut, v.nb_examens,
+                   v.created_at, v.published_at,
+                   (p.version_id IS NOT NULL) AS courante
+            FROM planning_versions v
+            LEFT JOIN plannings_publies p ON p.version_id = v.id
+            ORDER BY v.id DESC
+            LIMIT 20
+        """, None),
+    })
     
     with tab2:
         st.markdown("### Détection des Conflits")
         
-        # Conflits étudiants
-        st.markdown("#### Étudiants (plusieurs examens/jour)")
-        query = """
-            SELECT et.matricule, et.nom, et.prenom, e.date_examen, COUNT(e.id) as nb
-            FROM etudiants et
-            JOIN inscriptions i ON et.id = i.etudiant_id
-            JOIN examens e ON i.module_id = e.module_id
-            GROUP BY et.matricule, et.nom, et.prenom, e.date_examen
-            HAVING COUNT(e.id) > 1
-            LIMIT 50
-        """
-        df = execute_query(query)
-        if not df.empty:
-            st.error(f" {len(df)} conflits")
-            st.dataframe(df, use_container_width=True)
-        else:
-            st.success("Aucun conflit")
+        # Dernière validation de chaque planning publié (validator.py)
+        validations = results['validations']
+        if validations.empty:
+            st.info("Aucune validation: revalidez le planning publié")
+        for _, row in validations.iterrows():
+            st.markdown(f"#### {row['annee_academique']} - {row['session']} "
+                        f"(version {row['version_id']}, {row['nb_examens']} examens)")
+            counts = pd.DataFrame([
+                {'contrainte': label, 'violations': row['resultats'].get(name, 0)}
+                for name, label in validator.CONSTRAINTS.items()
+            ])
+            if row['nb_violations']:
+                st.error(f" {row['nb_violations']} violations")
+                st.dataframe(counts, use_container_width=True, hide_index=True)
+            else:
+                st.success("Aucun conflit")
         
-        # Salles surchargées
-        st.markdown("#### Salles surchargées")
-        query = """
-            SELECT l.nom, l.capacite_examen, e.nb_inscrits, e.date_examen, m.nom as module
-            FROM examens e
-            JOIN lieux_examen l ON e.lieu_id = l.id
-            JOIN modules m ON e.module_id = m.id
-            WHERE e.nb_inscrits > l.capacite_examen
-            LIMIT 50
-        """
-        df = execute_query(query)
+        df = results['violations']
         if not df.empty:
-            st.error(f"{len(df)} salles")
+            st.markdown(f"#### Détail (premières {validator.MAX_DETAILS} par contrainte)")
             st.dataframe(df, use_container_width=True)
-        else:
-            st.success(" Aucune salle surchargée")
+        
+        if st.button("Revalider le planning publié", use_container_width=True):
+            with st.spinner("Validation en cours..."):
+                try:
+                    with dedicated_connection() as conn:
+                        revalidated = validator.validate_published(conn)
+                    for result in revalidated:
+                        st.success(f"Version {result['version_id']}: "
+                                   f"{result['nb_violations']} violations ({result['duree']}s)")
+                except Exception as e:
+                    st.error(f" {str(e)}")
     
     with tab3:
         st.markdown("### Liste des Examens")
-        query = """
-            SELECT e.id, m.code, m.nom as module, f.nom as formation, e.date_examen,
-                e.heure_debut, l.nom as lieu, e.nb_inscrits
-            FROM examens e
-            JOIN modules m ON e.module_id = m.id
-            JOIN formations f ON m.formation_id = f.id
-            JOIN lieux_examen l ON e.lieu_id = l.id
-            ORDER BY e.date_examen, e.heure_debut
-            LIMIT 100
-        """
-        df = execute_query(query)
+        df = results['examens']
         if not df.empty:
             st.dataframe(df, use_container_width=True)
         else:
             st.info("Aucun examen")
 
+        st.markdown("### Versions Publiées")
+        versions = results['versions']
+        if not versions.empty:
+            st.dataframe(versions, use_container_width=True)
+        else:
+            st.info("Aucune version")
+
+        col1, col2, col3 = st.columns([2, 2, 1])
+        with col1:
+            version_annee = st.text_input("Année", "2024-2025", key="version_annee")
+        with col2:
+            version_session = st.selectbox("Session", ["normale", "rattrapage"], key="version_session")
+        with col3:
+            st.markdown("<br>", unsafe_allow_html=True)
+            if st.button("Revenir à la version précédente", use_container_width=True):
+                try:
+                    with dedicated_connection() as conn:
+                        version_id = rollback_publication(conn, version_annee, version_session)
+                except Exception as e:
+                    st.error(f" Retour arrière: {str(e)}")
+                else:
+                    if version_id is None:
+                        st.warning("Aucune version précédente")
+                    else:
+                        st.success(f"Version {version_id} republiée")
+                        notify_changes_panel(version_annee, version_session)
+
+        st.markdown("### Export de la Session")
+        col1, col2 = st.columns(2)
+        with col1:
+            export_annee = st.text_input("Année", "2024-2025", key="export_annee")
+        with col2:
+            export_session = st.selectbox("Session", ["normale", "rattrapage"], key="export_session")
+
+        if st.button("Exporter (XLSX, Parquet, iCalendar)", use_container_width=True):
+            try:
+                from export import ScheduleExporter
+            except ImportError:
+                st.error(" Module export indisponible")
+                return
+
+            with st.spinner("Export en cours..."):
+                try:
+                    exporter = ScheduleExporter(DB_CONFIG)
+                    try:
+                        result = exporter.export_session(export_annee, export_session)
+                    finally:
+                        exporter.close()
+
+                    st.success(f"Export terminé dans {result['dossier']}")
+                    col1, col2, col3 = st.columns(3)
+                    col1.metric("Examens", result['examens'])
+                    col2.metric("Étudiants", result['etudiants'])
+                    col3.metric("Professeurs", result['professeurs'])
+                except Exception as e:
+                    st.error(f" {str(e)}")
+
 def doyen_view():
     """Vue Doyen"""
+    import plotly.express as px
+    
     st.markdown("## Tableau de Bord Stratégique")
     
     display_kpis()
     
     col1, col2 = st.columns(2)
     
+    snapshot = get_snapshot()
+    
     with col1:
         st.markdown("### Examens par Département")
-        query = """
-            SELECT d.nom, COUNT(e.id) as nb
-            FROM examens e
-            JOIN modules m ON e.module_id = m.id
-            JOIN formations f ON m.formation_id = f.id
-            JOIN departements d ON f.dept_id = d.id
-            GROUP BY d.nom
-            ORDER BY nb DESC
-        """
-        df = execute_query(query)
+        df = snapshot.exams_by_department() if snapshot is not None else pd.DataFrame()
         if not df.empty:
             fig = px.bar(df, x='nom', y='nb', color='nb', color_continuous_scale='Viridis')
             fig.update_layout(showlegend=False, xaxis_title="", yaxis_title="Nombre")
@@ -600,28 +773,149 @@ def doyen_view():
     
     with col2:
         st.markdown("### Occupation Amphithéâtres")
-        query = """
-            SELECT l.nom, ROUND(CAST(AVG(e.nb_inscrits::NUMERIC / l.capacite_examen * 100) AS NUMERIC), 2) as taux
-            FROM lieux_examen l
-            LEFT JOIN examens e ON l.id = e.lieu_id
-            WHERE l.type = 'amphitheatre'
-            GROUP BY l.nom
-            HAVING COUNT(e.id) > 0
-        """
-        df = execute_query(query)
+        df = snapshot.amphi_occupation() if snapshot is not None else pd.DataFrame()
         if not df.empty:
             fig = px.bar(df, x='nom', y='taux', color='taux', color_continuous_scale='RdYlGn')
             fig.update_layout(showlegend=False, xaxis_title="", yaxis_title="Taux (%)")
             st.plotly_chart(fig, use_container_width=True)
         else:
             st.info("Aucune donnée")
+    
+    utilization_panel(snapshot)
+    simulation_panel()
+
+def utilization_panel(snapshot):
+    """Heatmap d'utilisation des salles, goulots et salles inutilisées"""
+    import plotly.express as px
+    
+    st.markdown("### Utilisation des Salles")
+    if snapshot is None or snapshot.empty:
+        st.info("Générez le planning")
+        return
+    
+    by = st.radio("Lignes", ["Salles", "Créneaux"], horizontal=True, key="heatmap_by")
+    df = snapshot.utilization_heatmap('lieu' if by == "Salles" else 'creneau')
+    fig = px.imshow(df, aspect='auto', color_continuous_scale='YlOrRd', zmin=0, zmax=100,
+                    labels={'x': "Jour", 'y': "", 'color': "Occupation (%)"})
+    fig.update_layout(height=max(400, 12 * len(df)))
+    st.plotly_chart(fig, use_container_width=True)
+    
+    st.markdown("#### Capacité par type de lieu")
+    st.dataframe(snapshot.capacity_summary(), use_container_width=True, hide_index=True)
+    
+    col1, col2 = st.columns(2)
+    with col1:
+        st.markdown("#### Salles goulots (≥ 80 % du temps)")
+        df = snapshot.bottleneck_rooms()
+        if not df.empty:
+            st.dataframe(df, use_container_width=True, hide_index=True)
+        else:
+            st.success("Aucune salle saturée")
+    with col2:
+        st.markdown("#### Salles de 20 places inutilisées (< 20 %)")
+        df = snapshot.idle_rooms()
+        if not df.empty:
+            st.warning(f"{len(df)} salles, {df['temps_mort_h'].sum():.0f} h de temps mort")
+            st.dataframe(df, use_container_width=True, hide_index=True)
+        else:
+            st.success("Petites salles utilisées")
+
+def simulation_panel():
+    """Comparaison de scénarios what-if, sans toucher au planning publié"""
+    st.markdown("### Simulation de Scénarios")
+    
+    with st.expander("Comparer des hypothèses de capacité"):
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            annee = st.text_input("Année", "2024-2025", key="sim_annee")
+        with col2:
+            session = st.selectbox("Session", ["normale", "rattrapage"], key="sim_session")
+        with col3:
+            base_days = st.number_input("Fenêtre de référence (jours)", min_value=5,
+                                        max_value=90, value=45, key="sim_base_days")
+        
+        results = execute_queries({
+            'rooms': ("SELECT id, nom FROM lieux_examen WHERE disponible = TRUE ORDER BY nom", None),
+            'formations': ("SELECT id, niveau FROM formations", None),
+        })
+        rooms, formations = results['rooms'], results['formations']
+        
+        col1, col2, col3, col4 = st.columns(4)
+        with col1:
+            closed = st.multiselect("Salles fermées", rooms['nom'].tolist() if not rooms.empty else [])
+        with col2:
+            days = st.number_input("Fenêtre alternative (jours)", min_value=5, max_value=90,
+                                   value=int(base_days), key="sim_days")
+        with col3:
+            niveaux = sorted(formations['niveau'].dropna().unique()) if not formations.empty else []
+            niveau = st.selectbox("Niveau", niveaux, key="sim_niveau")
+        with col4:
+            extra = st.number_input("Étudiants supplémentaires", min_value=0, value=0,
+                                    step=100, key="sim_extra")
+        
+        if not st.button("Simuler", use_container_width=True):
+            return
+        try:
+            from optimizer import ExamScheduler, Scenario
+        except ImportError:
+            st.error(" Module optimizer indisponible")
+            return
+        
+        # Un scénario par levier, plus leur combinaison
+        levers = {}
+        if closed:
+            levers['closed_rooms'] = rooms.loc[rooms['nom'].isin(closed), 'id'].tolist()
+        if days != base_days:
+            levers['max_days'] = int(days)
+        if extra and niveau is not None:
+            ids = formations.loc[formations['niveau'] == niveau, 'id'].tolist()
+            levers['extra_students'] = {
+                formation_id: extra // len(ids) + (i < extra % len(ids))
+                for i, formation_id in enumerate(ids)
+            }
+        
+        labels = {
+            'closed_rooms': f"{len(closed)} salle(s) fermée(s)",
+            'max_days': f"Fenêtre {days} j",
+            'extra_students': f"+{extra} étudiants {niveau}",
+        }
+        scenarios = [Scenario("Référence")]
+        scenarios += [Scenario(labels[name], **{name: value}) for name, value in levers.items()]
+        if len(levers) > 1:
+            scenarios.append(Scenario("Combiné", **levers))
+        
+        with st.spinner(f"Simulation de {len(scenarios)} scénario(s)..."):
+            try:
+                scheduler = ExamScheduler(DB_CONFIG)
+                results = scheduler.simulate_many(scenarios, annee, session,
+                                                  max_days=int(base_days))
+                scheduler.close()
+            except Exception as e:
+                st.error(f" {str(e)}")
+                return
+        
+        import plotly.express as px
+        
+        df = pd.DataFrame(results).set_index('scenario')
+        st.dataframe(df.drop(columns=['modules_non_planifies']).T, use_container_width=True)
+        
+        fig = px.bar(df.reset_index(), x='scenario', y=['planifies', 'non_planifies', 'nb_jours'],
+                     barmode='group')
+        fig.update_layout(xaxis_title="", yaxis_title="", legend_title="")
+        st.plotly_chart(fig, use_container_width=True)
+        
+        for result in results:
+            if result['modules_non_planifies']:
+                st.warning(f"{result['scenario']}: {', '.join(result['modules_non_planifies'][:20])}")
 
 def chef_dept_view():
     """Vue Chef de Département"""
     st.markdown("## Gestion Départementale")
     
-    query_depts = "SELECT id, nom FROM departements ORDER BY nom"
-    depts = execute_query(query_depts)
+    # Étudiants de tous les départements avec la liste: une seule vague de requêtes
+    results = execute_queries(department_queries())
+    depts = results['depts']
+    etudiants = results['etudiants']
     
     if depts.empty:
         st.warning("Aucun département")
@@ -630,34 +924,25 @@ def chef_dept_view():
     dept_selected = st.selectbox("Département", depts['nom'].tolist())
     dept_id = int(depts[depts['nom'] == dept_selected]['id'].iloc[0])
     
+    snapshot = get_snapshot()
+    stats = snapshot.department_stats(dept_id) if snapshot is not None else {}
+    nb_etudiants = etudiants.loc[etudiants['dept_id'] == dept_id, 'nb'] if not etudiants.empty else []
+    
     col1, col2, col3, col4 = st.columns(4)
-    stats_queries = [
-        ("SELECT COUNT(DISTINCT e.id) FROM examens e JOIN modules m ON e.module_id = m.id JOIN formations f ON m.formation_id = f.id WHERE f.dept_id = %s", " Examens"),
-        ("SELECT COUNT(DISTINCT et.id) FROM etudiants et JOIN formations f ON et.formation_id = f.id WHERE f.dept_id = %s", " Étudiants"),
-        ("SELECT COUNT(DISTINCT a.professeur_id) FROM affectations_surveillance a JOIN examens e ON a.examen_id = e.id JOIN modules m ON e.module_id = m.id JOIN formations f ON m.formation_id = f.id WHERE f.dept_id = %s", " Profs"),
-        ("SELECT COUNT(DISTINCT e.date_examen) FROM examens e JOIN modules m ON e.module_id = m.id JOIN formations f ON m.formation_id = f.id WHERE f.dept_id = %s", " Jours")
+    stats_values = [
+        (stats.get('examens', 0), " Examens"),
+        (int(nb_etudiants.iloc[0]) if len(nb_etudiants) else 0, " Étudiants"),
+        (stats.get('professeurs', 0), " Profs"),
+        (stats.get('jours', 0), " Jours")
     ]
     
-    for i, (query, label) in enumerate(stats_queries):
-        result = execute_query(query, params=(dept_id,))
-        value = result.iloc[0, 0] if not result.empty else 0
+    for i, (value, label) in enumerate(stats_values):
         [col1, col2, col3, col4][i].metric(label, f"{value:,}")
     
     st.markdown("---")
     st.markdown(f"### Planning - {dept_selected}")
     
-    query = """
-        SELECT f.nom as "Formation", m.nom as "Module", e.date_examen as "Date",
-            e.heure_debut as "Heure", e.duree_minutes as "Durée", 
-            l.nom as "Lieu", e.nb_inscrits as "Inscrits"
-        FROM examens e
-        JOIN modules m ON e.module_id = m.id
-        JOIN formations f ON m.formation_id = f.id
-        JOIN lieux_examen l ON e.lieu_id = l.id
-        WHERE f.dept_id = %s
-        ORDER BY e.date_examen, e.heure_debut
-    """
-    df = execute_query(query, params=(dept_id,))
+    df = snapshot.department_planning(dept_id) if snapshot is not None else pd.DataFrame()
     
     if not df.empty:
         df['Date'] = pd.to_datetime(df['Date']).dt.strftime('%d/%m/%Y')
@@ -675,28 +960,24 @@ def etudiant_view():
     matricule = st.text_input("Matricule", "ETU000001")
     
     if st.button("Rechercher", type="primary"):
-        query = """
-            SELECT et.nom, et.prenom, f.nom as formation, f.niveau
-            FROM etudiants et
-            JOIN formations f ON et.formation_id = f.id
-            WHERE et.matricule = %s
-        """
-        etudiant = execute_query(query, params=(matricule,))
+        # Identité et planning ne dépendent que du matricule: lancés ensemble
+        queries = student_queries(matricule)
+        # Invalidé quand le département de l'étudiant ou d'un de ses examens change
+        try:
+            results = get_cache_bus().get(
+                ('etudiant', matricule),
+                lambda: execute_queries(queries, raise_errors=True),
+                tags=student_tags
+            )
+        except Exception as e:
+            st.error(f" Erreur SQL: {str(e)}")
+            return
+        etudiant = results['etudiant']
         
         if not etudiant.empty:
             st.success(f" {etudiant['prenom'].iloc[0]} {etudiant['nom'].iloc[0]} - {etudiant['formation'].iloc[0]}")
             
-            query = """
-                SELECT m.nom, m.code, e.date_examen, e.heure_debut, e.duree_minutes, l.nom as lieu, l.batiment
-                FROM etudiants et
-                JOIN inscriptions i ON et.id = i.etudiant_id
-                JOIN modules m ON i.module_id = m.id
-                JOIN examens e ON m.id = e.module_id
-                JOIN lieux_examen l ON e.lieu_id = l.id
-                WHERE et.matricule = %s
-                ORDER BY e.date_examen, e.heure_debut
-            """
-            planning = execute_query(query, params=(matricule,))
+            planning = results['planning']
             
             if not planning.empty:
                 st.markdown("### Vos Examens")
@@ -718,30 +999,21 @@ def professeur_view():
     matricule = st.text_input("Matricule", "PROF0001")
     
     if st.button("Rechercher", type="primary"):
-        query = """
-            SELECT p.nom, p.prenom, d.nom as departement, p.grade
-            FROM professeurs p
-            JOIN departements d ON p.dept_id = d.id
-            WHERE p.matricule = %s
-        """
-        prof = execute_query(query, params=(matricule,))
+        queries = professor_queries(matricule)
+        # Les surveillances peuvent changer dans n'importe quel département:
+        # invalidé à chaque publication
+        try:
+            results = get_cache_bus().get(('professeur', matricule),
+                                          lambda: execute_queries(queries, raise_errors=True))
+        except Exception as e:
+            st.error(f" Erreur SQL: {str(e)}")
+            return
+        prof = results['prof']
         
         if not prof.empty:
             st.success(f" {prof['prenom'].iloc[0]} {prof['nom'].iloc[0]} - {prof['departement'].iloc[0]}")
             
-            query = """
-                SELECT e.date_examen, e.heure_debut, e.duree_minutes, m.nom as module,
-                    f.nom as formation, l.nom as lieu, a.role, e.nb_inscrits
-                FROM professeurs p
-                JOIN affectations_surveillance a ON p.id = a.professeur_id
-                JOIN examens e ON a.examen_id = e.id
-                JOIN modules m ON e.module_id = m.id
-                JOIN formations f ON m.formation_id = f.id
-                JOIN lieux_examen l ON e.lieu_id = l.id
-                WHERE p.matricule = %s
-                ORDER BY e.date_examen, e.heure_debut
-            """
-            surveillances = execute_query(query, params=(matricule,))
+            surveillances = results['surveillances']
             
             if not surveillances.empty:
                 st.markdown(f"### {len(surveillances)} Surveillances")
@@ -760,6 +1032,7 @@ def main():
     """Application principale"""
     load_css()
     init_users_table()
+    init_versions_schema()
     
     if not st.session_state.logged_in:
         login_page()
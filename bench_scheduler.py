@@ -0,0 +1,76 @@
+"""Mesure du placement glouton sur un problème synthétique (sans base)
+
+Usage: python bench_scheduler.py [nb_modules] [nb_etudiants] [nb_salles]
+"""
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+from domain import Module, Room
+from optimizer import DayGrid, ScheduleState, place_modules
+
+
+def synthetic_problem(nb_modules, nb_students, nb_rooms, seed=0):
+    """Formations de 6 à 10 modules, chaque étudiant suit sa formation"""
+    rng = np.random.default_rng(seed)
+    sizes = rng.integers(6, 11, size=nb_modules)
+    bounds = np.cumsum(sizes)
+    nb_formations = int(np.searchsorted(bounds, nb_modules))
+    formation_of = np.repeat(np.arange(nb_formations + 1), sizes[:nb_formations + 1])[:nb_modules]
+
+    student_formation = rng.integers(0, nb_formations + 1, size=nb_students)
+    module_student_idx = {}
+    for f in range(nb_formations + 1):
+        students = np.flatnonzero(student_formation == f).astype(np.int32)
+        for module_id in np.flatnonzero(formation_of == f).tolist():
+            module_student_idx[module_id] = students
+
+    modules = [
+        Module(module_id, f'M{module_id}', f'Module {module_id}', int(rng.choice([90, 120])),
+               int(formation_of[module_id]), int(formation_of[module_id]) % 7,
+               len(module_student_idx[module_id]))
+        for module_id in range(nb_modules)
+    ]
+    modules.sort(key=lambda m: m.nb_inscrits, reverse=True)
+
+    conflict_graph = {
+        m.id: set(np.flatnonzero(formation_of == formation_of[m.id]).tolist()) - {m.id}
+        for m in modules
+    }
+    capacities = rng.choice([20, 30, 40, 300], size=nb_rooms)
+    rooms = [Room(i, f'S{i}', int(c), 'salle') for i, c in enumerate(capacities)]
+    # Une salle assez grande pour le plus gros module
+    rooms.append(Room(nb_rooms, 'Amphi', max(m.nb_inscrits for m in modules), 'amphitheatre'))
+
+    return modules, conflict_graph, module_student_idx, rooms
+
+
+def main(nb_modules=2000, nb_students=30000, nb_rooms=120):
+    modules, graph, module_student_idx, rooms = synthetic_problem(nb_modules, nb_students, nb_rooms)
+    n_students = max(int(idx.max()) for idx in module_student_idx.values() if len(idx)) + 1
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    state = ScheduleState(list(range(45)), DayGrid(), rooms, graph, module_student_idx,
+                          n_students, [m.formation_id for m in modules])
+    setup = time.perf_counter() - start
+    _, setup_peak = tracemalloc.get_traced_memory()
+    tracemalloc.reset_peak()
+
+    start = time.perf_counter()
+    placements, unscheduled = place_modules(state, modules)
+    elapsed = time.perf_counter() - start
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    print(f"{len(modules)} modules, {n_students} étudiants, {len(rooms)} salles")
+    print(f"  état initial:  {setup:.3f}s, pic {setup_peak / 1024:.0f} Kio")
+    print(f"  placement:     {elapsed:.3f}s ({elapsed / len(modules) * 1e6:.0f} µs/module)")
+    print(f"  mémoire:       pic {peak / 1024:.0f} Kio, conservée {current / 1024:.0f} Kio")
+    print(f"  placés:        {len(placements)}/{len(modules)} ({len(unscheduled)} non planifiés)")
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:]))
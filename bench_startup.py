@@ -0,0 +1,64 @@
+"""Mesure du temps jusqu'au premier rendu de l'application Streamlit
+
+Chaque vue est exécutée dans un nouveau processus (imports à froid), puis
+relancée pour mesurer le coût d'un rerun.
+
+Usage: python bench_startup.py [nb_reruns] [chemin_app]
+"""
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+APP = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'app.py')
+
+VIEWS = {
+    'connexion': None,
+    'etudiant': {'id': 5, 'username': 'etu001', 'role': 'etudiant',
+                 'reference_id': None, 'nom': 'Benyahia', 'prenom': 'Amina'},
+}
+
+
+def measure(view, reruns, app):
+    """Premier rendu et reruns d'une vue, dans le processus courant"""
+    from streamlit.testing.v1 import AppTest
+
+    at = AppTest.from_file(app, default_timeout=120)
+    user = VIEWS[view]
+    if user is not None:
+        at.session_state['logged_in'] = True
+        at.session_state['user'] = user
+
+    start = time.perf_counter()
+    at.run()
+    first = time.perf_counter() - start
+    if at.exception:
+        raise RuntimeError(at.exception[0].message)
+
+    times = []
+    for _ in range(reruns):
+        start = time.perf_counter()
+        at.run()
+        times.append(time.perf_counter() - start)
+    modules = sorted(name for name in ('plotly.express', 'optimizer', 'openpyxl')
+                     if name in sys.modules)
+    return {'premier_rendu': first, 'rerun': statistics.median(times), 'modules': modules}
+
+
+def main(reruns=5, app=APP):
+    for view in VIEWS:
+        out = subprocess.run([sys.executable, __file__, '--view', view, str(reruns), app],
+                             capture_output=True, text=True, check=True)
+        result = json.loads(out.stdout.strip().splitlines()[-1])
+        print(f"{view:10s} premier rendu {result['premier_rendu'] * 1000:7.0f} ms  "
+              f"rerun {result['rerun'] * 1000:6.0f} ms  "
+              f"modules lourds: {', '.join(result['modules']) or 'aucun'}")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == '--view':
+        print(json.dumps(measure(sys.argv[2], int(sys.argv[3]), sys.argv[4])))
+    else:
+        main(*(int(arg) if i == 0 else arg for i, arg in enumerate(sys.argv[1:])))
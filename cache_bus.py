@@ -0,0 +1,129 @@
+"""Invalidation des caches applicatifs entre processus
+
+Chaque processus Streamlit écoute (LISTEN) les publications annoncées par
+versions.notify_publication et n'évince que les entrées concernées: celles
+étiquetées par un département modifié, et celles étiquetées PLANNING (qui
+dépendent de tout le planning). Les entrées peuvent donc vivre longtemps
+sans jamais servir un planning périmé.
+"""
+import json
+import select
+import threading
+import time
+from collections import OrderedDict
+
+import psycopg2
+
+from versions import PUBLICATION_CHANNEL
+
+# Étiquette des entrées invalidées par toute publication
+PLANNING = 'planning'
+
+
+def department_tag(dept_id):
+    return ('dept', int(dept_id))
+
+
+class CacheBus:
+    def __init__(self, db_config, ttl=24 * 3600, channel=PUBLICATION_CHANNEL,
+                 reconnect_delay=5, keepalive=60, max_entries=10000):
+        self.db_config = db_config
+        self.ttl = ttl
+        # Une entrée par étudiant / professeur consulté: au-delà, les moins
+        # récemment lues sont retirées
+        self.max_entries = max_entries
+        self.channel = channel
+        self.reconnect_delay = reconnect_delay
+        self.keepalive = keepalive
+        # clé -> (expiration, étiquettes, valeur), de la moins à la plus récemment lue
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        # Incrémenté à chaque invalidation, pour ne pas stocker une valeur
+        # chargée pendant une publication
+        self.generation = 0
+        self.last_publication = None
+        # Fonctions appelées avec la charge utile de chaque publication
+        self.subscribers = []
+        self.listening = threading.Event()
+        self.thread = threading.Thread(target=self._listen, daemon=True, name='cache-bus')
+        self.thread.start()
+        self.listening.wait(timeout=reconnect_delay)
+
+    def _listen(self):
+        while True:
+            conn = None
+            try:
+                conn = psycopg2.connect(**self.db_config)
+                conn.autocommit = True
+                cur = conn.cursor()
+                cur.execute(f"LISTEN {self.channel}")
+                # Des publications ont pu être manquées avant l'écoute
+                self.clear()
+                self.listening.set()
+
+                while True:
+                    if select.select([conn], [], [], self.keepalive) == ([], [], []):
+                        # Vérifie que la connexion est toujours vivante
+                        cur.execute("SELECT 1")
+                    conn.poll()
+                    while conn.notifies:
+                        self.evict(json.loads(conn.notifies.pop(0).payload))
+            except Exception as e:
+                self.listening.clear()
+                self.clear()
+                print(f"Écoute des publications interrompue: {e}")
+                time.sleep(self.reconnect_delay)
+            finally:
+                if conn is not None:
+                    conn.close()
+
+    def get(self, key, loader, tags=(PLANNING,), ttl=None):
+        """Valeur en cache, ou chargée par loader() et mise en cache
+
+        `tags` est un ensemble d'étiquettes (PLANNING, department_tag(id)),
+        ou une fonction de la valeur chargée qui les retourne. Tant que
+        l'écoute n'est pas active, rien n'est mis en cache.
+        """
+        now = time.monotonic()
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self.entries.move_to_end(key)
+                    return entry[2]
+                del self.entries[key]
+            generation = self.generation
+
+        value = loader()
+        if callable(tags):
+            tags = tags(value)
+
+        with self.lock:
+            if generation == self.generation and self.listening.is_set():
+                self.entries[key] = (now + (ttl or self.ttl), frozenset(tags), value)
+                self.entries.move_to_end(key)
+                while len(self.entries) > self.max_entries:
+                    self.entries.popitem(last=False)
+        return value
+
+    def evict(self, payload):
+        """Retire les entrées touchées par une publication"""
+        touched = {department_tag(dept_id) for dept_id in payload.get('departements', ())}
+        touched.add(PLANNING)
+        with self.lock:
+            self.generation += 1
+            self.last_publication = payload
+            stale = [key for key, (_, tags, _) in self.entries.items() if tags & touched]
+            for key in stale:
+                del self.entries[key]
+        for callback in self.subscribers:
+            callback(payload)
+        return len(stale)
+
+    def subscribe(self, callback):
+        self.subscribers.append(callback)
+
+    def clear(self):
+        with self.lock:
+            self.generation += 1
+            self.entries.clear()
@@ -0,0 +1,147 @@
+"""Accès asynchrone en lecture pour les tableaux de bord
+
+Les requêtes indépendantes d'une vue partent en même temps sur un pool
+psycopg 3 asynchrone: la latence de la page est celle de la requête la
+plus lente, pas leur somme. La boucle asyncio tourne dans un thread du
+processus, appelé depuis les scripts Streamlit (synchrones).
+
+Les lectures peuvent être routées vers des réplicas. Un réplica n'est
+utilisé que s'il répond et publie les mêmes versions de planning que le
+primaire; sinon la requête part sur le primaire. Les écritures n'utilisent
+pas ce module.
+"""
+import asyncio
+import threading
+import time
+
+import pandas as pd
+from psycopg import OperationalError
+from psycopg.conninfo import make_conninfo
+from psycopg_pool import AsyncConnectionPool, PoolTimeout
+
+PUBLISHED_VERSIONS = """
+    SELECT annee_academique, session, version_id
+    FROM plannings_publies
+    ORDER BY annee_academique, session
+"""
+
+
+class DataAccess:
+    def __init__(self, db_config, replicas=(), min_size=2, max_size=8, timeout=30,
+                 replica_timeout=2, check_interval=5):
+        self.timeout = timeout
+        self.replica_timeout = replica_timeout
+        # Délai entre deux vérifications des réplicas (forcée par recheck())
+        self.check_interval = check_interval
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, daemon=True,
+                                       name='data-access')
+        self.thread.start()
+        self.pool = self._call(self._open(make_conninfo('', **db_config), min_size, max_size))
+        # Un réplica arrêté ne doit pas bloquer le démarrage: ouverture sans attente
+        self.replicas = [self._call(self._open(dsn, 0, max_size, wait=False)) for dsn in replicas]
+        # Réplicas utilisables, vérifiés en tâche de fond: jamais d'attente
+        # d'un réplica arrêté sur le chemin d'une requête
+        self.healthy = []
+        self.next_check = 0
+        self.next_replica = 0
+        self.checking = None
+        # Incrémenté à chaque publication: une vérification commencée avant
+        # ne peut pas réhabiliter un réplica
+        self.generation = 0
+
+    def _call(self, coro):
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result(self.timeout)
+
+    async def _open(self, conninfo, min_size, max_size, wait=True):
+        # autocommit: chaque lecture est sa propre transaction, pas de connexion
+        # laissée "idle in transaction" dans le pool
+        pool = AsyncConnectionPool(conninfo, min_size=min_size, max_size=max_size,
+                                   kwargs={'autocommit': True}, open=False)
+        if wait:
+            await pool.open(wait=True, timeout=self.timeout)
+        else:
+            await pool.open()
+        return pool
+
+    async def _rows(self, pool, query, params, timeout):
+        async with pool.connection(timeout=timeout) as conn:
+            async with conn.cursor() as cur:
+                await cur.execute(query, params)
+                if cur.description is None:
+                    return [], []
+                return [column.name for column in cur.description], await cur.fetchall()
+
+    async def _check_replicas(self):
+        """Réplicas joignables et à jour des versions publiées du primaire"""
+        generation = self.generation
+        try:
+            _, primary = await self._rows(self.pool, PUBLISHED_VERSIONS, None, self.timeout)
+            versions = await asyncio.gather(
+                *(self._rows(pool, PUBLISHED_VERSIONS, None, self.replica_timeout)
+                  for pool in self.replicas),
+                return_exceptions=True
+            )
+        except Exception:
+            versions = ()
+        if generation == self.generation:
+            self.healthy = [pool for pool, version in zip(self.replicas, versions)
+                            if not isinstance(version, BaseException) and version[1] == primary]
+            self.next_check = time.monotonic() + self.check_interval
+        self.checking = None
+
+    async def _route(self):
+        """Pool de lecture: un réplica à jour (à tour de rôle), sinon le primaire"""
+        if not self.replicas:
+            return self.pool
+        if self.checking is None and time.monotonic() >= self.next_check:
+            self.checking = asyncio.ensure_future(self._check_replicas())
+        if not self.healthy:
+            return self.pool
+        self.next_replica += 1
+        return self.healthy[self.next_replica % len(self.healthy)]
+
+    async def _fetch(self, query, params):
+        pool = await self._route()
+        if pool is not self.pool:
+            try:
+                columns, rows = await self._rows(pool, query, params, self.replica_timeout)
+                return pd.DataFrame(rows, columns=columns)
+            except (OperationalError, PoolTimeout):
+                # Réplica arrêté ou requête annulée par le rejeu: écarté
+                # jusqu'à la prochaine vérification, lecture sur le primaire
+                if pool in self.healthy:
+                    self.healthy.remove(pool)
+        columns, rows = await self._rows(self.pool, query, params, self.timeout)
+        return pd.DataFrame(rows, columns=columns)
+
+    async def _gather(self, queries):
+        results = await asyncio.gather(
+            *(self._fetch(query, params) for query, params in queries.values()),
+            return_exceptions=True
+        )
+        return dict(zip(queries, results))
+
+    def fetch(self, query, params=None):
+        """Une requête, résultat en DataFrame"""
+        return self._call(self._fetch(query, params))
+
+    def fetch_many(self, queries):
+        """Requêtes indépendantes exécutées en parallèle
+
+        `queries` est {nom: (requête, params)}; retourne {nom: DataFrame}, ou
+        l'exception levée pour les requêtes en erreur (les autres aboutissent).
+        """
+        return self._call(self._gather(queries))
+
+    def recheck(self, payload=None):
+        """Après une publication: primaire seul jusqu'à la vérification suivante"""
+        self.generation += 1
+        self.healthy = []
+        self.next_check = 0
+
+    def close(self):
+        for pool in [self.pool] + self.replicas:
+            self._call(pool.close())
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
@@ -0,0 +1,75 @@
+# Note minimale pour valider un module (sur 20): en dessous, l'étudiant
+# passe le rattrapage
+NOTE_VALIDATION = 10
+
+
+class Module:
+    """Module à planifier (une ligne par module, chargée une fois)"""
+
+    __slots__ = ('id', 'code', 'nom', 'duree', 'formation_id', 'dept_id', 'nb_inscrits')
+
+    def __init__(self, id, code, nom, duree, formation_id, dept_id, nb_inscrits):
+        self.id = id
+        self.code = code
+        self.nom = nom
+        self.duree = duree
+        self.formation_id = formation_id
+        self.dept_id = dept_id
+        self.nb_inscrits = nb_inscrits
+
+    @property
+    def charge(self):
+        """Places x minutes, pour équilibrer les clusters"""
+        return self.duree * self.nb_inscrits
+
+    def __repr__(self):
+        return f"Module({self.id}, {self.code!r}, {self.nb_inscrits} inscrits)"
+
+
+class Room:
+    """Lieu d'examen disponible"""
+
+    __slots__ = ('id', 'nom', 'capacite', 'type')
+
+    def __init__(self, id, nom, capacite, type):
+        self.id = id
+        self.nom = nom
+        self.capacite = capacite
+        self.type = type
+
+    def __repr__(self):
+        return f"Room({self.id}, {self.nom!r}, {self.capacite})"
+
+
+class Professor:
+    """Professeur pouvant surveiller"""
+
+    __slots__ = ('id', 'dept_id')
+
+    def __init__(self, id, dept_id):
+        self.id = id
+        self.dept_id = dept_id
+
+    def __repr__(self):
+        return f"Professor({self.id}, dept={self.dept_id})"
+
+
+class Placement:
+    """Position d'un examen: indice du jour, début en minutes, salle"""
+
+    __slots__ = ('day', 'debut', 'room_id')
+
+    def __init__(self, day, debut, room_id):
+        self.day = day
+        self.debut = debut
+        self.room_id = room_id
+
+    def __eq__(self, other):
+        return (isinstance(other, Placement) and self.day == other.day
+                and self.debut == other.debut and self.room_id == other.room_id)
+
+    def __hash__(self):
+        return hash((self.day, self.debut, self.room_id))
+
+    def __repr__(self):
+        return f"Placement(jour={self.day}, debut={self.debut}, salle={self.room_id})"
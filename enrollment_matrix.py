@@ -0,0 +1,214 @@
+import os
+
+import numpy as np
+from numpy.lib.format import open_memmap
+
+# Nombre d'inscriptions lues par aller-retour sur le curseur serveur
+FETCH_SIZE = 100000
+# Nombre d'étudiants traités par bloc lors des produits creux
+BLOCK_STUDENTS = 100000
+
+FILES = ('csr_indptr', 'csr_indices', 'csc_indptr', 'csc_indices', 'module_ids', 'student_ids')
+
+
+class EnrollmentMatrix:
+    """Matrice d'inscriptions étudiants x modules, creuse et mappée en mémoire
+
+    Stockée au format CSR (lignes = étudiants) et CSC (lignes = modules)
+    dans des fichiers .npy ouverts en lecture seule avec mmap: les
+    processus workers partagent les mêmes pages sans copie. Les étudiants
+    sont indexés de 0 à n_students - 1 dans l'ordre de leur id.
+
+    `matrix[module_id]` retourne les indices des étudiants du module.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self._open()
+
+    def _open(self):
+        arrays = {
+            name: np.load(os.path.join(self.directory, f'{name}.npy'), mmap_mode='r')
+            for name in FILES
+        }
+        self.csr_indptr = arrays['csr_indptr']
+        self.csr_indices = arrays['csr_indices']
+        self.csc_indptr = arrays['csc_indptr']
+        self.csc_indices = arrays['csc_indices']
+        self.module_ids = np.asarray(arrays['module_ids'])
+        self.student_ids = arrays['student_ids']
+        self.module_index = {int(m): i for i, m in enumerate(self.module_ids)}
+
+    # Seul le chemin est transmis aux workers, qui rouvrent les fichiers
+    def __getstate__(self):
+        return {'directory': self.directory}
+
+    def __setstate__(self, state):
+        self.directory = state['directory']
+        self._open()
+
+    @property
+    def n_students(self):
+        return len(self.student_ids)
+
+    @property
+    def n_modules(self):
+        return len(self.module_ids)
+
+    def __getitem__(self, module_id):
+        i = self.module_index[module_id]
+        return self.csc_indices[self.csc_indptr[i]:self.csc_indptr[i + 1]]
+
+    def __contains__(self, module_id):
+        return module_id in self.module_index
+
+    def module_counts(self):
+        """Nombre d'inscrits par module (dans l'ordre de module_ids)"""
+        return np.diff(self.csc_indptr)
+
+    def modules_of(self, student_idx):
+        """Indices des modules d'un étudiant"""
+        return self.csr_indices[self.csr_indptr[student_idx]:self.csr_indptr[student_idx + 1]]
+
+    @classmethod
+    def exists(cls, directory):
+        return all(os.path.exists(os.path.join(directory, f'{name}.npy')) for name in FILES)
+
+    @classmethod
+    def build(cls, conn, directory, query, params, module_ids):
+        """Construit la matrice en flux depuis une requête (etudiant_id, module_id)
+
+        La requête doit être triée par etudiant_id. Les inscriptions sont
+        écrites par blocs sur disque; seul indptr (un entier par étudiant)
+        est gardé en mémoire pendant la lecture.
+        """
+        os.makedirs(directory, exist_ok=True)
+        module_ids = np.asarray(sorted(module_ids), dtype=np.int32)
+        n_modules = len(module_ids)
+
+        indices_path = os.path.join(directory, 'csr_indices.raw')
+        student_ids = []
+        row_lengths = []
+        module_totals = np.zeros(n_modules, dtype=np.int64)
+
+        cur = conn.cursor(name='enrollment_matrix')
+        cur.itersize = FETCH_SIZE
+        cur.execute(query, params)
+
+        with open(indices_path, 'wb') as raw:
+            while True:
+                rows = cur.fetchmany(FETCH_SIZE)
+                if not rows:
+                    break
+                chunk = np.asarray(rows, dtype=np.int64)
+                etudiants = chunk[:, 0]
+                modules = np.searchsorted(module_ids, chunk[:, 1]).astype(np.int32)
+
+                # Nouvelles lignes (le flux est trié par étudiant)
+                boundaries = np.flatnonzero(np.diff(etudiants)) + 1
+                starts = np.concatenate([[0], boundaries])
+                lengths = np.diff(np.concatenate([starts, [len(etudiants)]]))
+                if student_ids and student_ids[-1] == etudiants[0]:
+                    row_lengths[-1] += int(lengths[0])
+                    starts, lengths = starts[1:], lengths[1:]
+                student_ids.extend(etudiants[starts].tolist())
+                row_lengths.extend(lengths.tolist())
+
+                np.add.at(module_totals, modules, 1)
+                raw.write(modules.tobytes())
+        cur.close()
+
+        n_students = len(student_ids)
+        nnz = int(sum(row_lengths))
+
+        csr_indptr = np.zeros(n_students + 1, dtype=np.int64)
+        np.cumsum(row_lengths, out=csr_indptr[1:])
+        np.save(os.path.join(directory, 'csr_indptr.npy'), csr_indptr)
+        np.save(os.path.join(directory, 'student_ids.npy'), np.asarray(student_ids, dtype=np.int32))
+        np.save(os.path.join(directory, 'module_ids.npy'), module_ids)
+
+        csr_indices = open_memmap(os.path.join(directory, 'csr_indices.npy'), mode='w+',
+                                  dtype=np.int32, shape=(nnz,))
+        if nnz:
+            csr_indices[:] = np.memmap(indices_path, dtype=np.int32, mode='r', shape=(nnz,))
+        csr_indices.flush()
+        del csr_indices
+        os.remove(indices_path)
+
+        # Transposition par blocs d'étudiants vers le format CSC
+        csc_indptr = np.zeros(n_modules + 1, dtype=np.int64)
+        np.cumsum(module_totals, out=csc_indptr[1:])
+        np.save(os.path.join(directory, 'csc_indptr.npy'), csc_indptr)
+
+        csr_indices = np.load(os.path.join(directory, 'csr_indices.npy'), mmap_mode='r')
+        csc_indices = open_memmap(os.path.join(directory, 'csc_indices.npy'), mode='w+',
+                                  dtype=np.int32, shape=(nnz,))
+        next_slot = csc_indptr[:-1].copy()
+        for s0 in range(0, n_students, BLOCK_STUDENTS):
+            s1 = min(s0 + BLOCK_STUDENTS, n_students)
+            lo, hi = csr_indptr[s0], csr_indptr[s1]
+            modules = np.asarray(csr_indices[lo:hi])
+            etudiants = np.repeat(np.arange(s0, s1, dtype=np.int32), np.diff(csr_indptr[s0:s1 + 1]))
+
+            order = np.argsort(modules, kind='stable')
+            modules, etudiants = modules[order], etudiants[order]
+            group_start = np.searchsorted(modules, modules)
+            positions = next_slot[modules] + (np.arange(len(modules)) - group_start)
+            csc_indices[positions] = etudiants
+            next_slot += np.bincount(modules, minlength=n_modules)
+
+        csc_indices.flush()
+        del csc_indices, csr_indices
+
+        return cls(directory)
+
+    def overlap_counts(self, block_students=BLOCK_STUDENTS):
+        """Nombre d'étudiants communs à chaque paire de modules
+
+        Équivalent à la partie triangulaire supérieure de AᵀA, calculée par
+        blocs d'étudiants pour borner la mémoire. Retourne trois tableaux
+        (module_a, module_b, nb_etudiants) en indices de modules.
+        """
+        n_modules = self.n_modules
+        keys = np.zeros(0, dtype=np.int64)
+        counts = np.zeros(0, dtype=np.int64)
+
+        for s0 in range(0, self.n_students, block_students):
+            s1 = min(s0 + block_students, self.n_students)
+            indptr = np.asarray(self.csr_indptr[s0:s1 + 1])
+            indices = np.asarray(self.csr_indices[indptr[0]:indptr[-1]])
+            lengths = np.diff(indptr)
+            offsets = indptr[:-1] - indptr[0]
+
+            block_keys = []
+            # Les étudiants ayant le même nombre de modules forment une matrice dense
+            for k in np.unique(lengths):
+                if k < 2:
+                    continue
+                rows = offsets[lengths == k]
+                dense = indices[rows[:, None] + np.arange(k)]
+                a, b = np.triu_indices(k, 1)
+                lo = np.minimum(dense[:, a], dense[:, b]).astype(np.int64)
+                hi = np.maximum(dense[:, a], dense[:, b]).astype(np.int64)
+                block_keys.append((lo * n_modules + hi).ravel())
+
+            if not block_keys:
+                continue
+            block_unique, block_counts = np.unique(np.concatenate(block_keys), return_counts=True)
+
+            # Fusion avec les blocs précédents
+            merged = np.concatenate([keys, block_unique])
+            merged_counts = np.concatenate([counts, block_counts])
+            keys, inverse = np.unique(merged, return_inverse=True)
+            counts = np.bincount(inverse, weights=merged_counts).astype(np.int64)
+
+        return keys // n_modules, keys % n_modules, counts
+
+    def conflict_graph(self):
+        """Graphe des modules partageant au moins un étudiant (ids de modules)"""
+        graph = {int(m): set() for m in self.module_ids}
+        a, b, _ = self.overlap_counts()
+        for i, j in zip(self.module_ids[a].tolist(), self.module_ids[b].tolist()):
+            graph[i].add(j)
+            graph[j].add(i)
+        return graph
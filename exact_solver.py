@@ -0,0 +1,153 @@
+from datetime import datetime
+
+from domain import Placement
+
+try:
+    from ortools.sat.python import cp_model
+except ImportError:
+    cp_model = None
+
+MINUTES_PER_DAY = 24 * 60
+
+
+def objective_weights(nb_modules, nb_days):
+    """Poids lexicographiques: non planifiés > dernier jour > somme des jours"""
+    w_makespan = nb_modules * nb_days + 1
+    w_unscheduled = w_makespan * (nb_days + 1)
+    return w_unscheduled, w_makespan
+
+
+def evaluate_placements(modules, placements, nb_days):
+    """Objectif d'un planning existant, comparable à celui du modèle exact"""
+    w_unscheduled, w_makespan = objective_weights(len(modules), nb_days)
+    placed = [placements[m.id].day for m in modules if m.id in placements]
+    unscheduled = len(modules) - len(placed)
+    makespan = max((day + 1 for day in placed), default=0)
+    return w_unscheduled * unscheduled + w_makespan * makespan + sum(placed)
+
+
+def solve_exact(modules, conflict_graph, rooms, nb_professors, nb_days, grid,
+                warm_start=None, time_limit=60, nb_supervisors=2, workers=8):
+    """Résout l'affectation jour / heure / salle avec CP-SAT
+
+    modules: objets Module, rooms: objets Room
+    warm_start: {module_id: Placement}, typiquement le glouton
+
+    Contraintes: un examen par jour et par étudiant, pas de chevauchement
+    dans une salle (battement compris), au plus `nb_professors` surveillants
+    mobilisés simultanément et 3 surveillances par professeur et par jour.
+    """
+    if cp_model is None:
+        raise RuntimeError("OR-Tools n'est pas installé (pip install ortools)")
+
+    warm_start = warm_start or {}
+    model = cp_model.CpModel()
+    horizon = nb_days * MINUTES_PER_DAY
+
+    day, start, scheduled, choices = {}, {}, {}, {}
+    room_intervals = {room.id: [] for room in rooms}
+    time_intervals, day_intervals = [], []
+
+    for module in modules:
+        module_id, duree = module.id, module.duree
+        starts = grid.valid_starts(duree)
+        suitable = [room for room in rooms if room.capacite >= module.nb_inscrits]
+
+        day[module_id] = model.NewIntVar(0, nb_days - 1, f'jour_{module_id}')
+        start[module_id] = model.NewIntVarFromDomain(
+            cp_model.Domain.FromValues(starts or [grid.start]), f'debut_{module_id}')
+        scheduled[module_id] = model.NewBoolVar(f'planifie_{module_id}')
+        if not starts or not suitable:
+            model.Add(scheduled[module_id] == 0)
+
+        t = model.NewIntVar(0, horizon, f't_{module_id}')
+        model.Add(t == day[module_id] * MINUTES_PER_DAY + start[module_id])
+
+        choices[module_id] = {}
+        for room in suitable:
+            x = model.NewBoolVar(f'salle_{module_id}_{room.id}')
+            choices[module_id][room.id] = x
+            room_intervals[room.id].append(model.NewOptionalFixedSizeIntervalVar(
+                t, duree + grid.turnover, x, f'occ_{module_id}_{room.id}'))
+        model.Add(sum(choices[module_id].values()) == scheduled[module_id])
+
+        time_intervals.append(model.NewOptionalFixedSizeIntervalVar(
+            t, duree, scheduled[module_id], f'exam_{module_id}'))
+        day_intervals.append(model.NewOptionalFixedSizeIntervalVar(
+            day[module_id], 1, scheduled[module_id], f'jour_exam_{module_id}'))
+
+    for intervals in room_intervals.values():
+        if len(intervals) > 1:
+            model.AddNoOverlap(intervals)
+
+    # Un examen par jour et par étudiant
+    for module_id, neighbours in conflict_graph.items():
+        if module_id not in day:
+            continue
+        for other_id in neighbours:
+            if other_id in day and module_id < other_id:
+                model.Add(day[module_id] != day[other_id]).OnlyEnforceIf(
+                    [scheduled[module_id], scheduled[other_id]])
+
+    # Capacité de surveillance: simultanée et journalière (max 3 par prof)
+    demands = [nb_supervisors] * len(modules)
+    model.AddCumulative(time_intervals, demands, nb_professors)
+    model.AddCumulative(day_intervals, demands, 3 * nb_professors)
+
+    # Objectif lexicographique pondéré
+    w_unscheduled, w_makespan = objective_weights(len(modules), nb_days)
+    makespan = model.NewIntVar(0, nb_days, 'dernier_jour')
+    for module_id in day:
+        model.Add(makespan >= day[module_id] + 1).OnlyEnforceIf(scheduled[module_id])
+    model.Minimize(
+        w_unscheduled * sum(1 - s for s in scheduled.values())
+        + w_makespan * makespan
+        + sum(day.values())
+    )
+
+    # Démarrage à chaud depuis le planning glouton
+    for module_id, placement in warm_start.items():
+        if module_id not in day or placement.room_id not in choices[module_id]:
+            continue
+        model.AddHint(day[module_id], placement.day)
+        model.AddHint(start[module_id], placement.debut)
+        model.AddHint(scheduled[module_id], 1)
+        for other_room, x in choices[module_id].items():
+            model.AddHint(x, 1 if other_room == placement.room_id else 0)
+
+    solver = cp_model.CpSolver()
+    solver.parameters.max_time_in_seconds = time_limit
+    solver.parameters.num_search_workers = workers
+
+    start_time = datetime.now()
+    status = solver.Solve(model)
+    execution_time = (datetime.now() - start_time).total_seconds()
+
+    result = {
+        'statut': solver.StatusName(status),
+        'temps': round(execution_time, 2),
+        'objectif_glouton': evaluate_placements(modules, warm_start, nb_days) if warm_start else None,
+        'objectif': None,
+        'borne': None,
+        'gap': None,
+        'placements': {}
+    }
+
+    if status in (cp_model.OPTIMAL, cp_model.FEASIBLE):
+        objective = solver.ObjectiveValue()
+        bound = solver.BestObjectiveBound()
+        result['objectif'] = objective
+        result['borne'] = bound
+        result['gap'] = 0.0 if status == cp_model.OPTIMAL else round(
+            (objective - bound) / max(1.0, abs(objective)), 4)
+        result['nb_non_planifies'] = sum(1 for s in scheduled.values() if not solver.Value(s))
+        result['nb_jours'] = solver.Value(makespan)
+
+        for module_id in day:
+            if not solver.Value(scheduled[module_id]):
+                continue
+            room_id = next(r for r, x in choices[module_id].items() if solver.Value(x))
+            result['placements'][module_id] = Placement(
+                solver.Value(day[module_id]), solver.Value(start[module_id]), room_id)
+
+    return result
@@ -0,0 +1,370 @@
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from datetime import datetime, timedelta
+from itertools import groupby
+
+import psycopg2
+from openpyxl import Workbook
+
+from domain import NOTE_VALIDATION
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+# Nombre de lignes lues par aller-retour sur le curseur serveur
+CURSOR_ITERSIZE = 2000
+# Nombre d'entités (étudiants / professeurs) par tâche envoyée aux workers
+ICS_CHUNK_SIZE = 500
+# Nombre de lignes par row group Parquet
+PARQUET_BATCH_SIZE = 5000
+
+XLSX_HEADERS = [
+    'Formation', 'Niveau', 'Code', 'Module', 'Date', 'Heure', 'Durée (min)',
+    'Lieu', 'Bâtiment', 'Inscrits', 'Surveillants'
+]
+
+
+def safe_filename(value):
+    """Nettoie une valeur pour l'utiliser comme nom de fichier"""
+    return re.sub(r'[^A-Za-z0-9_.-]+', '_', str(value)).strip('_') or 'inconnu'
+
+
+def ics_escape(value):
+    """Échappe un texte selon la RFC 5545"""
+    return (str(value or '')
+            .replace('\\', '\\\\')
+            .replace(';', '\\;')
+            .replace(',', '\\,')
+            .replace('\n', '\\n'))
+
+
+def ics_fold(line):
+    """Replie une ligne iCalendar à 75 octets"""
+    encoded = line.encode('utf-8')
+    if len(encoded) <= 75:
+        return line
+
+    parts = []
+    current = ''
+    for char in line:
+        limit = 75 if not parts else 74
+        if len((current + char).encode('utf-8')) > limit:
+            parts.append(current)
+            current = char
+        else:
+            current += char
+    parts.append(current)
+    return '\r\n '.join(parts)
+
+
+def ics_event(uid, date_examen, heure_debut, duree, summary, location, description=''):
+    """Construit un VEVENT pour un examen"""
+    debut = datetime.combine(date_examen, heure_debut)
+    fin = debut + timedelta(minutes=duree)
+    stamp = datetime.utcnow().strftime('%Y%m%dT%H%M%SZ')
+
+    lines = [
+        'BEGIN:VEVENT',
+        f'UID:{uid}@exampro',
+        f'DTSTAMP:{stamp}',
+        f'DTSTART:{debut.strftime("%Y%m%dT%H%M%S")}',
+        f'DTEND:{fin.strftime("%Y%m%dT%H%M%S")}',
+        f'SUMMARY:{ics_escape(summary)}',
+        f'LOCATION:{ics_escape(location)}',
+    ]
+    if description:
+        lines.append(f'DESCRIPTION:{ics_escape(description)}')
+    lines.append('END:VEVENT')
+    return lines
+
+
+def ics_calendar(name, events):
+    """Assemble un calendrier complet à partir de listes de lignes VEVENT"""
+    lines = [
+        'BEGIN:VCALENDAR',
+        'VERSION:2.0',
+        'PRODID:-//ExamPro//Planning des examens//FR',
+        'CALSCALE:GREGORIAN',
+        f'X-WR-CALNAME:{ics_escape(name)}',
+    ]
+    for event in events:
+        lines.extend(event)
+    lines.append('END:VCALENDAR')
+    return '\r\n'.join(ics_fold(line) for line in lines) + '\r\n'
+
+
+def write_department_workbook(path, dept_nom, rows):
+    """Écrit le classeur XLSX d'un département (exécuté dans un worker)"""
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet(title=safe_filename(dept_nom)[:31])
+    ws.append(XLSX_HEADERS)
+
+    for row in rows:
+        (_, _, _, formation, niveau, module_code, module, _, date_examen,
+         heure_debut, duree, lieu, batiment, nb_inscrits, surveillants) = row
+        ws.append([formation, niveau, module_code, module, date_examen,
+                   heure_debut.strftime('%H:%M'), duree, lieu, batiment,
+                   nb_inscrits, surveillants])
+
+    wb.save(path)
+    return len(rows)
+
+
+def write_student_calendars(directory, students):
+    """Écrit les fichiers .ics d'un lot d'étudiants (exécuté dans un worker)"""
+    for matricule, nom, prenom, exams in students:
+        events = [
+            ics_event(f'examen-{examen_id}-{matricule}', date_examen, heure_debut, duree,
+                      f'Examen {module_nom}', f'{lieu} ({batiment})', module_code)
+            for examen_id, module_code, module_nom, date_examen, heure_debut, duree, lieu, batiment in exams
+        ]
+        path = os.path.join(directory, f'{safe_filename(matricule)}.ics')
+        with open(path, 'w', encoding='utf-8', newline='') as f:
+            f.write(ics_calendar(f'Examens - {prenom} {nom}', events))
+    return len(students)
+
+
+def write_professor_calendars(directory, professors):
+    """Écrit les fichiers .ics d'un lot de professeurs (exécuté dans un worker)"""
+    for matricule, nom, prenom, exams in professors:
+        events = [
+            ics_event(f'surveillance-{examen_id}-{matricule}', date_examen, heure_debut, duree,
+                      f'Surveillance {module_nom} ({role})', f'{lieu} ({batiment})',
+                      f'{module_code} - {nb_inscrits} inscrits')
+            for examen_id, module_code, module_nom, date_examen, heure_debut, duree, lieu, batiment, role, nb_inscrits in exams
+        ]
+        path = os.path.join(directory, f'{safe_filename(matricule)}.ics')
+        with open(path, 'w', encoding='utf-8', newline='') as f:
+            f.write(ics_calendar(f'Surveillances - {prenom} {nom}', events))
+    return len(professors)
+
+
+class ScheduleExporter:
+    def __init__(self, db_config, output_dir='exports', max_workers=None):
+        self.conn = psycopg2.connect(**db_config)
+        self.output_dir = output_dir
+        self.max_workers = max_workers or os.cpu_count() or 2
+        self._pending = set()
+
+    def _stream(self, name, query, params):
+        """Parcourt le résultat d'une requête via un curseur serveur"""
+        cur = self.conn.cursor(name=name)
+        cur.itersize = CURSOR_ITERSIZE
+        try:
+            cur.execute(query, params)
+            for row in cur:
+                yield row
+        finally:
+            cur.close()
+
+    def _submit(self, pool, fn, *args):
+        """Soumet une tâche en limitant le nombre de tâches en vol"""
+        while len(self._pending) >= self.max_workers * 2:
+            done, self._pending = wait(self._pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                future.result()
+        self._pending.add(pool.submit(fn, *args))
+
+    def _drain(self):
+        """Attend la fin des tâches en cours et remonte les erreurs"""
+        total = 0
+        for future in self._pending:
+            total += future.result()
+        self._pending = set()
+        return total
+
+    def export_planning(self, pool, base_dir, annee_academique, session):
+        """Passe unique sur le planning: XLSX par département + Parquet"""
+        dept_dir = os.path.join(base_dir, 'departements')
+        os.makedirs(dept_dir, exist_ok=True)
+
+        rows = self._stream('export_planning', """
+            SELECT
+                d.code, d.nom, f.code, f.nom, f.niveau,
+                m.code, m.nom, e.id, e.date_examen, e.heure_debut,
+                e.duree_minutes, l.nom, l.batiment, e.nb_inscrits,
+                COALESCE(string_agg(p.prenom || ' ' || p.nom, ', '
+                                    ORDER BY a.role, p.nom), '') as surveillants
+            FROM examens_publies e
+            JOIN modules m ON e.module_id = m.id
+            JOIN formations f ON m.formation_id = f.id
+            JOIN departements d ON f.dept_id = d.id
+            JOIN lieux_examen l ON e.lieu_id = l.id
+            LEFT JOIN affectations_surveillance a ON a.examen_id = e.id
+            LEFT JOIN professeurs p ON a.professeur_id = p.id
+            WHERE e.annee_academique = %s AND e.session = %s
+            GROUP BY d.code, d.nom, f.code, f.nom, f.niveau, m.code, m.nom,
+                     e.id, e.date_examen, e.heure_debut, e.duree_minutes,
+                     l.nom, l.batiment, e.nb_inscrits
+            ORDER BY d.code, e.date_examen, e.heure_debut, m.code
+        """, (annee_academique, session))
+
+        writer = None
+        batch = []
+        nb_exams = 0
+        nb_depts = 0
+
+        for (dept_code, dept_nom), dept_rows in groupby(rows, key=lambda r: (r[0], r[1])):
+            dept_rows = list(dept_rows)
+            path = os.path.join(dept_dir, f'{safe_filename(dept_code)}.xlsx')
+            self._submit(pool, write_department_workbook, path, dept_nom, dept_rows)
+            nb_depts += 1
+            nb_exams += len(dept_rows)
+
+            if pa is None:
+                continue
+
+            batch.extend(dept_rows)
+            while len(batch) >= PARQUET_BATCH_SIZE:
+                writer = self._write_parquet_batch(writer, base_dir, batch[:PARQUET_BATCH_SIZE])
+                batch = batch[PARQUET_BATCH_SIZE:]
+
+        if pa is not None and batch:
+            writer = self._write_parquet_batch(writer, base_dir, batch)
+        if writer is not None:
+            writer.close()
+        elif pa is None:
+            print("  pyarrow indisponible: export Parquet ignoré")
+
+        print(f"✓ {nb_exams} examens exportés ({nb_depts} départements)")
+        return nb_exams
+
+    def _write_parquet_batch(self, writer, base_dir, rows):
+        """Ajoute un row group au fichier Parquet (ouvert à la première écriture)"""
+        columns = list(zip(*rows))
+        table = pa.table({
+            'dept_code': pa.array(columns[0], pa.string()).dictionary_encode(),
+            'departement': pa.array(columns[1], pa.string()).dictionary_encode(),
+            'formation_code': pa.array(columns[2], pa.string()).dictionary_encode(),
+            'formation': pa.array(columns[3], pa.string()).dictionary_encode(),
+            'niveau': pa.array(columns[4], pa.string()).dictionary_encode(),
+            'module_code': pa.array(columns[5], pa.string()),
+            'module': pa.array(columns[6], pa.string()),
+            'examen_id': pa.array(columns[7], pa.int32()),
+            'date_examen': pa.array(columns[8], pa.date32()),
+            'heure_debut': pa.array(columns[9], pa.time32('s')),
+            'duree_minutes': pa.array(columns[10], pa.int16()),
+            'lieu': pa.array(columns[11], pa.string()).dictionary_encode(),
+            'batiment': pa.array(columns[12], pa.string()).dictionary_encode(),
+            'nb_inscrits': pa.array(columns[13], pa.int32()),
+            'surveillants': pa.array(columns[14], pa.string()),
+        })
+        if writer is None:
+            writer = pq.ParquetWriter(os.path.join(base_dir, 'planning.parquet'),
+                                      table.schema, compression='zstd')
+        writer.write_table(table)
+        return writer
+
+    def export_student_calendars(self, pool, base_dir, annee_academique, session):
+        """Un fichier .ics par étudiant, par lots envoyés aux workers"""
+        directory = os.path.join(base_dir, 'etudiants')
+        os.makedirs(directory, exist_ok=True)
+
+        rows = self._stream('export_etudiants', """
+            SELECT et.id, et.matricule, et.nom, et.prenom,
+                   e.id, m.code, m.nom, e.date_examen, e.heure_debut,
+                   e.duree_minutes, l.nom, l.batiment
+            FROM inscriptions i
+            JOIN etudiants et ON et.id = i.etudiant_id
+            JOIN examens_publies e ON e.module_id = i.module_id
+                          AND e.annee_academique = i.annee_academique
+            JOIN modules m ON e.module_id = m.id
+            JOIN lieux_examen l ON e.lieu_id = l.id
+            WHERE e.annee_academique = %s AND e.session = %s
+              AND (e.session <> 'rattrapage' OR i.statut = 'ajourne' OR i.note < %s)
+            ORDER BY et.id, e.date_examen, e.heure_debut
+        """, (annee_academique, session, NOTE_VALIDATION))
+
+        return self._export_calendars(pool, directory, rows, write_student_calendars)
+
+    def export_professor_calendars(self, pool, base_dir, annee_academique, session):
+        """Un fichier .ics par professeur surveillant"""
+        directory = os.path.join(base_dir, 'professeurs')
+        os.makedirs(directory, exist_ok=True)
+
+        rows = self._stream('export_professeurs', """
+            SELECT p.id, p.matricule, p.nom, p.prenom,
+                   e.id, m.code, m.nom, e.date_examen, e.heure_debut,
+                   e.duree_minutes, l.nom, l.batiment, a.role, e.nb_inscrits
+            FROM affectations_surveillance a
+            JOIN professeurs p ON p.id = a.professeur_id
+            JOIN examens_publies e ON e.id = a.examen_id
+            JOIN modules m ON e.module_id = m.id
+            JOIN lieux_examen l ON e.lieu_id = l.id
+            WHERE e.annee_academique = %s AND e.session = %s
+            ORDER BY p.id, e.date_examen, e.heure_debut
+        """, (annee_academique, session))
+
+        return self._export_calendars(pool, directory, rows, write_professor_calendars)
+
+    def _export_calendars(self, pool, directory, rows, writer_fn):
+        """Regroupe les lignes par entité et envoie des lots aux workers"""
+        chunk = []
+        count = 0
+
+        for (_, matricule, nom, prenom), entity_rows in groupby(rows, key=lambda r: r[:4]):
+            chunk.append((matricule, nom, prenom, [r[4:] for r in entity_rows]))
+            if len(chunk) >= ICS_CHUNK_SIZE:
+                self._submit(pool, writer_fn, directory, chunk)
+                count += len(chunk)
+                chunk = []
+
+        if chunk:
+            self._submit(pool, writer_fn, directory, chunk)
+            count += len(chunk)
+
+        return count
+
+    def export_session(self, annee_academique="2024-2025", session="normale"):
+        """Exporte tout le planning d'une session dans tous les formats"""
+        print("\n=== EXPORT DU PLANNING ===\n")
+
+        base_dir = os.path.join(self.output_dir, f"{annee_academique}_{session}")
+        os.makedirs(base_dir, exist_ok=True)
+
+        with ProcessPoolExecutor(max_workers=self.max_workers) as pool:
+            nb_exams = self.export_planning(pool, base_dir, annee_academique, session)
+            nb_etudiants = self.export_student_calendars(pool, base_dir, annee_academique, session)
+            nb_profs = self.export_professor_calendars(pool, base_dir, annee_academique, session)
+            self._drain()
+
+        self.conn.commit()
+        print(f"✓ {nb_etudiants} calendriers étudiants exportés")
+        print(f"✓ {nb_profs} calendriers professeurs exportés")
+        print(f"\n Export terminé dans {base_dir}")
+
+        return {
+            'dossier': base_dir,
+            'examens': nb_exams,
+            'etudiants': nb_etudiants,
+            'professeurs': nb_profs
+        }
+
+    def close(self):
+        self.conn.close()
+
+
+if __name__ == "__main__":
+    DB_CONFIG = {
+        'dbname': 'examens_db',
+        'user': 'postgres',
+        'password': '5432',
+        'host': 'localhost',
+        'port': '5432'
+    }
+
+    exporter = ScheduleExporter(DB_CONFIG)
+
+    start = datetime.now()
+    try:
+        exporter.export_session(annee_academique="2024-2025", session="normale")
+    finally:
+        exporter.close()
+    end = datetime.now()
+
+    print(f"\n  Temps d'exécution: {(end - start).total_seconds():.2f} secondes")
@@ -0,0 +1,173 @@
+"""Bornes inférieures du nombre de jours d'examens
+
+Vérification rapide (moins d'une seconde sur un problème chargé) à faire
+avant une génération: si la fenêtre demandée est plus courte que la plus
+grande borne, des modules finiront forcément en conflit.
+
+- clique: modules deux à deux en conflit (un étudiant commun), donc sur
+  des jours distincts. La plus grande clique est cherchée de façon
+  gloutonne: toute clique trouvée est une borne valide.
+- etudiant: plus grand nombre d'examens d'un même étudiant, espacés selon
+  les contraintes d'équité dures (jours de repos, max par fenêtre).
+- salles: un examen occupe une salle entière de capacité suffisante;
+  pour chaque seuil de taille, les minutes de salle demandées par les
+  modules au moins aussi gros sont comparées à celles des salles assez
+  grandes sur une journée de la grille.
+- places: places x minutes demandées comparées à la capacité d'examen
+  totale des salles sur une journée.
+- surveillants: au moins un surveillant par examen, 3 surveillances par
+  professeur et par jour.
+
+Les modules plus gros que la plus grande salle, ou trop longs pour la
+grille horaire, ne peuvent être placés quelle que soit la fenêtre: ils
+sont signalés à part et exclus des bornes.
+"""
+import time
+
+import numpy as np
+
+# Surveillances maximum par professeur et par jour (voir SupervisorPool)
+MAX_SURVEILLANCES_JOUR = 3
+
+
+def greedy_max_clique(graph, time_limit=0.5):
+    """Plus grande clique trouvée en partant de chaque module (degré décroissant)
+
+    Chaque départ ajoute le candidat le plus connecté aux autres
+    candidats. Arrêt dès qu'aucun module restant n'a assez de voisins pour
+    faire mieux, ou au bout de `time_limit` secondes.
+    """
+    deadline = time.perf_counter() + time_limit
+    best = []
+    for module_id in sorted(graph, key=lambda m: len(graph[m]), reverse=True):
+        if len(graph[module_id]) + 1 <= len(best) or time.perf_counter() > deadline:
+            break
+        clique = [module_id]
+        candidates = set(graph[module_id])
+        while candidates:
+            chosen = max(candidates, key=lambda m: len(graph[m] & candidates))
+            clique.append(chosen)
+            candidates &= graph[chosen]
+        if len(clique) > len(best):
+            best = clique
+    return best
+
+
+def day_segments(grid):
+    """Plages [début, fin[ de la journée entre les pauses, en minutes"""
+    segments = []
+    debut = grid.start
+    for pause_debut, pause_fin in sorted(grid.breaks):
+        if pause_debut > debut:
+            segments.append((debut, min(pause_debut, grid.end)))
+        debut = max(debut, pause_fin)
+    if debut < grid.end:
+        segments.append((debut, grid.end))
+    return segments
+
+
+def student_days(nb_examens, fairness):
+    """Jours minimum pour les examens d'un étudiant sous les contraintes dures"""
+    if nb_examens == 0:
+        return 0
+    days = nb_examens
+    if fairness is None:
+        return days
+    if 'min_gap' in fairness.hard and fairness.min_gap_days:
+        days = max(days, (nb_examens - 1) * (fairness.min_gap_days + 1) + 1)
+    if 'max_window' in fairness.hard and fairness.max_per_window:
+        per_window = fairness.max_per_window
+        days = max(days, (nb_examens - 1) // per_window * fairness.window_days
+                   + (nb_examens - 1) % per_window + 1)
+    return days
+
+
+def room_days(durations, sizes, capacities, day_minutes, turnover):
+    """Borne 'salles': max sur les seuils de taille de demande / offre journalière"""
+    if not len(durations):
+        return 0, None
+    order = np.argsort(-sizes, kind='stable')
+    sizes = sizes[order]
+    # Minutes de salle demandées par les modules de taille >= sizes[i]
+    demand = np.cumsum(durations[order] + turnover)
+    # Salles assez grandes pour le module i
+    capacities = np.sort(capacities)
+    rooms = len(capacities) - np.searchsorted(capacities, sizes, side='left')
+    days = np.ceil(demand / (rooms * day_minutes)).astype(int)
+    i = int(np.argmax(days))
+    return int(days[i]), {'seuil': int(sizes[i]), 'salles': int(rooms[i]),
+                          'minutes_demandees': int(demand[i]),
+                          'minutes_par_jour': int(rooms[i] * day_minutes)}
+
+
+def lower_bounds(problem, grid, fairness=None, time_limit=0.5):
+    """Bornes inférieures du nombre de jours pour un problème chargé
+
+    Retourne {'jours_min', 'bornes': {nom: jours}, 'clique', 'salles',
+    'modules_trop_grands', 'modules_hors_grille', 'temps'}.
+    """
+    start = time.perf_counter()
+    modules = problem['modules']
+    rooms = problem['rooms']
+    capacite_max = max((room.capacite for room in rooms), default=0)
+
+    too_large = [m for m in modules if m.nb_inscrits > capacite_max]
+    off_grid = [m for m in modules
+                if m.nb_inscrits <= capacite_max and not grid.valid_starts(m.duree)]
+    excluded = {m.id for m in too_large} | {m.id for m in off_grid}
+    placeable = [m for m in modules if m.id not in excluded]
+
+    graph = problem['conflict_graph']
+    clique = greedy_max_clique(
+        {m.id: graph[m.id] - excluded for m in placeable}, time_limit
+    )
+
+    # Examens par étudiant, sur la même indexation que le placement
+    enrollment = problem['module_student_idx']
+    if placeable:
+        per_student = np.bincount(np.concatenate([enrollment[m.id] for m in placeable]))
+        nb_examens = int(per_student.max())
+    else:
+        nb_examens = 0
+
+    # Une salle enchaîne des examens (battement compris) dans chaque plage
+    # de la journée; le battement du dernier examen d'une plage peut
+    # déborder sur la pause ou la fin de journée
+    segments = day_segments(grid)
+    day_minutes = sum(fin - debut + grid.turnover for debut, fin in segments)
+    open_minutes = sum(fin - debut for debut, fin in segments)
+
+    durations = np.array([m.duree for m in placeable], dtype=np.int64)
+    sizes = np.array([m.nb_inscrits for m in placeable], dtype=np.int64)
+    capacities = np.array([room.capacite for room in rooms], dtype=np.int64)
+    salles, binding = room_days(durations, sizes, capacities, day_minutes, grid.turnover)
+
+    places_demandees = int((durations * sizes).sum())
+    places_par_jour = int(capacities.sum()) * open_minutes
+    nb_professeurs = len(problem['professors'])
+
+    bornes = {
+        'clique': len(clique),
+        'etudiant': student_days(nb_examens, fairness),
+        'salles': salles,
+        'places': -(-places_demandees // places_par_jour) if places_par_jour else 0,
+        'surveillants': (-(-len(placeable) // (MAX_SURVEILLANCES_JOUR * nb_professeurs))
+                         if nb_professeurs else 0),
+    }
+    by_id = {m.id: m for m in modules}
+
+    return {
+        'jours_min': max(bornes.values(), default=0),
+        'bornes': bornes,
+        'clique': [by_id[module_id].code for module_id in clique],
+        'max_examens_etudiant': nb_examens,
+        'salles': binding,
+        'capacite_max': capacite_max,
+        'modules_trop_grands': [
+            {'code': m.code, 'module': m.nom, 'nb_inscrits': m.nb_inscrits} for m in too_large
+        ],
+        'modules_hors_grille': [
+            {'code': m.code, 'module': m.nom, 'duree': m.duree} for m in off_grid
+        ],
+        'temps': round(time.perf_counter() - start, 3),
+    }
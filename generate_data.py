@@ -1,9 +1,20 @@
+import argparse
+import io
+import os
 import psycopg2
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from faker import Faker
 import random
-from datetime import datetime, timedelta
+from datetime import datetime
 
-fake = Faker('fr_FR')
+from importer import copy_value
+
+# Volumes à l'échelle 1 (multipliés par --echelle)
+NB_PROFESSEURS = 500
+NB_ETUDIANTS = 13000
+# Entités par tâche envoyée aux workers
+PROFESSEURS_CHUNK_SIZE = 2000
+ETUDIANTS_CHUNK_SIZE = 5000
 
 DB_CONFIG = {
     'dbname': 'examens_db',
@@ -104,32 +115,115 @@ def generate_formations(conn):
     cur.close()
     print(f"✓ {formation_count} formations créées")
 
-def generate_professeurs(conn):
-    """Génère des professeurs (environ 500)"""
+def copy_rows(cur, table, columns, rows):
+    """Envoie des lignes par COPY (format texte)"""
+    buffer = io.StringIO()
+    for row in rows:
+        buffer.write('\t'.join(copy_value(value) for value in row) + '\n')
+    buffer.seek(0)
+    cur.copy_expert(f"COPY {table} ({', '.join(columns)}) FROM STDIN", buffer)
+
+
+def next_id(cur, table):
+    """Premier id libre: les workers reçoivent des plages disjointes à partir de là"""
+    cur.execute(f"SELECT COALESCE(MAX(id), 0) + 1 FROM {table}")
+    return cur.fetchone()[0]
+
+
+def run_chunks(worker, total, chunk_size, workers, label, *args):
+    """Répartit [0, total) en plages disjointes sur un pool de processus
+
+    Chaque worker a sa connexion et son COPY; `worker(start, stop, *args)`
+    retourne le nombre de lignes écrites.
+    """
+    chunks = [(start, min(start + chunk_size, total)) for start in range(0, total, chunk_size)]
+    done = 0
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(worker, start, stop, *args) for start, stop in chunks]
+        try:
+            for future in as_completed(futures):
+                done += future.result()
+                print(f"  {done} {label} créés...")
+        except Exception:
+            # Plages pas encore commencées abandonnées; celles en cours se terminent
+            # avant la sortie du bloc, puis l'appelant supprime ce qui a été écrit
+            for future in futures:
+                future.cancel()
+            raise
+    return done
+
+
+def discard_chunks(conn, first_id, tables):
+    """Supprime les lignes validées par les workers d'une génération en échec
+
+    Les workers écrivent des ids à partir de `first_id`: `tables` liste les
+    (table, colonne d'id) à nettoyer, dans l'ordre des clés étrangères.
+    """
+    conn.rollback()
     cur = conn.cursor()
-    cur.execute("SELECT id FROM departements")
-    dept_ids = [row[0] for row in cur.fetchall()]
-    
+    for table, column in tables:
+        cur.execute(f"DELETE FROM {table} WHERE {column} >= %s", (first_id,))
+    conn.commit()
+    cur.close()
+
+
+def reset_sequence(conn, table):
+    """Aligne la séquence SERIAL sur les ids écrits explicitement par les workers"""
+    cur = conn.cursor()
+    cur.execute(f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), "
+                f"(SELECT COALESCE(MAX(id), 1) FROM {table}))")
+    conn.commit()
+    cur.close()
+
+
+def professeurs_chunk(start, stop, first_id, dept_ids, seed):
+    """Professeurs d'indices [start, stop): id et matricule dérivés de l'indice"""
+    rng = random.Random(seed * 1000003 + start)
+    faker = Faker('fr_FR')
+    faker.seed_instance(seed * 1000003 + start)
+
     grades = ['Professeur', 'Maître de Conférences A', 'Maître de Conférences B', 'Maître Assistant A']
     specialites = ['Théorique', 'Appliquée', 'Expérimentale', 'Modélisation', 'Analyse']
-    
-    for i in range(500):
-        dept_id = random.choice(dept_ids)
-        matricule = f"PROF{i+1:04d}"
-        nom = fake.last_name()
-        prenom = fake.first_name()
+
+    rows = []
+    for i in range(start, stop):
+        prof_id = first_id + i
+        matricule = f"PROF{prof_id:04d}"
+        nom = faker.last_name()
+        prenom = faker.first_name()
         email = f"{prenom.lower()}.{nom.lower()}.{matricule.lower()}@univ.dz"
-        grade = random.choice(grades)
-        specialite = random.choice(specialites)
-        
-        cur.execute("""
-            INSERT INTO professeurs (matricule, nom, prenom, email, dept_id, grade, specialite)
-            VALUES (%s, %s, %s, %s, %s, %s, %s)
-        """, (matricule, nom, prenom, email, dept_id, grade, specialite))
-    
-    conn.commit()
+        rows.append((prof_id, matricule, nom, prenom, email, rng.choice(dept_ids),
+                     rng.choice(grades), rng.choice(specialites)))
+
+    conn = connect_db()
+    try:
+        copy_rows(conn.cursor(), 'professeurs',
+                  ('id', 'matricule', 'nom', 'prenom', 'email', 'dept_id', 'grade', 'specialite'),
+                  rows)
+        conn.commit()
+    finally:
+        conn.close()
+    return len(rows)
+
+
+def generate_professeurs(conn, scale=1, workers=None, seed=0):
+    """Génère des professeurs (environ 500 par unité d'échelle) en parallèle"""
+    cur = conn.cursor()
+    cur.execute("SELECT id FROM departements")
+    dept_ids = [row[0] for row in cur.fetchall()]
+    first_id = next_id(cur, 'professeurs')
     cur.close()
-    print("✓ 500 professeurs créés")
+
+    try:
+        total = run_chunks(professeurs_chunk, NB_PROFESSEURS * scale, PROFESSEURS_CHUNK_SIZE,
+                           workers, 'professeurs', first_id, dept_ids, seed)
+    except Exception:
+        discard_chunks(conn, first_id, [('professeurs', 'id')])
+        raise
+    finally:
+        reset_sequence(conn, 'professeurs')
+    print(f"✓ {total} professeurs créés")
+
 
 def generate_modules(conn):
     """Génère des modules pour chaque formation"""
@@ -167,70 +261,92 @@ def generate_modules(conn):
     cur.close()
     print(f"✓ {module_count} modules créés")
 
-def generate_etudiants(conn):
-    """Génère 13000 étudiants"""
+def etudiants_chunk(start, stop, first_id, formation_ids, modules_by_formation, annee, seed):
+    """Étudiants d'indices [start, stop) et leurs inscriptions
+
+    Les inscriptions ne dépendent que de la formation de l'étudiant: elles
+    sont écrites par le même worker, dans la même transaction, après les
+    étudiants (clé étrangère). Leurs ids viennent de la séquence.
+    """
+    rng = random.Random(seed * 1000003 + start)
+    faker = Faker('fr_FR')
+    faker.seed_instance(seed * 1000003 + start)
+
+    promotions = [2020, 2021, 2022, 2023, 2024, 2025]
+
+    etudiants = []
+    inscriptions = []
+    for i in range(start, stop):
+        etudiant_id = first_id + i
+        matricule = f"ETU{etudiant_id:06d}"
+        nom = faker.last_name()
+        prenom = faker.first_name()
+        email = f"{prenom.lower()}.{nom.lower()}{etudiant_id - 1}@etu.univ.dz"
+        formation_id = rng.choice(formation_ids)
+        etudiants.append((etudiant_id, matricule, nom, prenom, email, formation_id,
+                          rng.choice(promotions)))
+
+        # Inscrire l'étudiant à tous les modules de sa formation
+        for module_id in modules_by_formation.get(formation_id, ()):
+            inscriptions.append((etudiant_id, module_id, annee))
+
+    conn = connect_db()
+    try:
+        cur = conn.cursor()
+        copy_rows(cur, 'etudiants',
+                  ('id', 'matricule', 'nom', 'prenom', 'email', 'formation_id', 'promotion'),
+                  etudiants)
+        copy_rows(cur, 'inscriptions', ('etudiant_id', 'module_id', 'annee_academique'),
+                  inscriptions)
+        conn.commit()
+    finally:
+        conn.close()
+    return len(etudiants)
+
+
+def generate_etudiants(conn, scale=1, workers=None, seed=0):
+    """Génère 13000 étudiants par unité d'échelle et leurs inscriptions (~10 par étudiant)"""
     cur = conn.cursor()
     cur.execute("SELECT id FROM formations")
     formation_ids = [row[0] for row in cur.fetchall()]
-    
-    promotions = [2020, 2021, 2022, 2023, 2024, 2025]
-    
-    for i in range(13000):
-        matricule = f"ETU{i+1:06d}"
-        nom = fake.last_name()
-        prenom = fake.first_name()
-        email = f"{prenom.lower()}.{nom.lower()}{i}@etu.univ.dz"
-        formation_id = random.choice(formation_ids)
-        promotion = random.choice(promotions)
-        
-        cur.execute("""
-            INSERT INTO etudiants (matricule, nom, prenom, email, formation_id, promotion)
-            VALUES (%s, %s, %s, %s, %s, %s)
-        """, (matricule, nom, prenom, email, formation_id, promotion))
-        
-        if (i + 1) % 1000 == 0:
-            conn.commit()
-            print(f"  {i+1}/13000 étudiants créés...")
-    
-    conn.commit()
+    cur.execute("SELECT formation_id, array_agg(id ORDER BY id) FROM modules GROUP BY formation_id")
+    modules_by_formation = dict(cur.fetchall())
+    first_id = next_id(cur, 'etudiants')
     cur.close()
-    print("✓ 13000 étudiants créés")
 
-def generate_inscriptions(conn):
-    """Génère environ 130000 inscriptions"""
-    cur = conn.cursor()
-    
-    # Récupérer tous les étudiants avec leur formation
-    cur.execute("SELECT id, formation_id FROM etudiants")
-    etudiants = cur.fetchall()
-    
     annee = "2024-2025"
-    inscription_count = 0
-    
-    for etudiant_id, formation_id in etudiants:
-        # Récupérer les modules de cette formation
-        cur.execute("SELECT id FROM modules WHERE formation_id = %s", (formation_id,))
-        modules = cur.fetchall()
-        
-        # Inscrire l'étudiant à tous les modules de sa formation
-        for (module_id,) in modules:
-            cur.execute("""
-                INSERT INTO inscriptions (etudiant_id, module_id, annee_academique)
-                VALUES (%s, %s, %s)
-            """, (etudiant_id, module_id, annee))
-            inscription_count += 1
-        
-        if (inscription_count) % 10000 == 0:
-            conn.commit()
-            print(f"  {inscription_count} inscriptions créées...")
-    
+    try:
+        total = run_chunks(etudiants_chunk, NB_ETUDIANTS * scale, ETUDIANTS_CHUNK_SIZE, workers,
+                           'étudiants', first_id, formation_ids, modules_by_formation, annee,
+                           seed)
+    except Exception:
+        discard_chunks(conn, first_id, [('inscriptions', 'etudiant_id'), ('etudiants', 'id')])
+        raise
+    finally:
+        reset_sequence(conn, 'etudiants')
+
+    cur = conn.cursor()
+    cur.execute("ANALYZE etudiants; ANALYZE inscriptions")
+    cur.execute("SELECT COUNT(*) FROM inscriptions WHERE annee_academique = %s", (annee,))
+    inscription_count = cur.fetchone()[0]
     conn.commit()
     cur.close()
+    print(f"✓ {total} étudiants créés")
     print(f"✓ {inscription_count} inscriptions créées")
 
 def main():
+    parser = argparse.ArgumentParser(description="Génère un jeu de données de test")
+    parser.add_argument('--echelle', type=int, default=1,
+                        help="multiplie le nombre d'étudiants et de professeurs")
+    parser.add_argument('--workers', type=int, default=os.cpu_count(),
+                        help="processus de génération")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
     print("=== GÉNÉRATION DES DONNÉES ===\n")
-    
+    random.seed(args.seed)
+    start = datetime.now()
+
     try:
         conn = connect_db()
         print("✓ Connexion à la base de données établie\n")
@@ -238,16 +354,16 @@ def main():
         generate_departements(conn)
         generate_lieux_examen(conn)
         generate_formations(conn)
-        generate_professeurs(conn)
+        generate_professeurs(conn, args.echelle, args.workers, args.seed)
         generate_modules(conn)
-        generate_etudiants(conn)
-        generate_inscriptions(conn)
+        generate_etudiants(conn, args.echelle, args.workers, args.seed)
         
         conn.close()
-        print("\n=== GÉNÉRATION TERMINÉE AVEC SUCCÈS ===")
+        print(f"\n=== GÉNÉRATION TERMINÉE AVEC SUCCÈS ({datetime.now() - start}) ===")
         
     except Exception as e:
         print(f"\nErreur: {e}")
+        raise SystemExit(1)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
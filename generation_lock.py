@@ -0,0 +1,217 @@
+"""Coordination des générations de planning
+
+Une seule génération à la fois par (année, session), garantie par un
+verrou consultatif PostgreSQL tenu sur une connexion dédiée pendant toute
+la génération (libéré automatiquement si le processus meurt). Une demande
+identique à celle en cours s'y rattache et suit sa progression; une
+demande différente échoue immédiatement.
+"""
+import hashlib
+import json
+import time
+from datetime import date, datetime
+
+import psycopg2
+
+# Espace de clés des verrous consultatifs de génération
+LOCK_CLASS = 4201
+
+JOBS_DDL = """
+CREATE TABLE IF NOT EXISTS generation_jobs (
+    id SERIAL PRIMARY KEY,
+    annee_academique VARCHAR(9) NOT NULL,
+    session VARCHAR(20) NOT NULL,
+    parametres VARCHAR(32) NOT NULL, -- empreinte des paramètres
+    statut VARCHAR(20) NOT NULL DEFAULT 'en_cours', -- en_cours, termine, echec
+    etape VARCHAR(50),
+    progression INTEGER DEFAULT 0,
+    total INTEGER DEFAULT 0,
+    version_id INTEGER,
+    nb_planifies INTEGER,
+    nb_conflits INTEGER,
+    erreur TEXT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+CREATE INDEX IF NOT EXISTS idx_generation_jobs_session
+    ON generation_jobs(annee_academique, session, statut);
+"""
+
+JOB_COLUMNS = ('id', 'annee_academique', 'session', 'parametres', 'statut', 'etape',
+               'progression', 'total', 'version_id', 'nb_planifies', 'nb_conflits',
+               'erreur', 'created_at', 'updated_at')
+
+
+class GenerationBusy(Exception):
+    """Une génération avec d'autres paramètres est déjà en cours"""
+
+    def __init__(self, job):
+        self.job = job
+        if job is None:
+            message = "Une génération est déjà en cours pour cette session"
+        else:
+            message = (f"Génération {job['id']} déjà en cours pour {job['session']} "
+                       f"{job['annee_academique']} ({job['etape']}, "
+                       f"{job['progression']}/{job['total']})")
+        super().__init__(message)
+
+
+def _jsonable(value):
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    if isinstance(value, (set, frozenset)):
+        return sorted(value)
+    return {k: v for k, v in vars(value).items() if not k.startswith('_')}
+
+
+def params_fingerprint(params):
+    """Empreinte stable des paramètres de génération"""
+    encoded = json.dumps(params, default=_jsonable, sort_keys=True)
+    return hashlib.md5(encoded.encode()).hexdigest()
+
+
+class GenerationCoordinator:
+    def __init__(self, db_config, attach_timeout=5.0, poll_interval=1.0):
+        self.db_config = db_config
+        # Délai d'apparition du job d'une génération qui vient de prendre le verrou
+        self.attach_timeout = attach_timeout
+        self.poll_interval = poll_interval
+
+    def _connect(self):
+        conn = psycopg2.connect(**self.db_config)
+        conn.autocommit = True
+        return conn
+
+    def ensure_schema(self, conn):
+        conn.cursor().execute(JOBS_DDL)
+
+    def running_job(self, cur, annee_academique, session):
+        cur.execute(f"""
+            SELECT {', '.join(JOB_COLUMNS)}
+            FROM generation_jobs
+            WHERE annee_academique = %s AND session = %s AND statut = 'en_cours'
+            ORDER BY id DESC
+            LIMIT 1
+        """, (annee_academique, session))
+        row = cur.fetchone()
+        return dict(zip(JOB_COLUMNS, row)) if row else None
+
+    def try_lock(self, cur, annee_academique, session):
+        """Prend le verrou de génération de l'année / session s'il est libre"""
+        cur.execute("SELECT pg_try_advisory_lock(%s, hashtext(%s))",
+                    (LOCK_CLASS, f"{annee_academique}/{session}"))
+        return cur.fetchone()[0]
+
+    def unlock(self, cur, annee_academique, session):
+        cur.execute("SELECT pg_advisory_unlock(%s, hashtext(%s))",
+                    (LOCK_CLASS, f"{annee_academique}/{session}"))
+
+    def get_job(self, cur, job_id):
+        cur.execute(f"SELECT {', '.join(JOB_COLUMNS)} FROM generation_jobs WHERE id = %s",
+                    (job_id,))
+        row = cur.fetchone()
+        return dict(zip(JOB_COLUMNS, row)) if row else None
+
+    def generate(self, scheduler, annee_academique, session, on_progress=None, **params):
+        """Lance ou rejoint la génération de l'année / session
+
+        `params` sont ceux de scheduler.generate_schedule. Retourne
+        (job, conflicts, rattache): si rattache, le scheduler n'a rien
+        exécuté et conflicts vaut None. Lève GenerationBusy si une
+        génération différente est en cours.
+        """
+        fingerprint = params_fingerprint(params)
+        conn = self._connect()
+        try:
+            self.ensure_schema(conn)
+            cur = conn.cursor()
+            deadline = time.monotonic() + self.attach_timeout
+
+            while True:
+                if self.try_lock(cur, annee_academique, session):
+                    job, conflicts = self._run(cur, scheduler, annee_academique, session,
+                                               fingerprint, params, on_progress)
+                    return job, conflicts, False
+
+                job = self.running_job(cur, annee_academique, session)
+                if job is not None:
+                    if job['parametres'] != fingerprint:
+                        raise GenerationBusy(job)
+                    return self._follow(cur, job, on_progress), None, True
+
+                # Verrou pris mais job pas encore visible: réessayer brièvement
+                if time.monotonic() > deadline:
+                    raise GenerationBusy(None)
+                time.sleep(0.2)
+        finally:
+            conn.close()
+
+    def _run(self, cur, scheduler, annee_academique, session, fingerprint, params, on_progress):
+        """Exécute la génération en tenant le verrou (libéré à la fermeture)"""
+        # Jobs restés en cours après l'arrêt brutal d'un processus
+        cur.execute("""
+            UPDATE generation_jobs
+            SET statut = 'echec', erreur = 'Interrompue', updated_at = CURRENT_TIMESTAMP
+            WHERE annee_academique = %s AND session = %s AND statut = 'en_cours'
+        """, (annee_academique, session))
+        cur.execute("""
+            INSERT INTO generation_jobs (annee_academique, session, parametres, etape)
+            VALUES (%s, %s, %s, 'chargement')
+            RETURNING id
+        """, (annee_academique, session, fingerprint))
+        job_id = cur.fetchone()[0]
+
+        def progress(etape, fait, total):
+            cur.execute("""
+                UPDATE generation_jobs
+                SET etape = %s, progression = %s, total = %s, updated_at = CURRENT_TIMESTAMP
+                WHERE id = %s
+            """, (etape, fait, total, job_id))
+            if on_progress:
+                on_progress(etape, fait, total)
+
+        try:
+            scheduled, conflicts = scheduler.generate_schedule(
+                annee_academique, session, progress=progress, **params)
+        except Exception as e:
+            cur.execute("""
+                UPDATE generation_jobs
+                SET statut = 'echec', erreur = %s, updated_at = CURRENT_TIMESTAMP
+                WHERE id = %s
+            """, (str(e), job_id))
+            raise
+
+        cur.execute("""
+            UPDATE generation_jobs
+            SET statut = 'termine', etape = 'termine', version_id = %s,
+                nb_planifies = %s, nb_conflits = %s, updated_at = CURRENT_TIMESTAMP
+            WHERE id = %s
+        """, (scheduler.version_id, scheduled, len(conflicts), job_id))
+        return self.get_job(cur, job_id), conflicts
+
+    def _follow(self, cur, job, on_progress):
+        """Suit un job lancé par un autre appelant jusqu'à sa fin
+
+        Si le verrou devient libre alors que le job est encore en cours, le
+        processus qui génère est mort: le job est marqué en échec.
+        """
+        annee_academique, session = job['annee_academique'], job['session']
+        while True:
+            job = self.get_job(cur, job['id'])
+            if on_progress:
+                on_progress(job['etape'], job['progression'], job['total'])
+            if job['statut'] != 'en_cours':
+                return job
+            if self.try_lock(cur, annee_academique, session):
+                try:
+                    # Le job a pu se terminer juste avant la libération du verrou
+                    cur.execute("""
+                        UPDATE generation_jobs
+                        SET statut = 'echec', erreur = 'Interrompue',
+                            updated_at = CURRENT_TIMESTAMP
+                        WHERE id = %s AND statut = 'en_cours'
+                    """, (job['id'],))
+                finally:
+                    self.unlock(cur, annee_academique, session)
+                return self.get_job(cur, job['id'])
+            time.sleep(self.poll_interval)
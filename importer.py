@@ -0,0 +1,599 @@
+"""Import des données de la scolarité (CSV / XLSX)
+
+Les fichiers sont lus en flux (csv, ou openpyxl en lecture seule), ligne
+par ligne: chaque ligne est validée contre le schéma (longueurs des
+colonnes, matricules, codes de formation / département, notes, année
+académique) puis envoyée par paquets de COPY_CHUNK_SIZE lignes dans une
+table de staging (COPY). Les contrôles qui dépendent de la base ou de
+tout le fichier (étudiant ou module inconnu, doublons de
+UNIQUE(etudiant_id, module_id, annee_academique), e-mail déjà utilisé)
+sont faits en SQL sur le staging, puis les lignes valides sont fusionnées
+(INSERT ... ON CONFLICT DO UPDATE) dans une seule transaction.
+
+Une ligne invalide ne bloque pas l'import: elle est écrite dans le
+rapport d'erreurs (CSV: ligne, champ, valeur, message) au fil de l'eau.
+La mémoire reste bornée par la taille d'un paquet, quel que soit le
+nombre de lignes.
+
+Usage:
+    python importer.py etudiants etudiants.xlsx --rapport erreurs.csv
+    python importer.py inscriptions inscriptions.csv --dry-run
+"""
+import argparse
+import csv
+import io
+import json
+import os
+import re
+import time
+import unicodedata
+from decimal import Decimal, InvalidOperation
+
+import psycopg2
+
+from versions import PUBLICATION_CHANNEL
+
+DEFAULT_DSN = "dbname=examens_db user=postgres host=localhost port=5432"
+
+# Lignes envoyées par COPY en une fois
+COPY_CHUNK_SIZE = 50000
+# Lignes lues par aller-retour sur le curseur serveur du rapport
+CURSOR_ITERSIZE = 5000
+
+MATRICULE_PATTERN = re.compile(r'^[A-Za-z0-9][A-Za-z0-9_./-]*$')
+ANNEE_PATTERN = re.compile(r'^(\d{4})-(\d{4})$')
+STATUTS_INSCRIPTION = ('inscrit', 'valide', 'ajourne')
+
+# En-têtes acceptés pour chaque champ (après normalisation)
+ALIASES = {
+    'formation': ('formation', 'code_formation', 'formation_code'),
+    'departement': ('departement', 'code_departement', 'dept', 'departement_code'),
+    'module': ('module', 'code_module', 'module_code'),
+    'annee_academique': ('annee_academique', 'annee'),
+    'email': ('email', 'e_mail', 'courriel'),
+}
+
+
+class InvalidFile(Exception):
+    """Fichier inutilisable (vide, colonnes obligatoires absentes)"""
+
+
+class RowError(Exception):
+    """Valeur refusée, reportée dans le rapport d'erreurs"""
+
+    def __init__(self, champ, valeur, message):
+        self.champ = champ
+        self.valeur = valeur
+        super().__init__(message)
+
+
+def normalize_header(value):
+    """'Année académique' -> 'annee_academique'"""
+    text = unicodedata.normalize('NFKD', str(value or '')).encode('ascii', 'ignore').decode()
+    return re.sub(r'[^a-z0-9]+', '_', text.lower()).strip('_')
+
+
+def clean(value):
+    if value is None:
+        return None
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    value = str(value).strip()
+    return value or None
+
+
+# ============================================
+# VALIDATION DES CHAMPS
+# ============================================
+
+def text(max_length, required=True):
+    def check(champ, value):
+        if value is None:
+            if required:
+                raise RowError(champ, value, "valeur obligatoire")
+            return None
+        if len(value) > max_length:
+            raise RowError(champ, value, f"plus de {max_length} caractères")
+        return value
+    return check
+
+
+def matricule(champ, value):
+    value = text(20)(champ, value)
+    if not MATRICULE_PATTERN.match(value):
+        raise RowError(champ, value, "matricule invalide")
+    return value.upper()
+
+
+def email(champ, value):
+    value = text(150, required=False)(champ, value)
+    if value is not None and not re.match(r'^[^@\s]+@[^@\s]+\.[^@\s]+$', value):
+        raise RowError(champ, value, "adresse e-mail invalide")
+    return value
+
+
+def integer(low, high):
+    def check(champ, value):
+        if value is None:
+            raise RowError(champ, value, "valeur obligatoire")
+        try:
+            number = int(value)
+        except ValueError:
+            raise RowError(champ, value, "nombre entier attendu")
+        if not low <= number <= high:
+            raise RowError(champ, value, f"hors de [{low}, {high}]")
+        return number
+    return check
+
+
+def note(champ, value):
+    if value is None:
+        return None
+    try:
+        number = Decimal(value.replace(',', '.'))
+    except InvalidOperation:
+        raise RowError(champ, value, "note invalide")
+    # NaN et Infinity passent l'analyse mais pas la comparaison
+    if not number.is_finite():
+        raise RowError(champ, value, "note invalide")
+    if not 0 <= number <= 20:
+        raise RowError(champ, value, "note hors de [0, 20]")
+    return number.quantize(Decimal('0.01'))
+
+
+def annee_academique(champ, value):
+    found = ANNEE_PATTERN.match(value or '')
+    if found is None or int(found.group(2)) != int(found.group(1)) + 1:
+        raise RowError(champ, value, "année académique attendue au format 2024-2025")
+    return value
+
+
+def statut_inscription(champ, value):
+    if value is None:
+        return 'inscrit'
+    value = normalize_header(value)
+    if value not in STATUTS_INSCRIPTION:
+        raise RowError(champ, value, f"statut attendu parmi {', '.join(STATUTS_INSCRIPTION)}")
+    return value
+
+
+def reference(table, label):
+    """Code -> id d'une petite table de référence (formations, départements)"""
+    def check(champ, value, references):
+        if value is None:
+            raise RowError(champ, value, "valeur obligatoire")
+        ref_id = references[table].get(value.upper())
+        if ref_id is None:
+            raise RowError(champ, value, f"{label} inconnu(e)")
+        return ref_id
+    check.references = True
+    return check
+
+
+# ============================================
+# TYPES D'IMPORT
+# ============================================
+# Chaque type décrit: les champs du fichier et leur validation (dans
+# l'ordre des colonnes du staging), le staging, les rejets calculés en SQL
+# sur tout le fichier et la fusion dans la table cible.
+
+ETUDIANTS = {
+    'table': 'etudiants',
+    'optional': ('email',),
+    'fields': [
+        ('matricule', matricule),
+        ('nom', text(100)),
+        ('prenom', text(100)),
+        ('email', email),
+        ('formation', reference('formations', "formation")),
+        ('promotion', integer(1950, 2100)),
+    ],
+    'staging': """
+        CREATE TEMP TABLE staging_etudiants (
+            ligne INTEGER NOT NULL,
+            matricule VARCHAR(20) NOT NULL,
+            nom VARCHAR(100) NOT NULL,
+            prenom VARCHAR(100) NOT NULL,
+            email VARCHAR(150),
+            formation_id INTEGER NOT NULL,
+            promotion INTEGER NOT NULL
+        ) ON COMMIT DROP
+    """,
+    'rejets': """
+        SELECT ligne, 'matricule', matricule, 'doublon de la ligne ' || premiere
+        FROM (SELECT ligne, matricule,
+                     first_value(ligne) OVER (PARTITION BY matricule ORDER BY ligne) AS premiere
+              FROM staging_etudiants) d
+        WHERE ligne <> premiere
+        UNION ALL
+        SELECT ligne, 'email', email, 'e-mail déjà utilisé à la ligne ' || premiere
+        FROM (SELECT ligne, email, matricule,
+                     first_value(ligne) OVER w AS premiere,
+                     first_value(matricule) OVER w AS premier_matricule
+              FROM staging_etudiants
+              WHERE email IS NOT NULL
+              WINDOW w AS (PARTITION BY email ORDER BY ligne)) d
+        WHERE matricule <> premier_matricule
+        UNION ALL
+        SELECT s.ligne, 'email', s.email, 'e-mail déjà utilisé par ' || e.matricule
+        FROM staging_etudiants s
+        JOIN etudiants e ON e.email = s.email AND e.matricule <> s.matricule
+    """,
+    'merge': """
+        INSERT INTO etudiants (matricule, nom, prenom, email, formation_id, promotion)
+        SELECT matricule, nom, prenom, email, formation_id, promotion
+        FROM staging_etudiants s
+        WHERE NOT EXISTS (SELECT 1 FROM import_rejets r WHERE r.ligne = s.ligne)
+        ON CONFLICT (matricule) DO UPDATE SET
+            nom = EXCLUDED.nom,
+            prenom = EXCLUDED.prenom,
+            email = EXCLUDED.email,
+            formation_id = EXCLUDED.formation_id,
+            promotion = EXCLUDED.promotion
+        RETURNING (xmax = 0) AS insere
+    """,
+    'departements': """
+        SELECT DISTINCT f.dept_id
+        FROM staging_etudiants s
+        JOIN formations f ON f.id = s.formation_id
+    """,
+}
+
+PROFESSEURS = {
+    'table': 'professeurs',
+    'optional': ('email', 'specialite', 'grade'),
+    'fields': [
+        ('matricule', matricule),
+        ('nom', text(100)),
+        ('prenom', text(100)),
+        ('email', email),
+        ('departement', reference('departements', "département")),
+        ('specialite', text(200, required=False)),
+        ('grade', text(50, required=False)),
+    ],
+    'staging': """
+        CREATE TEMP TABLE staging_professeurs (
+            ligne INTEGER NOT NULL,
+            matricule VARCHAR(20) NOT NULL,
+            nom VARCHAR(100) NOT NULL,
+            prenom VARCHAR(100) NOT NULL,
+            email VARCHAR(150),
+            dept_id INTEGER NOT NULL,
+            specialite VARCHAR(200),
+            grade VARCHAR(50)
+        ) ON COMMIT DROP
+    """,
+    'rejets': """
+        SELECT ligne, 'matricule', matricule, 'doublon de la ligne ' || premiere
+        FROM (SELECT ligne, matricule,
+                     first_value(ligne) OVER (PARTITION BY matricule ORDER BY ligne) AS premiere
+              FROM staging_professeurs) d
+        WHERE ligne <> premiere
+        UNION ALL
+        SELECT ligne, 'email', email, 'e-mail déjà utilisé à la ligne ' || premiere
+        FROM (SELECT ligne, email, matricule,
+                     first_value(ligne) OVER w AS premiere,
+                     first_value(matricule) OVER w AS premier_matricule
+              FROM staging_professeurs
+              WHERE email IS NOT NULL
+              WINDOW w AS (PARTITION BY email ORDER BY ligne)) d
+        WHERE matricule <> premier_matricule
+        UNION ALL
+        SELECT s.ligne, 'email', s.email, 'e-mail déjà utilisé par ' || p.matricule
+        FROM staging_professeurs s
+        JOIN professeurs p ON p.email = s.email AND p.matricule <> s.matricule
+    """,
+    'merge': """
+        INSERT INTO professeurs (matricule, nom, prenom, email, dept_id, specialite, grade)
+        SELECT matricule, nom, prenom, email, dept_id, specialite, grade
+        FROM staging_professeurs s
+        WHERE NOT EXISTS (SELECT 1 FROM import_rejets r WHERE r.ligne = s.ligne)
+        ON CONFLICT (matricule) DO UPDATE SET
+            nom = EXCLUDED.nom,
+            prenom = EXCLUDED.prenom,
+            email = EXCLUDED.email,
+            dept_id = EXCLUDED.dept_id,
+            specialite = COALESCE(EXCLUDED.specialite, professeurs.specialite),
+            grade = COALESCE(EXCLUDED.grade, professeurs.grade)
+        RETURNING (xmax = 0) AS insere
+    """,
+    'departements': "SELECT DISTINCT dept_id FROM staging_professeurs",
+}
+
+# Étudiants et modules sont résolus en SQL: pas de table de correspondance
+# de plusieurs centaines de milliers de matricules en mémoire
+INSCRIPTIONS = {
+    'table': 'inscriptions',
+    'optional': ('note', 'statut'),
+    'fields': [
+        ('matricule', matricule),
+        ('module', lambda champ, value: text(20)(champ, value).upper()),
+        ('annee_academique', annee_academique),
+        ('note', note),
+        ('statut', statut_inscription),
+    ],
+    'staging': """
+        CREATE TEMP TABLE staging_inscriptions (
+            ligne INTEGER NOT NULL,
+            matricule VARCHAR(20) NOT NULL,
+            module_code VARCHAR(20) NOT NULL,
+            annee_academique VARCHAR(9) NOT NULL,
+            note NUMERIC(5,2),
+            statut VARCHAR(20) NOT NULL
+        ) ON COMMIT DROP
+    """,
+    'rejets': """
+        SELECT s.ligne, 'matricule', s.matricule, 'étudiant inconnu'
+        FROM staging_inscriptions s
+        WHERE NOT EXISTS (SELECT 1 FROM etudiants e WHERE e.matricule = s.matricule)
+        UNION ALL
+        SELECT s.ligne, 'module', s.module_code, 'module inconnu'
+        FROM staging_inscriptions s
+        WHERE NOT EXISTS (SELECT 1 FROM modules m WHERE m.code = s.module_code)
+        UNION ALL
+        SELECT ligne, 'module', module_code, 'inscription en double (ligne ' || premiere || ')'
+        FROM (SELECT ligne, module_code,
+                     first_value(ligne) OVER (PARTITION BY matricule, module_code, annee_academique
+                                              ORDER BY ligne) AS premiere
+              FROM staging_inscriptions) d
+        WHERE ligne <> premiere
+    """,
+    'merge': """
+        INSERT INTO inscriptions (etudiant_id, module_id, annee_academique, note, statut)
+        SELECT e.id, m.id, s.annee_academique, s.note, s.statut
+        FROM staging_inscriptions s
+        JOIN etudiants e ON e.matricule = s.matricule
+        JOIN modules m ON m.code = s.module_code
+        WHERE NOT EXISTS (SELECT 1 FROM import_rejets r WHERE r.ligne = s.ligne)
+        ON CONFLICT (etudiant_id, module_id, annee_academique) DO UPDATE SET
+            note = COALESCE(EXCLUDED.note, inscriptions.note),
+            statut = EXCLUDED.statut
+        RETURNING (xmax = 0) AS insere
+    """,
+    'departements': """
+        SELECT DISTINCT f.dept_id
+        FROM (SELECT DISTINCT module_code FROM staging_inscriptions) s
+        JOIN modules m ON m.code = s.module_code
+        JOIN formations f ON f.id = m.formation_id
+    """,
+}
+
+IMPORTS = {
+    'etudiants': ETUDIANTS,
+    'professeurs': PROFESSEURS,
+    'inscriptions': INSCRIPTIONS,
+}
+
+
+# ============================================
+# LECTURE EN FLUX
+# ============================================
+
+def read_rows(path, sheet=None):
+    """(numéro de ligne, valeurs) des lignes non vides, en-tête compris"""
+    if path.lower().endswith(('.xlsx', '.xlsm')):
+        from openpyxl import load_workbook
+
+        # read_only: les lignes sont lues au fur et à mesure depuis l'archive
+        workbook = load_workbook(path, read_only=True, data_only=True)
+        try:
+            worksheet = workbook[sheet] if sheet else workbook.active
+            for number, values in enumerate(worksheet.iter_rows(values_only=True), start=1):
+                values = [clean(value) for value in values]
+                if any(value is not None for value in values):
+                    yield number, values
+        finally:
+            workbook.close()
+        return
+
+    with open(path, newline='', encoding='utf-8-sig') as f:
+        try:
+            dialect = csv.Sniffer().sniff(f.read(64 * 1024), delimiters=',;\t')
+        except csv.Error:
+            dialect = 'excel'
+        f.seek(0)
+        reader = csv.reader(f, dialect)
+        for values in reader:
+            values = [clean(value) for value in values]
+            if any(value is not None for value in values):
+                # line_num: ligne physique, comme dans un tableur
+                yield reader.line_num, values
+
+
+def column_positions(header, spec):
+    """Position de chaque champ dans l'en-tête du fichier"""
+    header = [normalize_header(value) for value in header]
+    positions = {}
+    for champ, _ in spec['fields']:
+        names = ALIASES.get(champ, (champ,))
+        positions[champ] = next((header.index(name) for name in names if name in header), None)
+    missing = [champ for champ, position in positions.items()
+               if position is None and champ not in spec['optional']]
+    if missing:
+        raise InvalidFile(f"colonnes obligatoires absentes: {', '.join(missing)} "
+                          f"(en-tête lu: {', '.join(header)})")
+    return positions
+
+
+# ============================================
+# IMPORT
+# ============================================
+
+def load_references(cur):
+    """Codes (et noms) des formations et départements -> id"""
+    references = {}
+    cur.execute("SELECT code, id FROM formations")
+    references['formations'] = {code.upper(): ref_id for code, ref_id in cur.fetchall()}
+    cur.execute("SELECT code, nom, id FROM departements")
+    references['departements'] = {}
+    for code, nom, ref_id in cur.fetchall():
+        references['departements'][code.upper()] = ref_id
+        references['departements'][nom.upper()] = ref_id
+    return references
+
+
+def copy_value(value):
+    """Valeur au format texte de COPY"""
+    if value is None:
+        return '\\N'
+    return (str(value)
+            .replace('\\', '\\\\')
+            .replace('\t', '\\t')
+            .replace('\n', '\\n')
+            .replace('\r', '\\r'))
+
+
+def copy_chunk(cur, table, buffer):
+    buffer.seek(0)
+    cur.copy_expert(f"COPY {table} FROM STDIN", buffer)
+    buffer.seek(0)
+    buffer.truncate()
+
+
+def import_file(conn, kind, path, report_path=None, sheet=None, dry_run=False):
+    """Importe un fichier CSV / XLSX; retourne le bilan de l'import
+
+    Les lignes refusées sont écrites dans `report_path` (par défaut à côté
+    du fichier importé). Avec dry_run, tout est validé puis annulé.
+    """
+    spec = IMPORTS[kind]
+    staging = f"staging_{spec['table']}"
+    report_path = report_path or f"{os.path.splitext(path)[0]}.erreurs.csv"
+    start = time.time()
+    summary = {'type': kind, 'fichier': path, 'rapport': report_path, 'lignes': 0,
+               'rejetees': 0, 'inserees': 0, 'mises_a_jour': 0, 'erreurs_par_champ': {}}
+
+    cur = conn.cursor()
+    references = load_references(cur)
+    rows = read_rows(path, sheet)
+    try:
+        _, header = next(rows)
+    except StopIteration:
+        raise InvalidFile(f"{path}: fichier vide")
+    positions = column_positions(header, spec)
+
+    def report_error(writer, ligne, champ, valeur, message):
+        writer.writerow([ligne, champ, valeur, message])
+        summary['erreurs_par_champ'][champ] = summary['erreurs_par_champ'].get(champ, 0) + 1
+
+    try:
+        with open(report_path, 'w', newline='', encoding='utf-8') as report:
+            writer = csv.writer(report)
+            writer.writerow(['ligne', 'champ', 'valeur', 'message'])
+
+            cur.execute(spec['staging'])
+            buffer = io.StringIO()
+            pending = 0
+            for ligne, values in rows:
+                summary['lignes'] += 1
+                record = [ligne]
+                errors = []
+                for champ, check in spec['fields']:
+                    position = positions[champ]
+                    value = values[position] if position is not None and position < len(values) else None
+                    try:
+                        if getattr(check, 'references', False):
+                            record.append(check(champ, value, references))
+                        else:
+                            record.append(check(champ, value))
+                    except RowError as e:
+                        errors.append(e)
+                if errors:
+                    # Une ligne de rapport par champ refusé, la ligne entière est écartée
+                    for e in errors:
+                        report_error(writer, ligne, e.champ, e.valeur, str(e))
+                    summary['rejetees'] += 1
+                    continue
+
+                buffer.write('\t'.join(copy_value(value) for value in record) + '\n')
+                pending += 1
+                if pending == COPY_CHUNK_SIZE:
+                    copy_chunk(cur, staging, buffer)
+                    pending = 0
+                    print(f"  {summary['lignes']} lignes lues...")
+            if pending:
+                copy_chunk(cur, staging, buffer)
+
+            # Contrôles sur tout le fichier et sur la base
+            cur.execute(f"ANALYZE {staging}")
+            cur.execute(f"""
+                CREATE TEMP TABLE import_rejets ON COMMIT DROP AS
+                SELECT r.* FROM ({spec['rejets']}) AS r(ligne, champ, valeur, message)
+            """)
+            cur.execute("CREATE INDEX ON import_rejets(ligne)")
+            cur.execute("ANALYZE import_rejets")
+            rejets = conn.cursor(name='import_rejets')
+            rejets.itersize = CURSOR_ITERSIZE
+            rejets.execute("SELECT ligne, champ, valeur, message FROM import_rejets ORDER BY ligne")
+            seen = None
+            for ligne, champ, valeur, message in rejets:
+                report_error(writer, ligne, champ, valeur, message)
+                if ligne != seen:
+                    summary['rejetees'] += 1
+                seen = ligne
+            rejets.close()
+
+        cur.execute(f"""
+            WITH merged AS ({spec['merge']})
+            SELECT count(*) FILTER (WHERE insere), count(*) FILTER (WHERE NOT insere)
+            FROM merged
+        """)
+        summary['inserees'], summary['mises_a_jour'] = cur.fetchone()
+
+        if dry_run:
+            conn.rollback()
+        else:
+            # Les caches applicatifs des départements touchés sont invalidés
+            # comme après une publication (délivré au commit)
+            cur.execute(spec['departements'])
+            departements = sorted(row[0] for row in cur.fetchall())
+            cur.execute("SELECT pg_notify(%s, %s)", (
+                PUBLICATION_CHANNEL,
+                json.dumps({'import': kind, 'departements': departements})
+            ))
+            conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+
+    summary['duree'] = round(time.time() - start, 1)
+    return summary
+
+
+def print_summary(summary, dry_run=False):
+    print(f"\n=== IMPORT {summary['type'].upper()}{' (SIMULATION)' if dry_run else ''} ===")
+    print(f"  {summary['lignes']} lignes lues en {summary['duree']}s")
+    print(f"  {summary['inserees']} insérées, {summary['mises_a_jour']} mises à jour")
+    print(f"  {summary['rejetees']} lignes rejetées")
+    for champ, count in sorted(summary['erreurs_par_champ'].items(), key=lambda item: -item[1]):
+        print(f"    {champ:18s} {count}")
+    if summary['rejetees']:
+        print(f"  rapport d'erreurs: {summary['rapport']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('type', choices=list(IMPORTS))
+    parser.add_argument('fichier', help="fichier .csv ou .xlsx")
+    parser.add_argument('--feuille', help="feuille du classeur (par défaut la feuille active)")
+    parser.add_argument('--rapport', help="rapport d'erreurs CSV")
+    parser.add_argument('--dry-run', action='store_true', help="valide sans rien écrire")
+    parser.add_argument('--dsn', default=os.environ.get('EXAMENS_DSN', DEFAULT_DSN))
+    args = parser.parse_args()
+
+    conn = psycopg2.connect(args.dsn)
+    try:
+        summary = import_file(conn, args.type, args.fichier, args.rapport, args.feuille,
+                              args.dry_run)
+    except InvalidFile as e:
+        print(f"Erreur: {e}")
+        raise SystemExit(1)
+    finally:
+        conn.close()
+    print_summary(summary, args.dry_run)
+
+
+if __name__ == "__main__":
+    main()
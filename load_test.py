@@ -0,0 +1,367 @@
+"""Test de charge des vues de consultation (jour de publication)
+
+Rejoue les requêtes des vues étudiant, professeur, chef de département et
+KPIs avec les mêmes briques que app.py (queries, DataAccess, CacheBus,
+ScheduleSnapshot), sans Streamlit. Chaque utilisateur simulé est une
+session: un rôle, une identité tirée selon l'activité réelle (étudiants
+pondérés par leurs inscriptions, professeurs par leurs surveillances) et
+quelques consultations séparées par un temps de réflexion. `concurrency`
+threads jouent les sessions comme les threads de script Streamlit.
+
+Les résultats (débit, latences p50/p95/p99 par vue, saturation du pool et
+des connexions PostgreSQL) sont écrits en JSON avec la version du code
+et les paramètres, pour comparer deux versions de l'application.
+
+Usage:
+    python load_test.py --users 5000 --concurrency 100 --output avant.json
+    python load_test.py --users 5000 --concurrency 100 --compare avant.json
+"""
+import argparse
+import json
+import os
+import subprocess
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import numpy as np
+import psycopg2
+from psycopg.conninfo import conninfo_to_dict
+
+from cache_bus import CacheBus
+from data_access import DataAccess
+from queries import student_queries, student_tags, professor_queries, department_queries
+from snapshot import ScheduleSnapshot, schedule_version
+
+DEFAULT_DSN = "dbname=examens_db user=postgres host=localhost port=5432"
+
+# Répartition des sessions le jour de la publication
+DEFAULT_MIX = {'etudiant': 0.85, 'professeur': 0.08, 'chef_dept': 0.04, 'kpis': 0.03}
+
+# Part des recherches étudiantes avec un matricule erroné
+TYPO_RATE = 0.02
+
+PERCENTILES = (50, 95, 99)
+
+
+class Population:
+    """Identités tirées selon l'activité réelle de la base"""
+
+    def __init__(self, conn):
+        cur = conn.cursor()
+        cur.execute("""
+            SELECT et.matricule, COUNT(i.module_id)
+            FROM etudiants et
+            LEFT JOIN inscriptions i ON i.etudiant_id = et.id
+            GROUP BY et.matricule
+        """)
+        self.students, weights = zip(*cur.fetchall())
+        self.student_p = self._weights(weights)
+        cur.execute("""
+            SELECT p.matricule, COUNT(a.id)
+            FROM professeurs p
+            LEFT JOIN (affectations_surveillance a
+                       JOIN examens_publies e ON e.id = a.examen_id)
+                ON a.professeur_id = p.id
+            GROUP BY p.matricule
+        """)
+        self.professors, weights = zip(*cur.fetchall())
+        self.professor_p = self._weights(weights)
+        cur.execute("SELECT id FROM departements ORDER BY id")
+        self.departments = [row[0] for row in cur.fetchall()]
+        cur.close()
+
+    def _weights(self, counts):
+        counts = np.asarray(counts, dtype=np.float64) + 1
+        return counts / counts.sum()
+
+    def student(self, rng):
+        if rng.random() < TYPO_RATE:
+            return f"ETU{rng.integers(10 ** 8, 10 ** 9)}"
+        return self.students[rng.choice(len(self.students), p=self.student_p)]
+
+    def professor(self, rng):
+        return self.professors[rng.choice(len(self.professors), p=self.professor_p)]
+
+    def department(self, rng):
+        return self.departments[rng.integers(len(self.departments))]
+
+
+class AppReads:
+    """Chemins de lecture de app.py, hors Streamlit"""
+
+    def __init__(self, db_config, replicas=(), cache=True, pool_size=8):
+        self.conn = psycopg2.connect(**db_config)
+        self.data = DataAccess(db_config, replicas=replicas, max_size=pool_size)
+        self.bus = CacheBus(db_config) if cache else None
+        if self.bus is not None and replicas:
+            self.bus.subscribe(self.data.recheck)
+        # app.py partage une connexion psycopg2: les snapshots sont chargés un à la fois
+        self.snapshot_lock = threading.Lock()
+        self.snapshots = {}
+        self.loads = 0
+
+    def fetch(self, queries):
+        results = self.data.fetch_many(queries)
+        for result in results.values():
+            if isinstance(result, Exception):
+                raise result
+        return results
+
+    def cached(self, key, loader, **kwargs):
+        if self.bus is None:
+            return loader()
+
+        def load():
+            self.loads += 1
+            return loader()
+        return self.bus.get(key, load, **kwargs)
+
+    def snapshot(self):
+        def load():
+            with self.snapshot_lock:
+                version = schedule_version(self.conn)
+                if version not in self.snapshots:
+                    self.snapshots = {version: ScheduleSnapshot.load(self.conn)}
+                return self.snapshots[version]
+        return self.cached(('snapshot',), load)
+
+    def etudiant(self, matricule):
+        return self.cached(('etudiant', matricule),
+                           lambda: self.fetch(student_queries(matricule)), tags=student_tags)
+
+    def professeur(self, matricule):
+        return self.cached(('professeur', matricule),
+                           lambda: self.fetch(professor_queries(matricule)))
+
+    def chef_dept(self, dept_id):
+        results = self.fetch(department_queries())
+        snapshot = self.snapshot()
+        return snapshot.department_stats(dept_id), snapshot.department_planning(dept_id), results
+
+    def kpis(self):
+        return self.snapshot().kpis()
+
+    def close(self):
+        self.data.close()
+        self.conn.close()
+
+
+class SaturationSampler(threading.Thread):
+    """Occupation du pool et connexions PostgreSQL, échantillonnées"""
+
+    def __init__(self, db_config, pool, interval=0.25):
+        super().__init__(daemon=True, name='saturation')
+        self.conn = psycopg2.connect(**db_config)
+        self.conn.autocommit = True
+        self.pool = pool
+        self.interval = interval
+        self.samples = []
+        self.stopped = threading.Event()
+
+    def run(self):
+        cur = self.conn.cursor()
+        cur.execute("SHOW max_connections")
+        self.max_connections = int(cur.fetchone()[0])
+        while not self.stopped.wait(self.interval):
+            stats = self.pool.get_stats()
+            cur.execute("""
+                SELECT COUNT(*), COUNT(*) FILTER (WHERE state = 'active')
+                FROM pg_stat_activity
+                WHERE datname = current_database()
+            """)
+            connections, active = cur.fetchone()
+            self.samples.append((stats['pool_size'] - stats['pool_available'],
+                                 stats.get('requests_waiting', 0), connections, active))
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+        self.conn.close()
+
+    def summary(self, pool_max):
+        if not self.samples:
+            return {}
+        busy, waiting, connections, active = np.array(self.samples).T
+        return {
+            'pool_max': pool_max,
+            'pool_occupe_moyen': round(float(busy.mean()), 2),
+            'pool_occupe_max': int(busy.max()),
+            'pool_sature_pct': round(float((busy >= pool_max).mean() * 100), 1),
+            'attente_moyenne': round(float(waiting.mean()), 2),
+            'attente_max': int(waiting.max()),
+            'connexions_pg_max': int(connections.max()),
+            'connexions_pg_actives_max': int(active.max()),
+            'max_connections': self.max_connections,
+        }
+
+
+def run_session(reads, population, role, rng, pages, think, record, deadline):
+    """Une session: `pages` consultations de la même identité"""
+    if role == 'etudiant':
+        identity = population.student(rng)
+        action = lambda: reads.etudiant(identity)
+    elif role == 'professeur':
+        identity = population.professor(rng)
+        action = lambda: reads.professeur(identity)
+    elif role == 'chef_dept':
+        identity = population.department(rng)
+        action = lambda: reads.chef_dept(identity)
+    else:
+        action = reads.kpis
+
+    for page in range(pages):
+        if time.monotonic() > deadline:
+            return
+        start = time.perf_counter()
+        try:
+            action()
+            record(role, time.perf_counter() - start, None)
+        except Exception as e:
+            record(role, time.perf_counter() - start, e)
+        if think and page < pages - 1:
+            time.sleep(rng.exponential(think))
+
+
+def git_version():
+    try:
+        return subprocess.run(['git', 'describe', '--always', '--dirty'], capture_output=True,
+                              text=True, cwd=os.path.dirname(os.path.abspath(__file__)),
+                              check=True).stdout.strip()
+    except Exception:
+        return None
+
+
+def run(dsn, users, concurrency, mix, think, pages, duration, seed, replicas=(), cache=True,
+        pool_size=8):
+    db_config = conninfo_to_dict(dsn)
+    rng = np.random.default_rng(seed)
+    reads = AppReads(db_config, replicas=replicas, cache=cache, pool_size=pool_size)
+    population = Population(reads.conn)
+    reads.conn.rollback()
+
+    # Scénario fixé par la graine: rôles, nombre de pages et graines des sessions
+    roles = rng.choice(list(mix), size=users, p=np.array(list(mix.values())) / sum(mix.values()))
+    page_counts = rng.geometric(1 / pages, size=users)
+    session_seeds = rng.integers(0, 2 ** 32, size=users)
+
+    latencies = defaultdict(list)
+    errors = defaultdict(list)
+    lock = threading.Lock()
+
+    def record(role, elapsed, error):
+        with lock:
+            latencies[role].append(elapsed)
+            if error is not None:
+                errors[role].append(repr(error))
+
+    sampler = SaturationSampler(db_config, reads.data.pool)
+    sampler.start()
+    print(f"{users} sessions, {concurrency} simultanées, réflexion {think}s, graine {seed}")
+    start = time.perf_counter()
+    deadline = time.monotonic() + duration
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for role, n_pages, session_seed in zip(roles, page_counts, session_seeds):
+            session_rng = np.random.default_rng(session_seed)
+            executor.submit(run_session, reads, population, role, session_rng, int(n_pages),
+                            think, record, deadline)
+    elapsed = time.perf_counter() - start
+    sampler.stop()
+
+    total = sum(len(values) for values in latencies.values())
+    views = {}
+    for role, values in sorted(latencies.items()):
+        ms = np.array(values) * 1000
+        views[role] = {
+            'requetes': len(values),
+            'erreurs': len(errors[role]),
+            **{f'p{p}_ms': round(float(np.percentile(ms, p)), 2) for p in PERCENTILES},
+            'max_ms': round(float(ms.max()), 1),
+        }
+    all_ms = np.concatenate([np.array(v) for v in latencies.values()]) * 1000 if total else np.zeros(1)
+
+    result = {
+        'version': git_version(),
+        'date': datetime.now().isoformat(timespec='seconds'),
+        'parametres': {
+            'users': users, 'concurrency': concurrency, 'mix': mix, 'think': think,
+            'pages': pages, 'duration': duration, 'seed': seed, 'replicas': len(replicas),
+            'cache': cache, 'pool_size': pool_size,
+        },
+        'duree_s': round(elapsed, 2),
+        'requetes': total,
+        'debit_rps': round(total / elapsed, 1),
+        'erreurs': sum(len(v) for v in errors.values()),
+        **{f'p{p}_ms': round(float(np.percentile(all_ms, p)), 2) for p in PERCENTILES},
+        'chargements_cache': reads.loads if cache else None,
+        'vues': views,
+        'saturation': sampler.summary(pool_size),
+        'exemples_erreurs': {role: values[:3] for role, values in errors.items()},
+    }
+    reads.close()
+    return result
+
+
+def print_result(result, baseline=None):
+    def delta(key, values=result, base=baseline):
+        if base is None or base.get(key) in (None, 0):
+            return ""
+        return f"  ({(values[key] - base[key]) / base[key] * 100:+.0f} % vs {baseline['version']})"
+
+    print(f"\n=== CHARGE ({result['version']}) ===")
+    print(f"  {result['requetes']} requêtes en {result['duree_s']}s: "
+          f"{result['debit_rps']} req/s{delta('debit_rps')}")
+    for p in PERCENTILES:
+        print(f"  p{p}: {result[f'p{p}_ms']} ms{delta(f'p{p}_ms')}")
+    print(f"  erreurs: {result['erreurs']}")
+    if result['chargements_cache'] is not None:
+        hits = 1 - result['chargements_cache'] / max(result['requetes'], 1)
+        print(f"  cache: {result['chargements_cache']} chargements, {hits:.0%} de succès")
+    for role, view in result['vues'].items():
+        base = baseline['vues'].get(role) if baseline else None
+        print(f"  {role:11s} {view['requetes']:6d} req  p50 {view['p50_ms']:7.2f}  "
+              f"p95 {view['p95_ms']:7.2f}  p99 {view['p99_ms']:7.2f} ms"
+              f"{delta('p95_ms', view, base)}")
+    print("  saturation: " + ", ".join(f"{k}={v}" for k, v in result['saturation'].items()))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--dsn', default=os.environ.get('EXAMENS_DSN', DEFAULT_DSN))
+    parser.add_argument('--users', type=int, default=2000, help="sessions simulées")
+    parser.add_argument('--concurrency', type=int, default=50, help="sessions simultanées")
+    parser.add_argument('--think', type=float, default=0.5, help="réflexion moyenne entre pages (s)")
+    parser.add_argument('--pages', type=float, default=3, help="pages moyennes par session")
+    parser.add_argument('--duration', type=float, default=300, help="durée maximale (s)")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--mix', type=json.loads, default=DEFAULT_MIX,
+                        help='ex. \'{"etudiant": 0.9, "professeur": 0.1}\'')
+    parser.add_argument('--pool-size', type=int, default=8)
+    parser.add_argument('--no-cache', action='store_true', help="sans le cache applicatif")
+    parser.add_argument('--output', help="fichier JSON des résultats")
+    parser.add_argument('--compare', help="résultats JSON d'une autre version")
+    args = parser.parse_args()
+
+    replicas = [dsn.strip() for dsn in os.environ.get('EXAMENS_REPLICAS', '').split(';') if dsn.strip()]
+    result = run(args.dsn, args.users, args.concurrency, args.mix, args.think, args.pages,
+                 args.duration, args.seed, replicas=replicas, cache=not args.no_cache,
+                 pool_size=args.pool_size)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if baseline['parametres'] != result['parametres']:
+            print("Attention: paramètres différents de la référence")
+    print_result(result, baseline)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(result, f, indent=2, ensure_ascii=False)
+        print(f"✓ Résultats écrits dans {args.output}")
+
+
+if __name__ == "__main__":
+    main()
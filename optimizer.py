@@ -1,52 +1,784 @@
+import os
 import psycopg2
 from datetime import datetime, timedelta, time
 from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
 import random
+import tempfile
+import time as clock
+from bisect import bisect_left, insort
+
+import numpy as np
+
+from domain import Module, Room, Professor, Placement, NOTE_VALIDATION
+from enrollment_matrix import EnrollmentMatrix
+from exact_solver import solve_exact, evaluate_placements
+from feasibility import lower_bounds
+from versions import ensure_schema, create_version, publish_version, purge_versions
+import validator
+from generation_lock import GenerationCoordinator
+from problem_cache import (source_fingerprint, cache_path, matrix_dir, is_cached,
+                           purge_stale, save_problem, load_cached_problem,
+                           checkpoint_path, save_checkpoint, load_checkpoint, remove_checkpoint)
+
+# Borne supérieure des durées d'examen (minutes)
+MAX_DUREE = 24 * 60
+# Délai minimal entre deux sauvegardes de la recherche (secondes)
+CHECKPOINT_INTERVAL = 30
+
+
+def is_resit(note, statut):
+    """Indique si une inscription doit repasser le module en rattrapage"""
+    if statut == 'ajourne':
+        return True
+    return note is not None and note < NOTE_VALIDATION
+
+
+def to_minutes(t):
+    """Convertit une heure en minutes depuis minuit"""
+    return t.hour * 60 + t.minute
+
+
+def overlaps(intervals, debut, fin):
+    """Indique si [debut, fin[ chevauche un des intervalles"""
+    return any(debut < f and d < fin for d, f in intervals)
+
+
+class DayGrid:
+    """Grille horaire d'une journée d'examens
+
+    Les examens démarrent sur un pas de `granularity` minutes entre
+    `start` et `end`, sans chevaucher les pauses, et une salle est
+    libérée `turnover` minutes après la fin d'un examen.
+    """
+
+    def __init__(self, start=time(8, 0), end=time(18, 0),
+                 breaks=((time(12, 30), time(13, 30)),), granularity=30, turnover=30):
+        self.start = to_minutes(start)
+        self.end = to_minutes(end)
+        self.breaks = [(to_minutes(b), to_minutes(e)) for b, e in breaks]
+        self.granularity = granularity
+        self.turnover = turnover
+        self._starts = {}
+
+    def valid_starts(self, duree):
+        """Heures de début possibles (en minutes) pour un examen de cette durée"""
+        if duree not in self._starts:
+            self._starts[duree] = [
+                debut for debut in range(self.start, self.end, self.granularity)
+                if debut + duree <= self.end and not overlaps(self.breaks, debut, debut + duree)
+            ]
+        return self._starts[duree]
+
+    def to_time(self, minutes):
+        return time(minutes // 60, minutes % 60)
+
+
+class FairnessPolicy:
+    """Contraintes d'équité pour les étudiants
+
+    - min_gap_days: jours de repos minimum entre deux examens d'un étudiant
+    - max_per_window: au plus K examens par fenêtre glissante de window_days jours
+    - no_consecutive_formation: pas d'examens de la même formation deux jours de suite
+
+    Les contraintes listées dans `hard` rendent le jour impossible, les
+    autres ajoutent une pénalité (nombre d'étudiants touchés x poids).
+    """
+
+    CONSTRAINTS = ('min_gap', 'max_window', 'formation_consecutive')
+
+    def __init__(self, min_gap_days=0, max_per_window=None, window_days=3,
+                 no_consecutive_formation=False, hard=(), weights=None):
+        self.min_gap_days = min_gap_days
+        self.max_per_window = max_per_window
+        self.window_days = window_days
+        self.no_consecutive_formation = no_consecutive_formation
+        self.hard = set(hard)
+        self.weights = {name: 1.0 for name in self.CONSTRAINTS}
+        self.weights.update(weights or {})
+
+    @property
+    def active(self):
+        return bool(self.min_gap_days or self.max_per_window or self.no_consecutive_formation)
+
+
+class ScheduleState:
+    """État en mémoire d'un planning en construction (sans accès à la base)
+
+    Les jours sont des indices dans `days`; les étudiants sont indexés de
+    façon dense (`module_student_idx`) pour les tableaux d'équité. Les
+    modules (clés de `conflict_graph`) et les salles sont eux aussi
+    indexés par entier pour les boucles de placement.
+    """
+
+    def __init__(self, days, grid, rooms, conflict_graph, module_student_idx,
+                 n_students, formation_ids, fairness=None):
+        self.days = days
+        self.grid = grid
+        # Trier par capacité croissante pour optimiser l'utilisation
+        self.rooms = sorted(rooms, key=lambda r: r.capacite)
+        self.room_capacities = [room.capacite for room in self.rooms]
+        self.room_index = {room.id: i for i, room in enumerate(self.rooms)}
+        # Voisins de chaque module dans le graphe de conflits, en indices (CSR)
+        self.module_index = {module_id: i for i, module_id in enumerate(conflict_graph)}
+        self.neighbour_ptr = np.zeros(len(conflict_graph) + 1, dtype=np.int64)
+        np.cumsum([len(others) for others in conflict_graph.values()], out=self.neighbour_ptr[1:])
+        self.neighbour_idx = np.fromiter(
+            (self.module_index.get(o, -1) for others in conflict_graph.values() for o in others),
+            dtype=np.int32, count=int(self.neighbour_ptr[-1]))
+        self.module_student_idx = module_student_idx
+        self.fairness = fairness or FairnessPolicy()
+        # Jour de chaque module placé (-1 sinon); la dernière case sert aux
+        # voisins hors du graphe (indice -1) et reste à -1
+        self.module_day = np.full(len(self.module_index) + 1, -1, dtype=np.int16)
+        # Intervalles occupés (début, fin) triés, par salle puis par jour
+        # (listes créées au premier examen)
+        self.room_busy = [[None] * len(days) for _ in self.rooms]
+        # Plus petite durée sans créneau libre par salle et par jour: une
+        # durée supérieure ne trouvera rien tant qu'aucun examen n'est retiré
+        self.room_full = [[MAX_DUREE] * len(days) for _ in self.rooms]
+        # Nombre d'examens par (étudiant, jour) et (formation, jour)
+        self.formation_index = {}
+        for formation_id in formation_ids:
+            self.formation_index.setdefault(formation_id, len(self.formation_index))
+        self.student_days = np.zeros((n_students, len(days)), dtype=np.int8)
+        self.formation_days = np.zeros((len(self.formation_index), len(days)), dtype=np.int16)
+
+    def neighbour_days(self, module_id):
+        """Jours des modules voisins (-1 pour ceux non placés)"""
+        i = self.module_index.get(module_id)
+        if i is None:
+            return self.module_day[:0]
+        return self.module_day[self.neighbour_idx[self.neighbour_ptr[i]:self.neighbour_ptr[i + 1]]]
+
+    def check_student_conflict(self, module_id, day):
+        """Nombre de modules en conflit déjà placés ce jour"""
+        return int(np.count_nonzero(self.neighbour_days(module_id) == day))
+
+    def fairness_penalty(self, module_id, formation_id, day):
+        """Score d'équité d'un examen placé au jour `day` (None si interdit)"""
+        policy = self.fairness
+        if not policy.active:
+            return 0
+
+        idx = self.module_student_idx[module_id]
+        n_days = self.student_days.shape[1]
+        penalty = 0.0
+        violations = {}
+
+        if policy.min_gap_days:
+            lo, hi = max(0, day - policy.min_gap_days), min(n_days, day + policy.min_gap_days + 1)
+            window = self.student_days[idx, lo:hi]
+            violations['min_gap'] = int(np.count_nonzero(window.any(axis=1)))
+
+        if policy.max_per_window:
+            w = policy.window_days
+            over = np.zeros(len(idx), dtype=bool)
+            for lo in range(max(0, day - w + 1), min(day, n_days - w) + 1):
+                counts = self.student_days[idx, lo:lo + w].sum(axis=1)
+                over |= counts + 1 > policy.max_per_window
+            violations['max_window'] = int(np.count_nonzero(over))
+
+        if policy.no_consecutive_formation:
+            row = self.formation_days[self.formation_index[formation_id]]
+            neighbours = (day > 0 and row[day - 1] > 0) + (day + 1 < n_days and row[day + 1] > 0)
+            violations['formation_consecutive'] = int(neighbours) * len(idx)
+
+        for name, count in violations.items():
+            if count == 0:
+                continue
+            if name in policy.hard:
+                return None
+            penalty += policy.weights[name] * count
+
+        return penalty
+
+    def candidate_days(self, module_id, formation_id):
+        """Jours sans conflit étudiant, classés par pénalité d'équité"""
+        blocked = np.zeros(len(self.days), dtype=bool)
+        neighbour_days = self.neighbour_days(module_id)
+        blocked[neighbour_days[neighbour_days >= 0]] = True
+
+        candidates = []
+        for day in np.flatnonzero(~blocked).tolist():
+            penalty = self.fairness_penalty(module_id, formation_id, day)
+            if penalty is not None:
+                candidates.append((penalty, day))
+        candidates.sort()
+        return [day for _, day in candidates]
+
+    def check_room_conflict(self, room_id, day, debut, duree):
+        """Vérifie si la salle est occupée, battement compris"""
+        busy = self.room_busy[self.room_index[room_id]][day] or ()
+        return overlaps(busy, debut, debut + duree + self.grid.turnover)
+
+    def find_room_start(self, r, day, duree):
+        """Première heure de début libre dans la salle d'indice r (examens accolés)
+
+        Les intervalles d'une salle sont disjoints et triés: un seul
+        parcours conjoint des débuts possibles et des intervalles suffit.
+        """
+        if duree >= self.room_full[r][day]:
+            return None
+        busy = self.room_busy[r][day] or ()
+        n_busy = len(busy)
+        span = duree + self.grid.turnover
+        j = 0
+        for debut in self.grid.valid_starts(duree):
+            while j < n_busy and busy[j][1] <= debut:
+                j += 1
+            if j == n_busy or busy[j][0] >= debut + span:
+                return debut
+        self.room_full[r][day] = duree
+        return None
+
+    def assign_room(self, nb_inscrits, day, duree):
+        """Trouve une salle appropriée et l'heure de début de l'examen"""
+        # Les salles trop petites sont sautées d'un coup (capacités triées)
+        for r in range(bisect_left(self.room_capacities, nb_inscrits), len(self.rooms)):
+            debut = self.find_room_start(r, day, duree)
+            if debut is not None:
+                return self.rooms[r].id, debut
+        return None, None
+
+    def place(self, module, placement):
+        """Enregistre un examen placé"""
+        day, debut = placement.day, placement.debut
+        r = self.room_index[placement.room_id]
+        if self.room_busy[r][day] is None:
+            self.room_busy[r][day] = []
+        insort(self.room_busy[r][day], (debut, debut + module.duree + self.grid.turnover))
+        self.module_day[self.module_index[module.id]] = day
+        self.student_days[self.module_student_idx[module.id], day] += 1
+        self.formation_days[self.formation_index[module.formation_id], day] += 1
+
+    def unplace(self, module, placement):
+        """Annule le placement d'un examen"""
+        day, debut = placement.day, placement.debut
+        r = self.room_index[placement.room_id]
+        self.room_busy[r][day].remove((debut, debut + module.duree + self.grid.turnover))
+        self.room_full[r][day] = MAX_DUREE
+        self.module_day[self.module_index[module.id]] = -1
+        self.student_days[self.module_student_idx[module.id], day] -= 1
+        self.formation_days[self.formation_index[module.formation_id], day] -= 1
+
+    def fairness_statistics(self, window_days=3):
+        """Indicateurs d'équité du planning"""
+        stats = {}
+        if not self.student_days.size:
+            return stats
+
+        has_exam = self.student_days > 0
+        n_days = has_exam.shape[1]
+
+        # Écart minimal (en jours) entre deux examens consécutifs de chaque étudiant
+        rows, cols = np.nonzero(has_exam)
+        same_student = rows[1:] == rows[:-1]
+        gaps = np.diff(cols)[same_student]
+        gap_students = rows[1:][same_student]
+        min_gap = np.full(has_exam.shape[0], np.iinfo(np.int32).max, dtype=np.int32)
+        np.minimum.at(min_gap, gap_students, gaps)
+        min_gap = min_gap[min_gap != np.iinfo(np.int32).max]
+
+        stats['ecart_min_moyen'] = round(float(min_gap.mean()), 2) if min_gap.size else 0
+        stats['etudiants_jours_consecutifs'] = int(np.count_nonzero(min_gap == 1))
+
+        # Nombre maximal d'examens sur une fenêtre glissante
+        w = min(window_days, n_days)
+        cumsum = np.concatenate([np.zeros((has_exam.shape[0], 1), dtype=np.int32),
+                                 np.cumsum(self.student_days, axis=1, dtype=np.int32)], axis=1)
+        per_window = (cumsum[:, w:] - cumsum[:, :-w]).max(axis=1)
+        stats[f'max_examens_{window_days}_jours'] = int(per_window.max())
+        if self.fairness.max_per_window:
+            stats['etudiants_fenetre_depassee'] = int(
+                np.count_nonzero(per_window > self.fairness.max_per_window))
+
+        # Formations avec des examens deux jours de suite
+        formation_exam = self.formation_days > 0
+        stats['formations_jours_consecutifs'] = int(
+            np.count_nonzero((formation_exam[:, 1:] & formation_exam[:, :-1]).any(axis=1)))
+
+        return stats
+
+
+class SupervisorPool:
+    """Disponibilités des surveillants pendant la construction d'un planning
+
+    Au plus 3 surveillances par jour et par professeur, sans chevauchement.
+    Les jours sont des clés quelconques (dates ou indices de jour).
+    """
+
+    def __init__(self, professors):
+        self.professors = list(professors)
+        self.by_dept = defaultdict(list)
+        for prof in self.professors:
+            self.by_dept[prof.dept_id].append(prof.id)
+        # Intervalles de surveillance (début, fin) par (prof, jour)
+        self.busy = defaultdict(list)
+
+    def count(self, prof_id, day):
+        return len(self.busy[(prof_id, day)])
+
+    def available(self, prof_id, day, debut, fin):
+        """Max 3 examens par jour et pas deux surveillances simultanées"""
+        busy = self.busy[(prof_id, day)]
+        return len(busy) < 3 and not overlaps(busy, debut, fin)
+
+    def pick(self, dept_id, day, debut, duree, nb_required=2):
+        """Choisit et réserve les surveillants d'un examen
+
+        Les professeurs du département passent d'abord (le premier est
+        responsable), puis d'autres au hasard. Retourne [(prof_id, rôle)].
+        """
+        fin = debut + duree
+        assigned = []
+
+        for prof_id in self.by_dept[dept_id]:
+            if len(assigned) >= nb_required:
+                break
+            if self.available(prof_id, day, debut, fin):
+                assigned.append((prof_id, 'responsable' if not assigned else 'surveillant'))
+
+        # Si pas assez de profs du département, prendre d'autres
+        if len(assigned) < nb_required:
+            chosen = {prof_id for prof_id, _ in assigned}
+            others = [prof.id for prof in self.professors if prof.id not in chosen]
+            random.shuffle(others)
+            for prof_id in others:
+                if len(assigned) >= nb_required:
+                    break
+                if self.available(prof_id, day, debut, fin):
+                    assigned.append((prof_id, 'surveillant'))
+
+        for prof_id, _ in assigned:
+            self.busy[(prof_id, day)].append((debut, fin))
+
+        return assigned
+
+    def load(self):
+        """Nombre de surveillances par professeur sollicité"""
+        counts = defaultdict(int)
+        for (prof_id, _), intervals in self.busy.items():
+            counts[prof_id] += len(intervals)
+        return [n for n in counts.values() if n]
+
+
+def place_modules(state, modules, max_attempts=None):
+    """Placement glouton jour / salle / heure des modules, dans l'ordre donné
+
+    Tous les jours candidats sont essayés, sauf limite `max_attempts`.
+    Retourne {module_id: Placement} et la liste des ids des modules qui
+    n'ont pas pu être placés.
+    """
+    placements = {}
+    unscheduled = []
+
+    for module in modules:
+        for attempts, day in enumerate(state.candidate_days(module.id, module.formation_id)):
+            if max_attempts is not None and attempts >= max_attempts:
+                break
+            # Trouver une salle et la première heure libre
+            room_id, debut = state.assign_room(module.nb_inscrits, day, module.duree)
+            if room_id is not None:
+                placement = Placement(day, debut, room_id)
+                state.place(module, placement)
+                placements[module.id] = placement
+                break
+
+        if module.id not in placements:
+            unscheduled.append(module.id)
+
+    return placements, unscheduled
+
+
+def search_schedule(make_state, modules, state, placements, unscheduled, deadline,
+                    save=None, progress=None, priorities=None, iterations=0, seed=0):
+    """Amélioration « anytime » d'un planning jusqu'à l'échéance `deadline`
+
+    Recherche de type squeaky wheel: à chaque itération le glouton est
+    relancé sur un état neuf (`make_state()`), les modules non placés à
+    l'itération précédente passant en tête, suivis de ceux placés le
+    dernier jour; un léger bruit diversifie l'ordre. Le meilleur planning
+    (evaluate_placements: non planifiés, puis dernier jour, puis somme des
+    jours) est conservé et retourné à l'échéance.
+
+    `save(meilleur, priorites, iterations)` est appelé toutes les
+    CHECKPOINT_INTERVAL secondes et à l'échéance, pour reprendre la
+    recherche après une interruption.
+    """
+    rng = random.Random(seed + iterations)
+    n_days = len(state.days)
+    priorities = dict(priorities or {})
+    best = (evaluate_placements(modules, placements, n_days), state, placements, unscheduled)
+    current_placements, current_unscheduled = placements, unscheduled
+    start = clock.monotonic()
+    last_save = start
+
+    while clock.monotonic() < deadline:
+        # Les modules difficiles gagnent en priorité
+        for module_id in current_unscheduled:
+            priorities[module_id] = priorities.get(module_id, 0) + 1 + rng.random()
+        last_day = max((p.day for p in current_placements.values()), default=0)
+        for module_id, placement in current_placements.items():
+            if placement.day == last_day:
+                priorities[module_id] = priorities.get(module_id, 0) + rng.random()
+
+        order = sorted(modules, key=lambda m: (-priorities.get(m.id, 0), -m.nb_inscrits))
+        candidate = make_state()
+        current_placements, current_unscheduled = place_modules(candidate, order)
+        iterations += 1
+
+        cost = evaluate_placements(modules, current_placements, n_days)
+        if cost < best[0]:
+            best = (cost, candidate, current_placements, current_unscheduled)
+        now = clock.monotonic()
+        if save is not None and now - last_save >= CHECKPOINT_INTERVAL:
+            save(best, priorities, iterations)
+            last_save = now
+        if progress is not None:
+            progress(int(now - start), iterations, len(best[3]))
+
+    if save is not None:
+        save(best, priorities, iterations)
+    _, state, placements, unscheduled = best
+    return state, placements, unscheduled, iterations
+
+
+def conflict_components(conflict_graph):
+    """Composantes connexes du graphe de conflits entre modules"""
+    seen = set()
+    components = []
+    for module_id in conflict_graph:
+        if module_id in seen:
+            continue
+        component = []
+        stack = [module_id]
+        seen.add(module_id)
+        while stack:
+            current = stack.pop()
+            component.append(current)
+            for other_id in conflict_graph[current]:
+                if other_id not in seen:
+                    seen.add(other_id)
+                    stack.append(other_id)
+        components.append(component)
+    return components
+
+
+def cluster_modules(modules, conflict_graph, n_clusters):
+    """Regroupe les composantes connexes en clusters de charge équilibrée
+
+    Les composantes d'un même département restent ensemble (elles
+    partagent surtout des salles et des surveillants), puis les
+    départements sont répartis sur les clusters par charge décroissante
+    (places x minutes).
+    """
+    by_id = {m.id: m for m in modules}
+    groups = defaultdict(list)
+    for component in conflict_components(conflict_graph):
+        depts = [by_id[module_id].dept_id for module_id in component]
+        groups[max(set(depts), key=depts.count)].extend(component)
+
+    def load(module_ids):
+        return sum(by_id[m].charge for m in module_ids)
+
+    clusters = [[] for _ in range(min(n_clusters, len(groups)) or 1)]
+    loads = [0] * len(clusters)
+    for module_ids in sorted(groups.values(), key=load, reverse=True):
+        target = loads.index(min(loads))
+        clusters[target].extend(module_ids)
+        loads[target] += load(module_ids)
+
+    return [
+        sorted((by_id[m] for m in cluster), key=lambda m: m.nb_inscrits, reverse=True)
+        for cluster in clusters if cluster
+    ], loads
+
+
+def partition_rooms(rooms, clusters, loads):
+    """Répartit les salles entre clusters proportionnellement à leur charge
+
+    Chaque cluster reçoit d'abord la plus petite salle couvrant son plus
+    gros module, puis les salles restantes vont, de la plus grande à la
+    plus petite, au cluster le moins bien servi.
+    """
+    shares = [[] for _ in clusters]
+    capacity = [0] * len(clusters)
+    remaining = sorted(rooms, key=lambda r: r.capacite)
+
+    for i, cluster in enumerate(clusters):
+        largest = max(m.nb_inscrits for m in cluster)
+        for room in remaining:
+            if room.capacite >= largest:
+                shares[i].append(room)
+                capacity[i] += room.capacite
+                remaining.remove(room)
+                break
+
+    for room in sorted(remaining, key=lambda r: r.capacite, reverse=True):
+        target = min(range(len(clusters)), key=lambda i: capacity[i] / max(1, loads[i]))
+        shares[target].append(room)
+        capacity[target] += room.capacite
+
+    return shares
+
+
+def solve_cluster(task):
+    """Placement d'un cluster dans un processus worker"""
+    modules, conflict_graph, module_student_idx, rooms, n_days, grid, fairness = task
+
+    # La matrice d'inscriptions est rouverte par mmap (pages partagées);
+    # réindexation locale des étudiants pour des tableaux compacts
+    all_idx = np.unique(np.concatenate([module_student_idx[m.id] for m in modules]))
+    local_idx = {
+        m.id: np.searchsorted(all_idx, module_student_idx[m.id]).astype(np.int32)
+        for m in modules
+    }
+
+    state = ScheduleState(list(range(n_days)), grid, rooms, conflict_graph, local_idx,
+                          len(all_idx), [m.formation_id for m in modules], fairness)
+    return place_modules(state, modules)
+
+
+class Scenario:
+    """Hypothèse de planification, simulée sans écriture en base
+
+    - closed_rooms: ids des salles fermées
+    - max_days: fenêtre d'examens en jours (None: celle de référence)
+    - extra_students: {formation_id: nb} étudiants supplémentaires, inscrits
+      à tous les modules de leur formation
+    - day_grid, fairness: remplacent la grille et la politique d'équité
+    """
+
+    def __init__(self, nom, closed_rooms=(), max_days=None, extra_students=None,
+                 day_grid=None, fairness=None):
+        self.nom = nom
+        self.closed_rooms = set(closed_rooms)
+        self.max_days = max_days
+        self.extra_students = dict(extra_students or {})
+        self.day_grid = day_grid
+        self.fairness = fairness
+
+
+class ExtendedEnrollment:
+    """Inscriptions de référence complétées par des étudiants fictifs"""
+
+    def __init__(self, base, modules_idx, n_students):
+        self.base = base
+        self.modules_idx = modules_idx
+        self.n_students = n_students
+
+    def __getitem__(self, module_id):
+        if module_id in self.modules_idx:
+            return self.modules_idx[module_id]
+        return self.base[module_id]
+
+
+def apply_scenario(problem, scenario):
+    """Copie du problème modifiée selon le scénario (le problème reste intact)"""
+    rooms = [room for room in problem['rooms'] if room.id not in scenario.closed_rooms]
+    modules = problem['modules']
+    graph = problem['conflict_graph']
+    enrollment = problem['module_student_idx']
+
+    if scenario.extra_students:
+        by_formation = defaultdict(list)
+        for m in modules:
+            by_formation[m.formation_id].append(m.id)
+
+        n_students = enrollment.n_students
+        modules_idx = {}
+        graph = dict(graph)
+        for formation_id, nb in scenario.extra_students.items():
+            module_ids = by_formation.get(formation_id, [])
+            if nb <= 0 or not module_ids:
+                continue
+            added = np.arange(n_students, n_students + nb, dtype=np.int32)
+            n_students += nb
+            for module_id in module_ids:
+                modules_idx[module_id] = np.concatenate([enrollment[module_id], added])
+                # Les nouveaux étudiants relient tous les modules de la formation
+                graph[module_id] = graph[module_id] | (set(module_ids) - {module_id})
+
+        enrollment = ExtendedEnrollment(enrollment, modules_idx, n_students)
+        modules = sorted((
+            Module(m.id, m.code, m.nom, m.duree, m.formation_id, m.dept_id,
+                   len(modules_idx[m.id])) if m.id in modules_idx else m
+            for m in modules
+        ), key=lambda m: m.nb_inscrits, reverse=True)
+
+    return {
+        'modules': modules,
+        'conflict_graph': graph,
+        'module_student_idx': enrollment,
+        'rooms': rooms,
+        'professors': problem['professors']
+    }
+
+
+def simulate_problem(problem, scenario, max_days=30, day_grid=None, fairness=None,
+                     nb_supervisors=2):
+    """Planifie un scénario en mémoire et retourne ses indicateurs"""
+    start_time = datetime.now()
+    problem = apply_scenario(problem, scenario)
+    modules = problem['modules']
+    enrollment = problem['module_student_idx']
+    n_days = scenario.max_days or max_days
+
+    state = ScheduleState(
+        list(range(n_days)), scenario.day_grid or day_grid or DayGrid(), problem['rooms'],
+        problem['conflict_graph'], enrollment, enrollment.n_students,
+        [m.formation_id for m in modules], scenario.fairness or fairness
+    )
+    placements, unscheduled = place_modules(state, modules)
+
+    # Surveillants, dans l'ordre de génération du planning réel
+    supervisors = SupervisorPool(problem['professors'])
+    capacities = {room.id: room.capacite for room in problem['rooms']}
+    occupation = []
+    without_supervisor = []
+    for module in modules:
+        placement = placements.get(module.id)
+        if placement is None:
+            continue
+        if not supervisors.pick(module.dept_id, placement.day, placement.debut,
+                                module.duree, nb_supervisors):
+            state.unplace(module, placement)
+            del placements[module.id]
+            without_supervisor.append(module.code)
+            continue
+        occupation.append(module.nb_inscrits / capacities[placement.room_id] * 100)
+
+    load = supervisors.load()
+    days = [placement.day for placement in placements.values()]
+
+    return {
+        'scenario': scenario.nom,
+        'modules': len(modules),
+        'planifies': len(placements),
+        'non_planifies': len(unscheduled) + len(without_supervisor),
+        'sans_surveillant': len(without_supervisor),
+        'nb_jours': len(set(days)),
+        'dernier_jour': max(days) + 1 if days else 0,
+        'taux_occupation': round(float(np.mean(occupation)), 2) if occupation else 0,
+        'moy_surveillances': round(float(np.mean(load)), 2) if load else 0,
+        'max_surveillances': max(load, default=0),
+        'salles': len(problem['rooms']),
+        'etudiants': enrollment.n_students,
+        'temps': round((datetime.now() - start_time).total_seconds(), 2),
+        'modules_non_planifies': [m.code for m in modules if m.id in set(unscheduled)]
+                                 + without_supervisor
+    }
+
+
+# Problème partagé par les workers de simulation (chargé une fois par processus)
+_simulation_problem = None
+
+
+def _init_simulation_worker(problem):
+    global _simulation_problem
+    _simulation_problem = problem
+
+
+def run_scenario(task):
+    """Simulation d'un scénario dans un processus worker"""
+    scenario, max_days, day_grid, fairness = task
+    return simulate_problem(_simulation_problem, scenario, max_days, day_grid, fairness)
+
 
 class ExamScheduler:
-    def __init__(self, db_config):
+    def __init__(self, db_config, cache_dir='cache'):
         self.conn = psycopg2.connect(**db_config)
+        # Dossier du cache disque des problèmes chargés (None pour désactiver)
+        self.cache_dir = cache_dir
+        # Matrices d'inscriptions hors cache, supprimées par close()
+        self.scratch = None
         self.cur = self.conn.cursor()
         self.conflicts = []
+        self.problem = None
+        self.state = None
+        self.grid = DayGrid()
+        self.supervisors = SupervisorPool(())
+        # Version écrite par la dernière génération
+        self.version_id = None
+        # Empreinte des données du dernier problème chargé (None sans cache)
+        self.fingerprint = None
+        # Fichier de reprise de la recherche en cours
+        self.checkpoint = None
+        # Validation de la version écrite par la dernière génération
+        self.validation = None
         
-    def clear_existing_schedule(self, annee_academique, session):
-        """Supprime les examens existants pour cette session"""
-        self.cur.execute("""
-            DELETE FROM affectations_surveillance
-            WHERE examen_id IN (
-                SELECT id FROM examens
-                WHERE annee_academique = %s AND session = %s
-            )
-        """, (annee_academique, session))
+    def load_problem(self, annee_academique, session="normale"):
+        """Données du problème, depuis le cache disque si les sources n'ont pas changé"""
+        if self.cache_dir is None:
+            self.fingerprint = None
+            if self.scratch is None:
+                self.scratch = tempfile.TemporaryDirectory(prefix='inscriptions_')
+            return self.build_problem(annee_academique, session,
+                                      tempfile.mkdtemp(dir=self.scratch.name))
         
-        self.cur.execute("""
-            DELETE FROM examens
-            WHERE annee_academique = %s AND session = %s
-        """, (annee_academique, session))
+        fingerprint = self.fingerprint = source_fingerprint(self.cur, annee_academique)
+        path = cache_path(self.cache_dir, annee_academique, session, fingerprint)
+        if is_cached(path):
+            print(f"✓ Problème chargé depuis le cache ({path})")
+            return load_cached_problem(path)
         
-        self.conn.commit()
-        print(f"✓ Planning existant supprimé pour {session} {annee_academique}")
+        purge_stale(path)
+        problem = self.build_problem(annee_academique, session, matrix_dir(path))
+        save_problem(path, problem)
+        return problem
     
-    def get_modules_to_schedule(self, annee_academique):
-        """Récupère tous les modules à planifier avec nb d'inscrits"""
+    def build_problem(self, annee_academique, session, directory):
+        """Construit les données du problème pour une session
+
+        Les inscriptions sont lues en flux dans une matrice creuse mappée
+        en mémoire (`directory`), le graphe de conflits en est déduit par
+        blocs. En rattrapage, seules les inscriptions ajournées (statut
+        'ajourne' ou note éliminatoire) sont retenues: la taille des salles
+        et le graphe de conflits reposent sur la population réelle.
+        """
         self.cur.execute("""
-            SELECT
-                m.id,
-                m.code,
-                m.nom,
-                m.duree_examen,
-                m.formation_id,
-                f.dept_id,
-                COUNT(i.etudiant_id) as nb_inscrits
+            SELECT m.id, m.code, m.nom, m.duree_examen, m.formation_id, f.dept_id
             FROM modules m
             JOIN formations f ON m.formation_id = f.id
-            JOIN inscriptions i ON m.id = i.module_id
-            WHERE i.annee_academique = %s
-            GROUP BY m.id, m.code, m.nom, m.duree_examen, m.formation_id, f.dept_id
-            ORDER BY nb_inscrits DESC
-        """, (annee_academique,))
-        
-        return self.cur.fetchall()
+        """)
+        module_rows = {row[0]: row[1:] for row in self.cur.fetchall()}
+
+        matrix = EnrollmentMatrix.build(self.conn, directory, """
+            SELECT etudiant_id, module_id
+            FROM inscriptions
+            WHERE annee_academique = %s
+              AND (%s <> 'rattrapage' OR statut = 'ajourne' OR note < %s)
+            ORDER BY etudiant_id, module_id
+        """, (annee_academique, session, NOTE_VALIDATION), list(module_rows))
+
+        modules = [
+            Module(module_id, *module_rows[module_id], nb_inscrits)
+            for module_id, nb_inscrits in zip(matrix.module_ids.tolist(),
+                                              matrix.module_counts().tolist())
+            if nb_inscrits > 0
+        ]
+        modules.sort(key=lambda m: m.nb_inscrits, reverse=True)
+        graph = matrix.conflict_graph()
+
+        self.cur.execute("""
+            SELECT id, dept_id
+            FROM professeurs
+            ORDER BY id
+        """)
+        professors = [Professor(*row) for row in self.cur.fetchall()]
+
+        return {
+            'modules': modules,
+            'conflict_graph': {m.id: graph[m.id] for m in modules},
+            'module_student_idx': matrix,
+            'rooms': self.get_available_rooms(),
+            'professors': professors
+        }
+
+    def get_modules_to_schedule(self, annee_academique, session="normale"):
+        """Récupère tous les modules à planifier avec nb d'inscrits"""
+        return self.load_problem(annee_academique, session)['modules']
     
     def get_available_rooms(self):
         """Récupère toutes les salles disponibles"""
@@ -57,7 +789,7 @@ class ExamScheduler:
             ORDER BY capacite_examen DESC
         """)
         
-        return self.cur.fetchall()
+        return [Room(*row) for row in self.cur.fetchall()]
     
     def get_professors_by_department(self, dept_id):
         """Récupère les professeurs d'un département"""
@@ -76,206 +808,370 @@ class ExamScheduler:
             FROM professeurs
         """)
         
-        return self.cur.fetchall()
-    
-    def check_student_conflict(self, module_id, date_examen, heure_debut):
-        """Vérifie si des étudiants ont déjà un examen ce jour"""
-        self.cur.execute("""
-            SELECT COUNT(DISTINCT i.etudiant_id)
-            FROM inscriptions i
-            JOIN examens e ON e.module_id IN (
-                SELECT module_id
-                FROM inscriptions
-                WHERE etudiant_id = i.etudiant_id
-            )
-            WHERE i.module_id = %s
-            AND e.date_examen = %s
-        """, (module_id, date_examen))
-        
-        result = self.cur.fetchone()
-        return result[0] if result else 0
-    
-    def check_room_conflict(self, room_id, date_examen, heure_debut, duree):
-        """Vérifie si la salle est disponible"""
-        heure_fin = (datetime.combine(datetime.today(), heure_debut) +
-                    timedelta(minutes=duree)).time()
-        
-        self.cur.execute("""
-            SELECT COUNT(*)
-            FROM examens
-            WHERE lieu_id = %s
-            AND date_examen = %s
-            AND (
-                (heure_debut <= %s AND
-                (heure_debut + (duree_minutes || ' minutes')::interval)::time > %s)
-                OR
-                (heure_debut < %s AND
-                (heure_debut + (duree_minutes || ' minutes')::interval)::time >= %s)
-            )
-        """, (room_id, date_examen, heure_debut, heure_debut, heure_fin, heure_fin))
-        
-        result = self.cur.fetchone()
-        return result[0] > 0
+        return [Professor(*row) for row in self.cur.fetchall()]
     
     def count_professor_exams_on_date(self, prof_id, date_examen):
         """Compte le nombre d'examens d'un prof sur une date"""
-        self.cur.execute("""
-            SELECT COUNT(*)
-            FROM affectations_surveillance a
-            JOIN examens e ON a.examen_id = e.id
-            WHERE a.professeur_id = %s
-            AND e.date_examen = %s
-        """, (prof_id, date_examen))
-        
-        result = self.cur.fetchone()
-        return result[0] if result else 0
+        return self.supervisors.count(prof_id, date_examen)
     
-    def assign_room(self, nb_inscrits, date_examen, heure_debut, duree):
-        """Trouve et assigne une salle appropriée"""
-        rooms = self.get_available_rooms()
+    def professor_available(self, prof_id, date_examen, debut, fin):
+        """Max 3 examens par jour et pas deux surveillances simultanées"""
+        return self.supervisors.available(prof_id, date_examen, debut, fin)
+    
+    def place_in_parallel(self, modules, rooms, workers):
+        """Décomposition en clusters indépendants résolus en parallèle
         
-        # Trier par capacité croissante pour optimiser l'utilisation
-        suitable_rooms = [r for r in rooms if r[2] >= nb_inscrits]
-        suitable_rooms.sort(key=lambda x: x[2])
+        Chaque worker place un cluster de composantes connexes du graphe de
+        conflits avec sa part des salles; les résultats sont fusionnés puis
+        les modules non placés ou en collision sont replacés sur l'ensemble
+        des salles. Les surveillants sont affectés ensuite, globalement.
+        """
+        graph = self.problem['conflict_graph']
+        clusters, loads = cluster_modules(modules, graph, workers)
+        shares = partition_rooms(rooms, clusters, loads)
         
-        for room_id, nom, capacite, type_lieu in suitable_rooms:
-            if not self.check_room_conflict(room_id, date_examen, heure_debut, duree):
-                return room_id
+        tasks = []
+        for cluster, share in zip(clusters, shares):
+            ids = {m.id for m in cluster}
+            tasks.append((
+                cluster,
+                {module_id: graph[module_id] & ids for module_id in ids},
+                self.problem['module_student_idx'],
+                share, len(self.state.days), self.grid, self.state.fairness
+            ))
         
-        return None
-    
-    def assign_supervisors(self, examen_id, dept_id, date_examen, nb_required=2):
-        """Assigne des surveillants à un examen"""
-        # D'abord, essayer les profs du même département
-        dept_profs = self.get_professors_by_department(dept_id)
-        assigned = []
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(solve_cluster, tasks))
         
-        for prof_id, nom, prenom in dept_profs:
-            if len(assigned) >= nb_required:
-                break
-            
-            # Vérifier contrainte max 3 examens par jour
-            count = self.count_professor_exams_on_date(prof_id, date_examen)
-            if count < 3:
-                self.cur.execute("""
-                    INSERT INTO affectations_surveillance (examen_id, professeur_id, role)
-                    VALUES (%s, %s, %s)
-                """, (examen_id, prof_id, 'responsable' if len(assigned) == 0 else 'surveillant'))
-                assigned.append(prof_id)
-        
-        # Si pas assez de profs du département, prendre d'autres
-        if len(assigned) < nb_required:
-            all_profs = self.get_all_professors()
-            random.shuffle(all_profs)
-            
-            for prof_id, _ in all_profs:
-                if prof_id in assigned:
+        # Fusion des sous-plannings
+        by_id = {m.id: m for m in modules}
+        placements = {}
+        leftovers = []
+        for cluster_placements, cluster_unscheduled in results:
+            for module_id, placement in cluster_placements.items():
+                module = by_id[module_id]
+                if (self.state.check_room_conflict(placement.room_id, placement.day,
+                                                   placement.debut, module.duree)
+                        or self.state.check_student_conflict(module_id, placement.day)):
+                    leftovers.append(module)
                     continue
-                if len(assigned) >= nb_required:
-                    break
-                
-                count = self.count_professor_exams_on_date(prof_id, date_examen)
-                if count < 3:
-                    self.cur.execute("""
-                        INSERT INTO affectations_surveillance (examen_id, professeur_id, role)
-                        VALUES (%s, %s, %s)
-                    """, (examen_id, prof_id, 'surveillant'))
-                    assigned.append(prof_id)
-        
-        return len(assigned)
-    
-    def generate_schedule(self, annee_academique="2024-2025", session="normale",
-                        start_date=None, max_days=30):
-        """Génère le planning complet des examens"""
-        print("\n=== GÉNÉRATION DU PLANNING ===\n")
+                self.state.place(module, placement)
+                placements[module_id] = placement
+            leftovers.extend(by_id[module_id] for module_id in cluster_unscheduled)
         
-        if start_date is None:
-            start_date = datetime.now().date() + timedelta(days=30)
+        # Réparation sur l'ensemble des salles
+        leftovers.sort(key=lambda m: m.nb_inscrits, reverse=True)
+        repaired, unscheduled = place_modules(self.state, leftovers)
+        placements.update(repaired)
         
-        # Nettoyer le planning existant
-        self.clear_existing_schedule(annee_academique, session)
+        print(f"  {len(clusters)} clusters résolus en parallèle, "
+              f"{len(repaired)}/{len(leftovers)} modules réparés")
+        return placements, unscheduled
+    
+    def restore_placements(self, modules, saved):
+        """Replace dans self.state les placements d'une sauvegarde de recherche"""
+        by_id = {m.id: m for m in modules}
+        placements = {}
+        for module_id, (day, debut, room_id) in saved.items():
+            module = by_id.get(int(module_id))
+            if module is None:
+                continue
+            placement = Placement(day, debut, room_id)
+            self.state.place(module, placement)
+            placements[module.id] = placement
+        return placements, [m.id for m in modules if m.id not in placements]
+    
+    def save_search(self, best, priorities, iterations):
+        """Sauvegarde du meilleur planning de la recherche (appelée par search_schedule)"""
+        _, _, placements, _ = best
+        save_checkpoint(self.checkpoint, {
+            'iterations': iterations,
+            'placements': {str(module_id): [p.day, p.debut, p.room_id]
+                           for module_id, p in placements.items()},
+            'priorities': {str(module_id): value for module_id, value in priorities.items()},
+        })
+    
+    def build_schedule(self, annee_academique, session, start_date, max_days,
+                       day_grid, fairness, workers, progress=None, deadline=None):
+        """Place les modules et écrit les examens de la version courante (sans commit)
         
+        `progress(etape, fait, total)` est appelé à chaque étape et tous les
+        50 examens écrits. Avec une échéance `deadline` (time.monotonic),
+        le placement est amélioré jusqu'à l'échéance (search_schedule) et
+        la recherche est sauvegardée dans le cache: une génération
+        interrompue reprend là où elle s'était arrêtée.
+        """
+        progress = progress or (lambda etape, fait, total: None)
         # Récupérer les modules à planifier
-        modules = self.get_modules_to_schedule(annee_academique)
+        self.problem = self.load_problem(annee_academique, session)
+        self.conflicts = []
+        modules = self.problem['modules']
         print(f"{len(modules)} modules à planifier")
+        progress('placement', 0, len(modules))
         
-        # Créneaux horaires disponibles
-        time_slots = [
-            time(8, 0),
-            time(10, 30),
-            time(14, 0)
-        ]
+        # Grille horaire et état du planning en mémoire
+        self.grid = day_grid or DayGrid()
+        rooms = self.problem['rooms']
+        days = [start_date + timedelta(days=i) for i in range(max_days)]
+        
+        def make_state():
+            return ScheduleState(
+                days, self.grid, rooms, self.problem['conflict_graph'],
+                self.problem['module_student_idx'], self.problem['module_student_idx'].n_students,
+                [m.formation_id for m in modules], fairness
+            )
+        
+        self.state = make_state()
+        self.supervisors = SupervisorPool(self.problem['professors'])
+        
+        # Reprise d'une recherche interrompue avec les mêmes données et paramètres
+        self.checkpoint = None
+        resumed = None
+        if deadline is not None and self.fingerprint is not None:
+            self.checkpoint = checkpoint_path(
+                self.cache_dir, annee_academique, session, self.fingerprint,
+                {'max_days': max_days, 'grid': self.grid, 'fairness': fairness}
+            )
+            resumed = load_checkpoint(self.checkpoint)
+        
+        # Placement jour / salle / heure
+        if resumed is not None:
+            placements, unscheduled = self.restore_placements(modules, resumed['placements'])
+            print(f"✓ Reprise de la recherche ({resumed['iterations']} itérations, "
+                  f"{len(unscheduled)} modules non placés)")
+        elif workers > 1:
+            placements, unscheduled = self.place_in_parallel(modules, rooms, workers)
+        else:
+            placements, unscheduled = place_modules(self.state, modules)
+        
+        if deadline is not None:
+            budget = max(1, int(deadline - clock.monotonic()))
+            initial = len(unscheduled)
+            self.state, placements, unscheduled, iterations = search_schedule(
+                make_state, modules, self.state, placements, unscheduled, deadline,
+                save=self.save_search if self.checkpoint else None,
+                progress=lambda elapsed, iterations, remaining: progress(
+                    'amelioration', min(elapsed, budget), budget),
+                priorities={int(k): v for k, v in resumed['priorities'].items()} if resumed else None,
+                iterations=resumed['iterations'] if resumed else 0
+            )
+            print(f"  Recherche: {iterations} itérations, "
+                  f"{initial} -> {len(unscheduled)} modules non placés")
+        unscheduled = set(unscheduled)
+        progress('ecriture', 0, len(modules))
         
         scheduled = 0
-        current_date = start_date
-        max_date = start_date + timedelta(days=max_days)
         
-        for module_id, code, nom, duree, formation_id, dept_id, nb_inscrits in modules:
-            exam_scheduled = False
-            attempts = 0
+        for module in modules:
+            if module.id in unscheduled:
+                self.conflicts.append({
+                    'module': module.nom,
+                    'code': module.code,
+                    'nb_inscrits': module.nb_inscrits,
+                    'raison': 'Impossible de trouver un créneau'
+                })
+                continue
             
-            while not exam_scheduled and current_date < max_date and attempts < 100:
-                # Essayer chaque créneau horaire
-                for heure in time_slots:
-                    # Vérifier les conflits étudiants
-                    student_conflicts = self.check_student_conflict(module_id, current_date, heure)
-                    
-                    if student_conflicts > 0:
-                        continue
-                    
-                    # Trouver une salle
-                    room_id = self.assign_room(nb_inscrits, current_date, heure, duree)
-                    
-                    if room_id:
-                        # Créer l'examen
-                        self.cur.execute("""
-                            INSERT INTO examens (module_id, lieu_id, date_examen, heure_debut,
-                                            duree_minutes, session, annee_academique, nb_inscrits)
-                            VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-                            RETURNING id
-                        """, (module_id, room_id, current_date, heure, duree, session,
-                            annee_academique, nb_inscrits))
-                        
-                        examen_id = self.cur.fetchone()[0]
-                        
-                        # Assigner des surveillants
-                        nb_supervisors = self.assign_supervisors(examen_id, dept_id, current_date)
-                        
-                        if nb_supervisors > 0:
-                            self.conn.commit()
-                            scheduled += 1
-                            exam_scheduled = True
-                            
-                            if scheduled % 50 == 0:
-                                print(f"  ✓ {scheduled}/{len(modules)} examens planifiés")
-                            break
-                
-                if not exam_scheduled:
-                    current_date += timedelta(days=1)
-                    attempts += 1
+            placement = placements[module.id]
+            current_date = days[placement.day]
             
-            if not exam_scheduled:
+            # Surveillants choisis avant l'écriture de l'examen
+            assigned = self.supervisors.pick(module.dept_id, current_date,
+                                             placement.debut, module.duree)
+            if not assigned:
+                self.state.unplace(module, placement)
                 self.conflicts.append({
-                    'module': nom,
-                    'code': code,
-                    'nb_inscrits': nb_inscrits,
-                    'raison': 'Impossible de trouver un créneau'
+                    'module': module.nom,
+                    'code': module.code,
+                    'nb_inscrits': module.nb_inscrits,
+                    'raison': 'Aucun surveillant disponible'
                 })
+                continue
+            
+            self.cur.execute("""
+                INSERT INTO examens (module_id, lieu_id, date_examen, heure_debut,
+                                duree_minutes, session, annee_academique, nb_inscrits,
+                                version_id)
+                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+                RETURNING id
+            """, (module.id, placement.room_id, current_date, self.grid.to_time(placement.debut),
+                module.duree, session, annee_academique, module.nb_inscrits, self.version_id))
+            examen_id = self.cur.fetchone()[0]
+            
+            self.cur.executemany("""
+                INSERT INTO affectations_surveillance (examen_id, professeur_id, role)
+                VALUES (%s, %s, %s)
+            """, [(examen_id, prof_id, role) for prof_id, role in assigned])
+            
+            scheduled += 1
+            if scheduled % 50 == 0:
+                print(f"  ✓ {scheduled}/{len(modules)} examens écrits")
+                progress('ecriture', scheduled, len(modules))
+        
+        return scheduled
+    
+    def generate_schedule(self, annee_academique="2024-2025", session="normale",
+                        start_date=None, max_days=30, day_grid=None, fairness=None,
+                        workers=1, publish=True, progress=None, time_budget=None):
+        """Génère le planning complet des examens dans une nouvelle version
         
-        self.conn.commit()
+        Le planning publié reste visible pendant toute la génération: la
+        nouvelle version est écrite dans une seule transaction et, si
+        `publish`, publiée au même commit. En cas d'erreur rien n'est écrit.
+        Aucun verrou n'est pris ici: les appels concurrents passent par
+        generation_lock.GenerationCoordinator.
         
-        print(f"\n {scheduled}/{len(modules)} examens planifiés avec succès")
+        Avec `time_budget` (secondes), le meilleur planning trouvé dans ce
+        délai est écrit; sans, un seul passage glouton.
+        
+        La version écrite est revérifiée par validator.py avant publication;
+        le résultat est enregistré dans la même transaction.
+        """
+        print("\n=== GÉNÉRATION DU PLANNING ===\n")
+        deadline = clock.monotonic() + time_budget if time_budget else None
+        
+        if start_date is None:
+            start_date = datetime.now().date() + timedelta(days=30)
+        
+        ensure_schema(self.conn)
+        validator.ensure_schema(self.conn)
+        try:
+            self.version_id = create_version(self.cur, annee_academique, session)
+            scheduled = self.build_schedule(annee_academique, session, start_date,
+                                            max_days, day_grid, fairness, workers, progress,
+                                            deadline)
+            if progress:
+                progress('validation', scheduled, len(self.problem['modules']))
+            self.validation = validator.validate_version(self.conn, self.version_id)
+            validator.store_validation(self.cur, self.validation)
+            if publish:
+                if progress:
+                    progress('publication', scheduled, len(self.problem['modules']))
+                publish_version(self.cur, self.version_id)
+            self.conn.commit()
+        except Exception:
+            self.conn.rollback()
+            self.version_id = None
+            self.validation = None
+            raise
+        
+        # Planning écrit: la recherche n'est plus à reprendre
+        if self.checkpoint is not None:
+            remove_checkpoint(self.checkpoint)
+        
+        if publish:
+            print(f"✓ Version {self.version_id} publiée pour {session} {annee_academique}")
+            purge_versions(self.conn, annee_academique, session)
+        
+        print(f"\n {scheduled}/{len(self.problem['modules'])} examens planifiés avec succès")
         if self.conflicts:
             print(f" {len(self.conflicts)} modules")
+        print(f" Validation: {self.validation['nb_violations']} violations "
+              f"({self.validation['duree']}s)")
         
         return scheduled, self.conflicts
     
+    def load_schedule_placements(self, annee_academique, session, start_date=None):
+        """Planning enregistré sous la forme {module_id: Placement}"""
+        self.cur.execute("""
+            SELECT module_id, date_examen, heure_debut, lieu_id
+            FROM examens_publies
+            WHERE annee_academique = %s AND session = %s
+        """, (annee_academique, session))
+        rows = self.cur.fetchall()
+        
+        if start_date is None and rows:
+            start_date = min(row[1] for row in rows)
+        
+        placements = {
+            module_id: Placement((date_examen - start_date).days, to_minutes(heure_debut), lieu_id)
+            for module_id, date_examen, heure_debut, lieu_id in rows
+        }
+        return placements, start_date
+    
+    def solve_exact(self, annee_academique="2024-2025", session="normale", dept_id=None,
+                    start_date=None, max_days=30, day_grid=None, time_limit=60):
+        """Résolution exacte (CP-SAT) d'un périmètre réduit, sans écriture en base
+        
+        Le planning glouton enregistré sert de solution de départ et de
+        référence: le résultat donne l'écart d'optimalité et la qualité
+        atteignable sur un département ou une session de rattrapage.
+        """
+        problem = self.load_problem(annee_academique, session)
+        modules = [m for m in problem['modules'] if dept_id is None or m.dept_id == dept_id]
+        module_ids = {m.id for m in modules}
+        graph = {
+            module_id: problem['conflict_graph'][module_id] & module_ids
+            for module_id in module_ids
+        }
+        
+        placements, start_date = self.load_schedule_placements(annee_academique, session, start_date)
+        warm_start = {
+            module_id: placement for module_id, placement in placements.items()
+            if module_id in module_ids and 0 <= placement.day < max_days
+        }
+        
+        print(f"\n=== RÉSOLUTION EXACTE ({len(modules)} modules) ===\n")
+        result = solve_exact(
+            modules, graph, problem['rooms'], len(problem['professors']),
+            max_days, day_grid or DayGrid(), warm_start=warm_start, time_limit=time_limit
+        )
+        result['date_debut'] = start_date
+        
+        print(f"  Statut: {result['statut']} en {result['temps']}s")
+        if result['objectif'] is not None:
+            print(f"  Objectif: {result['objectif']:.0f} (glouton: {result['objectif_glouton']})")
+            print(f"  Borne: {result['borne']:.0f} • gap: {result['gap']:.2%}")
+        
+        return result
+    
+    def check_feasibility(self, annee_academique="2024-2025", session="normale",
+                          max_days=30, day_grid=None, fairness=None):
+        """Bornes inférieures du nombre de jours, sans planifier
+
+        À appeler avant generate_schedule: `faisable` est faux si la
+        fenêtre de `max_days` jours est plus courte qu'une des bornes, ou
+        si des modules ne peuvent être placés dans aucune salle.
+        """
+        problem = self.load_problem(annee_academique, session)
+        result = lower_bounds(problem, day_grid or DayGrid(), fairness)
+        result['max_days'] = max_days
+        result['faisable'] = (result['jours_min'] <= max_days
+                              and not result['modules_trop_grands']
+                              and not result['modules_hors_grille'])
+        return result
+
+    def simulate(self, scenario, annee_academique="2024-2025", session="normale",
+                 max_days=30, day_grid=None, fairness=None):
+        """Simule un scénario sur une copie en mémoire du problème
+
+        Le planning enregistré n'est ni effacé ni modifié; le résultat donne
+        les jours utilisés, les modules non planifiés, l'occupation des
+        salles et la charge de surveillance.
+        """
+        problem = self.load_problem(annee_academique, session)
+        return simulate_problem(problem, scenario, max_days, day_grid, fairness)
+
+    def simulate_many(self, scenarios, annee_academique="2024-2025", session="normale",
+                      max_days=30, day_grid=None, fairness=None, workers=None):
+        """Simule plusieurs scénarios en parallèle (un processus par scénario)"""
+        problem = self.load_problem(annee_academique, session)
+        tasks = [(scenario, max_days, day_grid, fairness) for scenario in scenarios]
+        workers = min(workers or os.cpu_count() or 1, len(tasks))
+
+        if workers <= 1:
+            return [simulate_problem(problem, *task) for task in tasks]
+
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_simulation_worker,
+                                 initargs=(problem,)) as pool:
+            return list(pool.map(run_scenario, tasks))
+
     def get_statistics(self):
         """Calcule des statistiques sur le planning"""
         stats = {}
         
         # Nombre total d'examens
-        self.cur.execute("SELECT COUNT(*) FROM examens")
+        self.cur.execute("SELECT COUNT(*) FROM examens_publies")
         stats['total_examens'] = self.cur.fetchone()[0]
         
         # Taux d'occupation des salles
@@ -288,7 +1184,7 @@ class ExamScheduler:
             ),
             2
         ) AS taux_occupation
-    FROM examens e
+    FROM examens_publies e
     JOIN lieux_examen l ON e.lieu_id = l.id
 """)
 
@@ -299,9 +1195,10 @@ class ExamScheduler:
         self.cur.execute("""
             SELECT AVG(nb_surveillances) as moy_surveillances
             FROM (
-                SELECT professeur_id, COUNT(*) as nb_surveillances
-                FROM affectations_surveillance
-                GROUP BY professeur_id
+                SELECT a.professeur_id, COUNT(*) as nb_surveillances
+                FROM affectations_surveillance a
+                JOIN examens_publies e ON e.id = a.examen_id
+                GROUP BY a.professeur_id
             ) sub
         """)
         result = self.cur.fetchone()
@@ -309,15 +1206,24 @@ class ExamScheduler:
         
         # Nombre de jours utilisés
         self.cur.execute("""
-            SELECT COUNT(DISTINCT date_examen) FROM examens
+            SELECT COUNT(DISTINCT date_examen) FROM examens_publies
         """)
         stats['nb_jours'] = self.cur.fetchone()[0]
         
         return stats
     
+    def get_fairness_statistics(self, window_days=3):
+        """Indicateurs d'équité du dernier planning généré"""
+        if self.state is None:
+            return {}
+        return self.state.fairness_statistics(window_days)
+    
     def close(self):
         self.cur.close()
         self.conn.close()
+        if self.scratch is not None:
+            self.scratch.cleanup()
+            self.scratch = None
 
 
 # Exemple d'utilisation
@@ -332,15 +1238,19 @@ if __name__ == "__main__":
     
     scheduler = ExamScheduler(DB_CONFIG)
     
-    # Générer le planning
+    # Générer le planning (ou suivre la génération déjà en cours)
     start = datetime.now()
-    scheduled, conflicts = scheduler.generate_schedule(
-        annee_academique="2024-2025",
-        session="normale",
+    job, conflicts, attached = GenerationCoordinator(DB_CONFIG).generate(
+        scheduler,
+        "2024-2025",
+        "normale",
         start_date=datetime(2025, 6, 1).date(),
-        max_days=45
+        max_days=45,
+        workers=os.cpu_count() or 1
     )
     end = datetime.now()
+    if attached:
+        print(f"Génération {job['id']} déjà en cours, suivie jusqu'à la fin: {job['statut']}")
     
     # Afficher les statistiques
     print("\n=== STATISTIQUES ===")
@@ -348,6 +1258,10 @@ if __name__ == "__main__":
     for key, value in stats.items():
         print(f"{key}: {value}")
     
+    print("\n=== ÉQUITÉ ===")
+    for key, value in scheduler.get_fairness_statistics().items():
+        print(f"{key}: {value}")
+    
     print(f"\n  Temps d'exécution: {(end - start).total_seconds():.2f} secondes")
     
     scheduler.close()
\ No newline at end of file
@@ -0,0 +1,186 @@
+import glob
+import hashlib
+import json
+import os
+import shutil
+
+import numpy as np
+
+from domain import Module, Room, Professor
+from enrollment_matrix import EnrollmentMatrix
+
+
+def source_fingerprint(cur, annee_academique):
+    """Empreinte des tables sources: change dès que les données changent
+
+    Chaque table est résumée par son nombre de lignes et la somme d'un
+    hachage des colonnes lues par build_problem: une mise à jour (durée
+    d'un module, formation, note, capacité...) change l'empreinte même
+    sans modifier created_at ni le nombre de lignes.
+    """
+    cur.execute("""
+        SELECT
+            (SELECT COUNT(*) || '/' || COALESCE(SUM(hashtextextended(
+                    ROW(id, code, nom, duree_examen, formation_id)::TEXT, 0)), 0)
+             FROM modules),
+            (SELECT COUNT(*) || '/' || COALESCE(SUM(hashtextextended(
+                    ROW(id, dept_id)::TEXT, 0)), 0)
+             FROM formations),
+            (SELECT COUNT(*) || '/' || COALESCE(SUM(hashtextextended(
+                    ROW(etudiant_id, module_id, statut, note)::TEXT, 0)), 0)
+             FROM inscriptions WHERE annee_academique = %s),
+            (SELECT COUNT(*) || '/' || COALESCE(SUM(hashtextextended(
+                    ROW(id, nom, type, capacite_examen, disponible)::TEXT, 0)), 0)
+             FROM lieux_examen),
+            (SELECT COUNT(*) || '/' || COALESCE(SUM(hashtextextended(
+                    ROW(id, nom, prenom, dept_id)::TEXT, 0)), 0)
+             FROM professeurs)
+    """, (annee_academique,))
+    row = cur.fetchone()
+    return hashlib.md5('|'.join(str(v) for v in row).encode()).hexdigest()[:16]
+
+
+def cache_path(cache_dir, annee_academique, session, fingerprint):
+    return os.path.join(cache_dir, f"probleme_{annee_academique}_{session}_{fingerprint}.npz")
+
+
+def matrix_dir(path):
+    """Dossier de la matrice d'inscriptions associée à un fichier du cache"""
+    return path[:-len('.npz')]
+
+
+def is_cached(path):
+    return os.path.exists(path) and EnrollmentMatrix.exists(matrix_dir(path))
+
+
+def purge_stale(path):
+    """Supprime les versions obsolètes pour la même année / session"""
+    prefix = path.rsplit('_', 1)[0]
+    for old_path in glob.glob(f"{prefix}_*"):
+        if old_path in (path, matrix_dir(path)):
+            continue
+        if os.path.isdir(old_path):
+            shutil.rmtree(old_path, ignore_errors=True)
+        else:
+            os.remove(old_path)
+
+
+def checkpoint_path(cache_dir, annee_academique, session, fingerprint, params):
+    """Fichier de reprise d'une recherche: mêmes données et mêmes paramètres"""
+    encoded = json.dumps(params, sort_keys=True,
+                         default=lambda value: {k: v for k, v in vars(value).items()
+                                                if not k.startswith('_')}
+                         if hasattr(value, '__dict__') else sorted(value))
+    key = hashlib.md5(f"{fingerprint}|{encoded}".encode()).hexdigest()[:16]
+    return os.path.join(cache_dir, f"recherche_{annee_academique}_{session}_{key}.json")
+
+
+def save_checkpoint(path, data):
+    """Écrit l'état d'une recherche (remplacement atomique, anciennes reprises supprimées)"""
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+    prefix = path.rsplit('_', 1)[0]
+    for old_path in glob.glob(f"{prefix}_*.json"):
+        if old_path != path:
+            os.remove(old_path)
+
+
+def load_checkpoint(path):
+    """État sauvegardé par save_checkpoint, ou None"""
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def remove_checkpoint(path):
+    if os.path.exists(path):
+        os.remove(path)
+
+
+def _csr(rows):
+    """Liste de tableaux -> (indptr, indices)"""
+    indptr = np.zeros(len(rows) + 1, dtype=np.int64)
+    indptr[1:] = np.cumsum([len(r) for r in rows])
+    indices = np.concatenate(rows).astype(np.int32) if rows else np.zeros(0, dtype=np.int32)
+    return indptr, indices
+
+
+def save_problem(path, problem):
+    """Enregistre le problème chargé dans un fichier .npz compact
+
+    La matrice d'inscriptions est déjà sur disque (matrix_dir(path)),
+    seuls les modules, le graphe de conflits, les salles et les
+    professeurs sont enregistrés ici.
+    """
+    modules = problem['modules']
+    module_ids = [m.id for m in modules]
+    cg_indptr, cg_indices = _csr([
+        np.fromiter(problem['conflict_graph'][m], dtype=np.int32) for m in module_ids
+    ])
+    rooms = problem['rooms']
+    professors = problem['professors']
+
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = path + '.tmp.npz'
+    np.savez(
+        tmp_path,
+        module_ids=np.array(module_ids, dtype=np.int32),
+        module_codes=np.array([m.code for m in modules], dtype=str),
+        module_noms=np.array([m.nom for m in modules], dtype=str),
+        module_durees=np.array([m.duree for m in modules], dtype=np.int16),
+        module_formations=np.array([m.formation_id for m in modules], dtype=np.int32),
+        module_depts=np.array([m.dept_id for m in modules], dtype=np.int32),
+        module_inscrits=np.array([m.nb_inscrits for m in modules], dtype=np.int32),
+        cg_indptr=cg_indptr, cg_indices=cg_indices,
+        room_ids=np.array([r.id for r in rooms], dtype=np.int32),
+        room_noms=np.array([r.nom for r in rooms], dtype=str),
+        room_capacites=np.array([r.capacite for r in rooms], dtype=np.int32),
+        room_types=np.array([r.type for r in rooms], dtype=str),
+        prof_ids=np.array([p.id for p in professors], dtype=np.int32),
+        prof_depts=np.array([p.dept_id for p in professors], dtype=np.int32),
+    )
+    os.replace(tmp_path, path)
+
+
+def load_cached_problem(path):
+    """Recharge un problème enregistré par save_problem"""
+    with np.load(path, allow_pickle=False) as data:
+        module_ids = data['module_ids'].tolist()
+        modules = list(map(
+            Module,
+            module_ids,
+            data['module_codes'].tolist(),
+            data['module_noms'].tolist(),
+            data['module_durees'].tolist(),
+            data['module_formations'].tolist(),
+            data['module_depts'].tolist(),
+            data['module_inscrits'].tolist(),
+        ))
+
+        cg_indptr, cg_indices = data['cg_indptr'], data['cg_indices']
+        conflict_graph = {
+            module_id: set(cg_indices[cg_indptr[i]:cg_indptr[i + 1]].tolist())
+            for i, module_id in enumerate(module_ids)
+        }
+
+        rooms = list(map(
+            Room,
+            data['room_ids'].tolist(),
+            data['room_noms'].tolist(),
+            data['room_capacites'].tolist(),
+            data['room_types'].tolist(),
+        ))
+        professors = list(map(Professor, data['prof_ids'].tolist(), data['prof_depts'].tolist()))
+
+    return {
+        'modules': modules,
+        'conflict_graph': conflict_graph,
+        'module_student_idx': EnrollmentMatrix(matrix_dir(path)),
+        'rooms': rooms,
+        'professors': professors
+    }
@@ -0,0 +1,75 @@
+"""Requêtes de lecture des vues, partagées par app.py et load_test.py
+
+Chaque fonction retourne {nom: (requête, params)} pour execute_queries /
+DataAccess.fetch_many: les requêtes d'une vue sont indépendantes.
+"""
+import pandas as pd
+
+from cache_bus import department_tag
+
+
+def student_queries(matricule):
+    """Identité et planning d'un étudiant"""
+    return {
+        'etudiant': ("""
+            SELECT et.nom, et.prenom, f.nom as formation, f.niveau, f.dept_id
+            FROM etudiants et
+            JOIN formations f ON et.formation_id = f.id
+            WHERE et.matricule = %s
+        """, (matricule,)),
+        'planning': ("""
+            SELECT m.nom, m.code, e.date_examen, e.heure_debut, e.duree_minutes, l.nom as lieu, l.batiment,
+                mf.dept_id
+            FROM etudiants et
+            JOIN inscriptions i ON et.id = i.etudiant_id
+            JOIN modules m ON i.module_id = m.id
+            JOIN formations mf ON m.formation_id = mf.id
+            JOIN examens_publies e ON m.id = e.module_id
+            JOIN lieux_examen l ON e.lieu_id = l.id
+            WHERE et.matricule = %s
+            ORDER BY e.date_examen, e.heure_debut
+        """, (matricule,)),
+    }
+
+
+def student_tags(results):
+    """Étiquettes de cache: départements de l'étudiant et de ses examens"""
+    return {department_tag(dept_id) for dept_id in
+            pd.concat([results['etudiant']['dept_id'], results['planning']['dept_id']])}
+
+
+def professor_queries(matricule):
+    """Identité et surveillances d'un professeur"""
+    return {
+        'prof': ("""
+            SELECT p.nom, p.prenom, d.nom as departement, p.grade
+            FROM professeurs p
+            JOIN departements d ON p.dept_id = d.id
+            WHERE p.matricule = %s
+        """, (matricule,)),
+        'surveillances': ("""
+            SELECT e.date_examen, e.heure_debut, e.duree_minutes, m.nom as module,
+                f.nom as formation, l.nom as lieu, a.role, e.nb_inscrits
+            FROM professeurs p
+            JOIN affectations_surveillance a ON p.id = a.professeur_id
+            JOIN examens_publies e ON a.examen_id = e.id
+            JOIN modules m ON e.module_id = m.id
+            JOIN formations f ON m.formation_id = f.id
+            JOIN lieux_examen l ON e.lieu_id = l.id
+            WHERE p.matricule = %s
+            ORDER BY e.date_examen, e.heure_debut
+        """, (matricule,)),
+    }
+
+
+def department_queries():
+    """Départements et nombre d'étudiants de chacun"""
+    return {
+        'depts': ("SELECT id, nom FROM departements ORDER BY nom", None),
+        'etudiants': ("""
+            SELECT f.dept_id, COUNT(DISTINCT et.id) AS nb
+            FROM etudiants et
+            JOIN formations f ON et.formation_id = f.id
+            GROUP BY f.dept_id
+        """, None),
+    }
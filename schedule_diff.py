@@ -0,0 +1,410 @@
+"""Différences entre deux versions du planning et notifications ciblées
+
+Les examens des deux versions sont appariés par module (un examen par
+module et par version). Seuls les modules dont l'examen a changé (jour,
+créneau, durée, salle, surveillants, ajout ou suppression) sont ensuite
+suivis jusqu'aux personnes: étudiants convoqués via les inscriptions de
+ces modules, surveillants de l'ancienne ou de la nouvelle affectation. Le
+coût dépend du nombre de changements, pas de la population.
+
+Chaque personne concernée reçoit dans la boîte d'envoi locale un e-mail
+(.eml) listant ses examens avant / après, avec en pièce jointe un
+calendrier (.ics) qui annule les anciens événements et ajoute les
+nouveaux (mêmes UID que l'export, voir export.py).
+
+Usage: python schedule_diff.py [annee] [session] [ancienne_version nouvelle_version]
+"""
+import json
+import os
+import sys
+import time
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+from email.utils import formatdate
+
+import psycopg2
+
+from export import ics_calendar, ics_event, safe_filename
+from domain import NOTE_VALIDATION
+
+# Lignes lues par aller-retour sur le curseur serveur des étudiants
+CURSOR_ITERSIZE = 2000
+OUTBOX_DIR = 'outbox'
+OUTBOX_SENDER = 'planning@exampro'
+
+JOURS = ['lun.', 'mar.', 'mer.', 'jeu.', 'ven.', 'sam.', 'dim.']
+
+CHANGE_LABELS = {
+    'ajout': "nouvel examen",
+    'suppression': "examen retiré",
+    'jour': "jour",
+    'creneau': "horaire",
+    'duree': "durée",
+    'salle': "salle",
+    'surveillants': "surveillants",
+}
+
+
+def format_entry(entry):
+    """Examen sur une ligne: 'lun. 12/01 08:00 (90 min), Amphi A (Bloc A)'"""
+    if entry is None:
+        return "aucun"
+    date_examen = entry['date_examen']
+    return (f"{JOURS[date_examen.weekday()]} {date_examen.strftime('%d/%m')} "
+            f"{entry['heure_debut'].strftime('%H:%M')} ({entry['duree_minutes']} min), "
+            f"{entry['lieu']} ({entry['batiment']})")
+
+
+def exam_changes(before, after):
+    """Nature des changements d'un examen entre deux versions"""
+    if before is None:
+        return ['ajout']
+    if after is None:
+        return ['suppression']
+    changes = []
+    if before['date_examen'] != after['date_examen']:
+        changes.append('jour')
+    if before['heure_debut'] != after['heure_debut']:
+        changes.append('creneau')
+    if before['duree_minutes'] != after['duree_minutes']:
+        changes.append('duree')
+    if before['lieu_id'] != after['lieu_id']:
+        changes.append('salle')
+    return changes
+
+
+class ScheduleDiff:
+    """Examens modifiés entre deux versions et personnes concernées"""
+
+    def __init__(self, conn, old_version, new_version):
+        self.conn = conn
+        self.old_version = old_version
+        self.new_version = new_version
+        # {module_id: {'code', 'module', 'avant', 'apres', 'changements'}}
+        self.examens = {}
+        # {personne_id: {'matricule', 'nom', 'prenom', 'email',
+        #                'entrees': [(module_id, avant, apres, role)]}}
+        self.etudiants = {}
+        self.professeurs = {}
+
+    def compute(self):
+        start = time.perf_counter()
+        cur = self.conn.cursor()
+        cur.execute("""
+            SELECT annee_academique, session FROM planning_versions WHERE id = %s
+        """, (self.new_version,))
+        self.annee_academique, self.session = cur.fetchone()
+
+        moved = self._moved_exams(cur)
+        supervisors = self._supervision_changes(cur)
+        self._load_entries(cur, set(moved) | set(supervisors))
+        for module_id, changes in moved.items():
+            self.examens[module_id]['changements'] = changes
+        for module_id in supervisors:
+            self.examens[module_id]['changements'].append('surveillants')
+
+        self._load_professors(cur, moved, supervisors)
+        cur.close()
+        # Un surveillant changé ne concerne pas les étudiants
+        self._load_students(list(moved))
+        self.conn.rollback()
+        self.temps = round(time.perf_counter() - start, 3)
+        return self
+
+    def _moved_exams(self, cur):
+        """{module_id: changements} des examens déplacés, ajoutés ou retirés"""
+        cur.execute("""
+            SELECT COALESCE(a.module_id, n.module_id),
+                a.date_examen, a.heure_debut, a.duree_minutes, a.lieu_id,
+                n.date_examen, n.heure_debut, n.duree_minutes, n.lieu_id
+            FROM (SELECT * FROM examens WHERE version_id = %(old)s) a
+            FULL JOIN (SELECT * FROM examens WHERE version_id = %(new)s) n
+                ON n.module_id = a.module_id
+            WHERE a.id IS NULL OR n.id IS NULL
+               OR (a.date_examen, a.heure_debut, a.duree_minutes, a.lieu_id)
+                  IS DISTINCT FROM (n.date_examen, n.heure_debut, n.duree_minutes, n.lieu_id)
+        """, {'old': self.old_version, 'new': self.new_version})
+        keys = ('date_examen', 'heure_debut', 'duree_minutes', 'lieu_id')
+        moved = {}
+        for row in cur.fetchall():
+            before = dict(zip(keys, row[1:5])) if row[1] is not None else None
+            after = dict(zip(keys, row[5:9])) if row[5] is not None else None
+            moved[row[0]] = exam_changes(before, after)
+        return moved
+
+    def _supervision_changes(self, cur):
+        """{module_id: [(professeur_id, avant, apres)]}: affectations ajoutées ou retirées"""
+        cur.execute("""
+            WITH s AS (
+                SELECT e.version_id, e.module_id, a.professeur_id
+                FROM affectations_surveillance a
+                JOIN examens e ON e.id = a.examen_id
+                WHERE e.version_id IN (%(old)s, %(new)s)
+            )
+            SELECT COALESCE(a.module_id, n.module_id), COALESCE(a.professeur_id, n.professeur_id),
+                a.module_id IS NOT NULL, n.module_id IS NOT NULL
+            FROM (SELECT * FROM s WHERE version_id = %(old)s) a
+            FULL JOIN (SELECT * FROM s WHERE version_id = %(new)s) n
+                ON n.module_id = a.module_id AND n.professeur_id = a.professeur_id
+            WHERE a.module_id IS NULL OR n.module_id IS NULL
+        """, {'old': self.old_version, 'new': self.new_version})
+        changes = {}
+        for module_id, professeur_id, before, after in cur.fetchall():
+            changes.setdefault(module_id, []).append((professeur_id, before, after))
+        return changes
+
+    def _load_entries(self, cur, module_ids):
+        """Examens avant / après des modules modifiés"""
+        if not module_ids:
+            return
+        cur.execute("""
+            SELECT e.version_id, e.module_id, m.code, m.nom, e.id, e.date_examen,
+                e.heure_debut, e.duree_minutes, e.lieu_id, l.nom, l.batiment
+            FROM examens e
+            JOIN modules m ON m.id = e.module_id
+            JOIN lieux_examen l ON l.id = e.lieu_id
+            WHERE e.version_id IN (%s, %s) AND e.module_id = ANY(%s)
+        """, (self.old_version, self.new_version, list(module_ids)))
+        for (version_id, module_id, code, nom, examen_id, date_examen, heure_debut,
+             duree, lieu_id, lieu, batiment) in cur.fetchall():
+            exam = self.examens.setdefault(module_id, {
+                'code': code, 'module': nom, 'avant': None, 'apres': None, 'changements': []
+            })
+            exam['avant' if version_id == self.old_version else 'apres'] = {
+                'examen_id': examen_id, 'date_examen': date_examen,
+                'heure_debut': heure_debut, 'duree_minutes': duree,
+                'lieu_id': lieu_id, 'lieu': lieu, 'batiment': batiment,
+            }
+
+    def _load_professors(self, cur, moved, supervisors):
+        """Surveillants des examens déplacés (avant ou après) et des affectations changées"""
+        concerned = {}
+        if moved:
+            cur.execute("""
+                SELECT DISTINCT e.module_id, a.professeur_id
+                FROM affectations_surveillance a
+                JOIN examens e ON e.id = a.examen_id
+                WHERE e.version_id IN (%s, %s) AND e.module_id = ANY(%s)
+            """, (self.old_version, self.new_version, list(moved)))
+            for module_id, professeur_id in cur.fetchall():
+                concerned.setdefault(professeur_id, set()).add(module_id)
+        for module_id, changes in supervisors.items():
+            for professeur_id, _, _ in changes:
+                concerned.setdefault(professeur_id, set()).add(module_id)
+        if not concerned:
+            return
+
+        # Examens avant / après propres à chaque surveillant: un surveillant
+        # retiré n'a plus d'examen après, un surveillant ajouté n'en avait pas
+        cur.execute("""
+            SELECT e.version_id, e.module_id, a.professeur_id, a.role
+            FROM affectations_surveillance a
+            JOIN examens e ON e.id = a.examen_id
+            WHERE e.version_id IN (%s, %s) AND a.professeur_id = ANY(%s)
+              AND e.module_id = ANY(%s)
+        """, (self.old_version, self.new_version, list(concerned),
+              list({m for modules in concerned.values() for m in modules})))
+        assigned = {(v, m, p): role for v, m, p, role in cur.fetchall()}
+
+        cur.execute("""
+            SELECT id, matricule, nom, prenom, email FROM professeurs WHERE id = ANY(%s)
+        """, (list(concerned),))
+        for professeur_id, matricule, nom, prenom, email in cur.fetchall():
+            entries = []
+            for module_id in sorted(concerned[professeur_id]):
+                exam = self.examens[module_id]
+                before = (exam['avant'] if (self.old_version, module_id, professeur_id)
+                          in assigned else None)
+                after = (exam['apres'] if (self.new_version, module_id, professeur_id)
+                         in assigned else None)
+                entries.append((module_id, before, after,
+                                assigned.get((self.new_version, module_id, professeur_id))))
+            self.professeurs[professeur_id] = {
+                'matricule': matricule, 'nom': nom, 'prenom': prenom, 'email': email,
+                'entrees': entries,
+            }
+
+    def _load_students(self, module_ids):
+        """Étudiants convoqués aux examens déplacés (index sur inscriptions.module_id)"""
+        if not module_ids:
+            return
+        cur = self.conn.cursor(name='diff_etudiants')
+        cur.itersize = CURSOR_ITERSIZE
+        cur.execute("""
+            SELECT et.id, et.matricule, et.nom, et.prenom, et.email, i.module_id
+            FROM inscriptions i
+            JOIN etudiants et ON et.id = i.etudiant_id
+            WHERE i.module_id = ANY(%s) AND i.annee_academique = %s
+              AND (%s <> 'rattrapage' OR i.statut = 'ajourne' OR i.note < %s)
+            ORDER BY et.id, i.module_id
+        """, (module_ids, self.annee_academique, self.session, NOTE_VALIDATION))
+        for etudiant_id, matricule, nom, prenom, email, module_id in cur:
+            student = self.etudiants.get(etudiant_id)
+            if student is None:
+                student = self.etudiants[etudiant_id] = {
+                    'matricule': matricule, 'nom': nom, 'prenom': prenom, 'email': email,
+                    'entrees': [],
+                }
+            exam = self.examens[module_id]
+            student['entrees'].append((module_id, exam['avant'], exam['apres'], None))
+        cur.close()
+
+    def summary(self):
+        counts = {}
+        for exam in self.examens.values():
+            for change in exam['changements']:
+                counts[change] = counts.get(change, 0) + 1
+        return {
+            'annee_academique': self.annee_academique,
+            'session': self.session,
+            'ancienne_version': self.old_version,
+            'nouvelle_version': self.new_version,
+            'examens': len(self.examens),
+            'changements': counts,
+            'etudiants': len(self.etudiants),
+            'professeurs': len(self.professeurs),
+            'temps': self.temps,
+        }
+
+
+def person_message(diff, person, kind):
+    """E-mail d'une personne: changements avant / après et calendrier joint"""
+    matricule = person['matricule']
+    lines = [f"Bonjour {person['prenom']} {person['nom']},", "",
+             f"Le planning des examens ({diff.session} {diff.annee_academique}) a été "
+             f"modifié. Vos {'surveillances' if kind == 'professeur' else 'examens'} "
+             f"concernés:", ""]
+    events = []
+    for module_id, before, after, role in person['entrees']:
+        exam = diff.examens[module_id]
+        changes = ', '.join(CHANGE_LABELS[c] for c in exam['changements'])
+        lines.append(f"- {exam['code']} {exam['module']} ({changes})")
+        lines.append(f"    avant: {format_entry(before)}")
+        lines.append(f"    après: {format_entry(after)}")
+
+        prefix = 'surveillance' if kind == 'professeur' else 'examen'
+        summary = (f"Surveillance {exam['module']} ({role})" if kind == 'professeur'
+                   else f"Examen {exam['module']}")
+        # Les examens d'une nouvelle version ont de nouveaux identifiants:
+        # l'ancien événement est annulé, le nouveau ajouté
+        for entry, cancelled in ((before, True), (after, False)):
+            if entry is None:
+                continue
+            event = ics_event(f"{prefix}-{entry['examen_id']}-{matricule}",
+                              entry['date_examen'], entry['heure_debut'],
+                              entry['duree_minutes'], summary,
+                              f"{entry['lieu']} ({entry['batiment']})", exam['code'])
+            if cancelled:
+                event.insert(-1, 'STATUS:CANCELLED')
+            events.append(event)
+    lines += ["", "Le calendrier joint remplace ces examens dans votre agenda."]
+
+    # Classes MIME compat32: l'API EmailMessage analyse chaque en-tête et
+    # coûte plusieurs millisecondes par message
+    message = MIMEMultipart()
+    message['From'] = OUTBOX_SENDER
+    if person['email']:
+        message['To'] = person['email']
+    message['Subject'] = (f"Planning des examens {diff.session} {diff.annee_academique}: "
+                          f"{len(person['entrees'])} changement(s)")
+    message['Date'] = formatdate(localtime=True)
+    message.attach(MIMEText('\n'.join(lines), 'plain', 'utf-8'))
+    calendar = ics_calendar(f"Changements - {person['prenom']} {person['nom']}", events)
+    attachment = MIMEText(calendar, 'calendar', 'utf-8')
+    attachment.add_header('Content-Disposition', 'attachment',
+                          filename=f'{safe_filename(matricule)}.ics')
+    message.attach(attachment)
+    return message, calendar
+
+
+def write_outbox(diff, outbox_dir=OUTBOX_DIR):
+    """Écrit un .eml et un .ics par personne concernée et le résumé JSON
+
+    Retourne le résumé complété du dossier et du nombre de personnes sans
+    adresse e-mail (message écrit sans destinataire).
+    """
+    base_dir = os.path.join(outbox_dir, f"{diff.annee_academique}_{diff.session}",
+                            f"v{diff.old_version}_v{diff.new_version}")
+    sans_email = 0
+    for kind, people in (('etudiant', diff.etudiants), ('professeur', diff.professeurs)):
+        directory = os.path.join(base_dir, f'{kind}s')
+        os.makedirs(directory, exist_ok=True)
+        for person in people.values():
+            message, calendar = person_message(diff, person, kind)
+            name = safe_filename(person['matricule'])
+            with open(os.path.join(directory, f'{name}.eml'), 'wb') as f:
+                f.write(message.as_bytes())
+            with open(os.path.join(directory, f'{name}.ics'), 'w', encoding='utf-8',
+                      newline='') as f:
+                f.write(calendar)
+            if not person['email']:
+                sans_email += 1
+
+    summary = dict(diff.summary(), dossier=base_dir, sans_email=sans_email)
+    examens = [
+        {'code': exam['code'], 'module': exam['module'], 'changements': exam['changements'],
+         'avant': format_entry(exam['avant']), 'apres': format_entry(exam['apres'])}
+        for exam in diff.examens.values()
+    ]
+    with open(os.path.join(base_dir, 'changements.json'), 'w', encoding='utf-8') as f:
+        json.dump(dict(summary, detail=examens), f, ensure_ascii=False, indent=2)
+    return summary
+
+
+def notify_changes(conn, annee_academique, session, old_version=None, new_version=None,
+                   outbox_dir=OUTBOX_DIR):
+    """Notifie les changements de la dernière publication (ou entre deux versions)
+
+    Sans versions données, compare la version publiée à la précédente.
+    Retourne None s'il n'y a pas de version précédente. Les transactions
+    de `conn` sont annulées: lui passer une connexion dédiée.
+    """
+    if new_version is None:
+        cur = conn.cursor()
+        cur.execute("""
+            SELECT precedente_id, version_id FROM plannings_publies
+            WHERE annee_academique = %s AND session = %s
+        """, (annee_academique, session))
+        row = cur.fetchone()
+        cur.close()
+        conn.rollback()
+        if row is None or row[0] is None:
+            return None
+        old_version, new_version = row
+    diff = ScheduleDiff(conn, old_version, new_version).compute()
+    return write_outbox(diff, outbox_dir)
+
+
+def print_summary(summary):
+    print(f"\n=== CHANGEMENTS v{summary['ancienne_version']} -> v{summary['nouvelle_version']} "
+          f"({summary['session']} {summary['annee_academique']}) ===")
+    print(f"  {summary['examens']} examens modifiés en {summary['temps']}s")
+    for change, nb in summary['changements'].items():
+        print(f"    {CHANGE_LABELS[change]:20s} {nb}")
+    print(f"  {summary['etudiants']} étudiants et {summary['professeurs']} professeurs notifiés "
+          f"({summary['sans_email']} sans e-mail)")
+    print(f"  Boîte d'envoi: {summary['dossier']}")
+
+
+if __name__ == "__main__":
+    DB_CONFIG = {
+        'dbname': 'examens_db',
+        'user': 'postgres',
+        'password': '5432',
+        'host': 'localhost',
+        'port': '5432'
+    }
+    args = sys.argv[1:]
+    annee = args[0] if args else "2024-2025"
+    session = args[1] if len(args) > 1 else "normale"
+    versions = [int(v) for v in args[2:4]] if len(args) > 3 else [None, None]
+
+    conn = psycopg2.connect(**DB_CONFIG)
+    try:
+        summary = notify_changes(conn, annee, session, *versions)
+        if summary is None:
+            print("Aucune version précédente à comparer")
+        else:
+            print_summary(summary)
+    finally:
+        conn.close()
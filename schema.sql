@@ -3,7 +3,12 @@
 -- ============================================
 
 -- Suppression des tables existantes
+DROP TABLE IF EXISTS validation_violations CASCADE;
+DROP TABLE IF EXISTS validations CASCADE;
+DROP TABLE IF EXISTS generation_jobs CASCADE;
+DROP TABLE IF EXISTS plannings_publies CASCADE;
 DROP TABLE IF EXISTS examens CASCADE;
+DROP TABLE IF EXISTS planning_versions CASCADE;
 DROP TABLE IF EXISTS inscriptions CASCADE;
 DROP TABLE IF EXISTS modules CASCADE;
 DROP TABLE IF EXISTS affectations_surveillance CASCADE;
@@ -127,6 +132,51 @@ CREATE INDEX idx_inscriptions_etudiant ON inscriptions(etudiant_id);
 CREATE INDEX idx_inscriptions_module ON inscriptions(module_id);
 CREATE INDEX idx_inscriptions_annee ON inscriptions(annee_academique);
 
+-- ============================================
+-- TABLE: Versions du planning
+-- ============================================
+-- Chaque génération écrit une nouvelle version; seule la version pointée
+-- par plannings_publies est visible des lecteurs (vue examens_publies).
+CREATE TABLE planning_versions (
+    id SERIAL PRIMARY KEY,
+    annee_academique VARCHAR(9) NOT NULL,
+    session VARCHAR(20) NOT NULL,
+    statut VARCHAR(20) NOT NULL DEFAULT 'brouillon', -- brouillon, publie, archive
+    nb_examens INTEGER DEFAULT 0,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    published_at TIMESTAMP
+);
+
+CREATE TABLE plannings_publies (
+    annee_academique VARCHAR(9) NOT NULL,
+    session VARCHAR(20) NOT NULL,
+    version_id INTEGER NOT NULL REFERENCES planning_versions(id),
+    precedente_id INTEGER REFERENCES planning_versions(id),
+    published_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (annee_academique, session)
+);
+
+-- Générations lancées (une seule en cours par année / session, sous verrou
+-- consultatif; voir generation_lock.py)
+CREATE TABLE generation_jobs (
+    id SERIAL PRIMARY KEY,
+    annee_academique VARCHAR(9) NOT NULL,
+    session VARCHAR(20) NOT NULL,
+    parametres VARCHAR(32) NOT NULL, -- empreinte des paramètres
+    statut VARCHAR(20) NOT NULL DEFAULT 'en_cours', -- en_cours, termine, echec
+    etape VARCHAR(50),
+    progression INTEGER DEFAULT 0,
+    total INTEGER DEFAULT 0,
+    version_id INTEGER,
+    nb_planifies INTEGER,
+    nb_conflits INTEGER,
+    erreur TEXT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX idx_generation_jobs_session ON generation_jobs(annee_academique, session, statut);
+
 -- ============================================
 -- TABLE: Examens
 -- ============================================
@@ -141,11 +191,12 @@ CREATE TABLE examens (
     annee_academique VARCHAR(9) NOT NULL,
     statut VARCHAR(20) DEFAULT 'planifie', -- planifie, en_cours, termine, annule
     nb_inscrits INTEGER DEFAULT 0,
-    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-    UNIQUE(module_id, session, annee_academique)
+    version_id INTEGER REFERENCES planning_versions(id) ON DELETE CASCADE,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
 
 -- Index pour optimiser les requêtes
+CREATE UNIQUE INDEX idx_examens_version_module ON examens(version_id, module_id);
 CREATE INDEX idx_examens_date ON examens(date_examen);
 CREATE INDEX idx_examens_lieu ON examens(lieu_id);
 CREATE INDEX idx_examens_module ON examens(module_id);
@@ -166,6 +217,36 @@ CREATE TABLE affectations_surveillance (
 CREATE INDEX idx_surveillance_examen ON affectations_surveillance(examen_id);
 CREATE INDEX idx_surveillance_prof ON affectations_surveillance(professeur_id);
 
+-- ============================================
+-- TABLE: Validations des versions (voir validator.py)
+-- ============================================
+CREATE TABLE validations (
+    id SERIAL PRIMARY KEY,
+    version_id INTEGER NOT NULL REFERENCES planning_versions(id) ON DELETE CASCADE,
+    nb_examens INTEGER NOT NULL,
+    nb_violations INTEGER NOT NULL,
+    resultats JSONB NOT NULL, -- violations par contrainte
+    duree NUMERIC(8,3),
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX idx_validations_version ON validations(version_id);
+
+-- Premières violations de chaque contrainte (les comptes sont dans resultats)
+CREATE TABLE validation_violations (
+    id SERIAL PRIMARY KEY,
+    validation_id INTEGER NOT NULL REFERENCES validations(id) ON DELETE CASCADE,
+    contrainte VARCHAR(30) NOT NULL,
+    examen_id INTEGER,
+    autre_examen_id INTEGER,
+    etudiant_id INTEGER,
+    professeur_id INTEGER,
+    date_examen DATE,
+    detail TEXT
+);
+
+CREATE INDEX idx_validation_violations_validation ON validation_violations(validation_id);
+
 -- ============================================
 -- TABLE: Utilisateurs (pour l'authentification)
 -- ============================================
@@ -175,6 +256,8 @@ CREATE TABLE users (
     password_hash VARCHAR(255) NOT NULL,
     role VARCHAR(30) NOT NULL, -- 'doyen', 'admin', 'chef_dept', 'etudiant', 'professeur'
     reference_id INTEGER, -- ID dans la table correspondante
+    nom VARCHAR(100),
+    prenom VARCHAR(100),
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
 
@@ -182,6 +265,12 @@ CREATE TABLE users (
 -- VUES UTILES
 -- ============================================
 
+-- Vue: Examens de la version publiée de chaque année / session
+CREATE OR REPLACE VIEW examens_publies AS
+SELECT e.*
+FROM examens e
+JOIN plannings_publies p ON p.version_id = e.version_id;
+
 -- Vue: Examens avec détails complets
 CREATE OR REPLACE VIEW v_examens_details AS
 SELECT
@@ -201,7 +290,7 @@ SELECT
     l.capacite_examen,
     e.nb_inscrits,
     (l.capacite_examen - e.nb_inscrits) as places_disponibles
-FROM examens e
+FROM examens_publies e
 JOIN modules m ON e.module_id = m.id
 JOIN formations f ON m.formation_id = f.id
 JOIN departements d ON f.dept_id = d.id
@@ -217,8 +306,8 @@ SELECT
     COUNT(a.id) as nb_surveillances,
     COUNT(DISTINCT e.date_examen) as nb_jours
 FROM professeurs p
-LEFT JOIN affectations_surveillance a ON p.id = a.professeur_id
-LEFT JOIN examens e ON a.examen_id = e.id
+LEFT JOIN (affectations_surveillance a
+           JOIN examens_publies e ON a.examen_id = e.id) ON p.id = a.professeur_id
 JOIN departements d ON p.dept_id = d.id
 GROUP BY p.id, p.nom, p.prenom, d.nom;
 
@@ -238,6 +327,6 @@ SELECT
 FROM etudiants et
 JOIN inscriptions i ON et.id = i.etudiant_id
 JOIN modules m ON i.module_id = m.id
-JOIN examens e ON m.id = e.module_id
+JOIN examens_publies e ON m.id = e.module_id
 JOIN lieux_examen l ON e.lieu_id = l.id
 ORDER BY et.id, e.date_examen, e.heure_debut;
\ No newline at end of file
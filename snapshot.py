@@ -0,0 +1,356 @@
+from functools import cached_property
+
+import numpy as np
+import pandas as pd
+
+from validator import LATEST_VALIDATIONS
+
+# Pas des créneaux du cube d'utilisation des salles (minutes)
+SLOT_MINUTES = 30
+
+EXAMENS_DTYPES = {
+    'examen_id': 'int32',
+    'module_id': 'int32',
+    'module_code': 'category',
+    'module': 'category',
+    'formation_id': 'int32',
+    'formation': 'category',
+    'niveau': 'category',
+    'dept_id': 'int32',
+    'departement': 'category',
+    'lieu_id': 'int32',
+    'lieu': 'category',
+    'lieu_type': 'category',
+    'capacite_examen': 'int32',
+    'heure_minutes': 'int16',
+    'duree_minutes': 'int16',
+    'nb_inscrits': 'int32',
+    'session': 'category',
+    'annee_academique': 'category',
+}
+
+LIEUX_DTYPES = {
+    'lieu_id': 'int32',
+    'lieu': 'category',
+    'lieu_type': 'category',
+    'capacite_examen': 'int32',
+}
+
+SURVEILLANCES_DTYPES = {
+    'examen_id': 'int32',
+    'professeur_id': 'int32',
+    'role': 'category',
+}
+
+
+def schedule_version(conn):
+    """Identifiant léger du planning publié: les versions pointées
+
+    Une version publiée n'est plus modifiée, le pointeur suffit, avec la
+    dernière validation de chaque version (une revalidation change les KPIs).
+    """
+    cur = conn.cursor()
+    cur.execute("SELECT to_regclass('validations') IS NOT NULL")
+    if cur.fetchone()[0]:
+        cur.execute("""
+            SELECT p.annee_academique, p.session, p.version_id,
+                (SELECT MAX(v.id) FROM validations v WHERE v.version_id = p.version_id)
+            FROM plannings_publies p
+            ORDER BY p.annee_academique, p.session
+        """)
+    else:
+        cur.execute("""
+            SELECT annee_academique, session, version_id
+            FROM plannings_publies
+            ORDER BY annee_academique, session
+        """)
+    version = cur.fetchall()
+    cur.close()
+    return tuple(version)
+
+
+class UtilizationCube:
+    """Occupation salle x jour x créneau d'une version du planning
+
+    `fill` cumule le taux de remplissage (inscrits / capacité) des examens
+    présents dans chaque cellule, `busy` leur nombre (> 1: chevauchement).
+    Les jours sont les jours d'examen, les créneaux couvrent la plage
+    horaire utilisée par le planning.
+    """
+
+    def __init__(self, lieux, dates, day_start, slot, fill, busy):
+        self.lieux = lieux
+        self.dates = dates
+        self.day_start = day_start
+        self.slot = slot
+        self.fill = fill
+        self.busy = busy
+
+    @classmethod
+    def build(cls, examens, lieux, slot=SLOT_MINUTES):
+        lieux = lieux.sort_values(['capacite_examen', 'lieu_id'], ascending=[False, True],
+                                  ignore_index=True)
+        dates = pd.DatetimeIndex(np.sort(examens['date_examen'].unique()))
+        start = examens['heure_minutes'].to_numpy().astype(np.int64)
+        end = start + examens['duree_minutes'].to_numpy()
+        if len(start):
+            day_start = int(start.min()) // slot * slot
+            n_slots = -(-(int(end.max()) - day_start) // slot)
+        else:
+            day_start, n_slots = 0, 0
+        shape = (len(lieux), len(dates), n_slots)
+
+        # Une entrée par (examen, créneau couvert)
+        first = (start - day_start) // slot
+        count = -(-(end - day_start) // slot) - first
+        rows = np.repeat(np.arange(len(examens)), count)
+        offsets = np.arange(len(rows)) - np.repeat(np.cumsum(count) - count, count)
+        room = pd.Index(lieux['lieu_id']).get_indexer(examens['lieu_id'])
+        day = dates.get_indexer(examens['date_examen'])
+        cells = np.ravel_multi_index((room[rows], day[rows], first[rows] + offsets), shape)
+
+        ratio = (examens['nb_inscrits'] / examens['capacite_examen']).to_numpy()
+        size = int(np.prod(shape))
+        fill = np.bincount(cells, weights=ratio[rows], minlength=size).astype(np.float32)
+        busy = np.bincount(cells, minlength=size).astype(np.int16)
+        return cls(lieux, dates, day_start, slot, fill.reshape(shape), busy.reshape(shape))
+
+    @property
+    def slot_labels(self):
+        minutes = self.day_start + self.slot * np.arange(self.busy.shape[2])
+        return [f"{m // 60:02d}:{m % 60:02d}" for m in minutes]
+
+    def frame(self):
+        """Cube à plat: une ligne par salle, jour et créneau"""
+        room, day, slot = np.indices(self.busy.shape).reshape(3, -1)
+        return pd.DataFrame({
+            'lieu': self.lieux['lieu'].to_numpy()[room],
+            'capacite': self.lieux['capacite_examen'].to_numpy()[room],
+            'date': self.dates[day],
+            'creneau': np.asarray(self.slot_labels, dtype=object)[slot],
+            'examens': self.busy.ravel(),
+            'remplissage': (self.fill.ravel() * 100).round(1),
+        })
+
+    def room_statistics(self):
+        """Utilisation dans le temps, remplissage et temps mort par salle"""
+        occupied = (self.busy > 0).sum(axis=(1, 2))
+        opening = self.busy.shape[1] * self.busy.shape[2]
+        return pd.DataFrame({
+            'lieu': self.lieux['lieu'].astype(str),
+            'type': self.lieux['lieu_type'].astype(str),
+            'capacite': self.lieux['capacite_examen'],
+            'utilisation': (occupied / max(opening, 1) * 100).round(1),
+            'remplissage_moyen': (self.fill.sum(axis=(1, 2)) / np.maximum(occupied, 1) * 100).round(1),
+            'remplissage_max': (self.fill.max(axis=(1, 2), initial=0) * 100).round(1),
+            'temps_mort_h': ((opening - occupied) * self.slot / 60).round(1),
+            'chevauchements': (self.busy > 1).sum(axis=(1, 2)),
+        })
+
+
+class ScheduleSnapshot:
+    """Copie colonnaire en mémoire du planning pour les tableaux de bord"""
+
+    def __init__(self, examens, surveillances, lieux=None, validations=None):
+        self.examens = examens
+        self.surveillances = surveillances
+        # Dernière validation de chaque version publiée (validator.py)
+        self.validations = validations
+        # Salles disponibles ou utilisées, y compris celles sans examen
+        if lieux is None:
+            lieux = (examens[list(LIEUX_DTYPES)].drop_duplicates('lieu_id')
+                     .reset_index(drop=True))
+        self.lieux = lieux
+
+    @classmethod
+    def load(cls, conn):
+        """Charge le planning publié en colonnes typées
+
+        Lecture en REPEATABLE READ: examens et surveillances viennent de la
+        même image de la base, même si une publication a lieu entre-temps.
+        La transaction en cours de `conn` est annulée: utiliser une
+        connexion dédiée, pas une connexion partagée entre sessions.
+        """
+        conn.rollback()
+        cur = conn.cursor()
+        cur.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ READ ONLY")
+        cur.execute("""
+            SELECT
+                e.id, e.module_id, m.code, m.nom,
+                f.id, f.nom, f.niveau,
+                d.id, d.nom,
+                l.id, l.nom, l.type, l.capacite_examen,
+                e.date_examen,
+                (EXTRACT(HOUR FROM e.heure_debut) * 60 + EXTRACT(MINUTE FROM e.heure_debut))::INTEGER,
+                e.duree_minutes, e.nb_inscrits, e.session, e.annee_academique
+            FROM examens_publies e
+            JOIN modules m ON e.module_id = m.id
+            JOIN formations f ON m.formation_id = f.id
+            JOIN departements d ON f.dept_id = d.id
+            JOIN lieux_examen l ON e.lieu_id = l.id
+        """)
+        examens = pd.DataFrame(cur.fetchall(), columns=[
+            'examen_id', 'module_id', 'module_code', 'module',
+            'formation_id', 'formation', 'niveau',
+            'dept_id', 'departement',
+            'lieu_id', 'lieu', 'lieu_type', 'capacite_examen',
+            'date_examen', 'heure_minutes',
+            'duree_minutes', 'nb_inscrits', 'session', 'annee_academique'
+        ])
+        examens['nb_inscrits'] = examens['nb_inscrits'].fillna(0)
+        examens = examens.astype(EXAMENS_DTYPES)
+        examens['date_examen'] = pd.to_datetime(examens['date_examen'])
+
+        cur.execute("""
+            SELECT a.examen_id, a.professeur_id, a.role
+            FROM affectations_surveillance a
+            JOIN examens_publies e ON e.id = a.examen_id
+        """)
+        surveillances = pd.DataFrame(cur.fetchall(),
+                                     columns=['examen_id', 'professeur_id', 'role'])
+        surveillances = surveillances.astype(SURVEILLANCES_DTYPES)
+
+        cur.execute("""
+            SELECT id, nom, type, capacite_examen
+            FROM lieux_examen
+            WHERE disponible = TRUE OR id IN (SELECT lieu_id FROM examens_publies)
+        """)
+        lieux = pd.DataFrame(cur.fetchall(), columns=list(LIEUX_DTYPES)).astype(LIEUX_DTYPES)
+
+        validations = None
+        cur.execute("SELECT to_regclass('validations') IS NOT NULL")
+        if cur.fetchone()[0]:
+            cur.execute(LATEST_VALIDATIONS)
+            validations = pd.DataFrame(cur.fetchall(), columns=[
+                'validation_id', 'version_id', 'annee_academique', 'session',
+                'nb_examens', 'nb_violations', 'resultats', 'created_at'
+            ])
+        cur.close()
+        conn.rollback()
+
+        return cls(examens, surveillances, lieux, validations)
+
+    @property
+    def empty(self):
+        return self.examens.empty
+
+    def _taux(self, examens):
+        return examens['nb_inscrits'] / examens['capacite_examen'] * 100
+
+    def kpis(self):
+        """KPIs globaux: examens, taux d'occupation, conflits, professeurs"""
+        examens = self.examens
+        if examens.empty:
+            return {'total_examens': 0, 'taux_occupation': 0,
+                    'conflits': 0, 'professeurs': 0}
+
+        return {
+            'total_examens': len(examens),
+            'taux_occupation': round(float(self._taux(examens).mean()), 2),
+            'conflits': self.violations(),
+            'professeurs': int(self.surveillances['professeur_id'].nunique())
+        }
+
+    def violations(self):
+        """Violations des contraintes dures d'après la dernière validation
+
+        None si une version publiée n'a pas encore été validée.
+        """
+        validations = self.validations
+        if validations is None:
+            return None
+        published = self.examens[['annee_academique', 'session']].drop_duplicates()
+        if len(validations) < len(published):
+            return None
+        return int(validations['nb_violations'].sum())
+
+    def exams_by_department(self):
+        """Nombre d'examens par département"""
+        df = (self.examens.groupby('departement', observed=True).size()
+              .rename('nb').reset_index().rename(columns={'departement': 'nom'}))
+        return df.sort_values('nb', ascending=False, ignore_index=True)
+
+    def amphi_occupation(self):
+        """Taux d'occupation moyen par amphithéâtre"""
+        amphis = self.examens[self.examens['lieu_type'] == 'amphitheatre']
+        taux = self._taux(amphis).groupby(amphis['lieu'], observed=True).mean().round(2)
+        return taux.rename('taux').rename_axis('nom').reset_index()
+
+    def department_stats(self, dept_id):
+        """Examens, professeurs et jours d'examen d'un département"""
+        examens = self.examens[self.examens['dept_id'] == dept_id]
+        surveillances = self.surveillances[
+            np.isin(self.surveillances['examen_id'].to_numpy(), examens['examen_id'].to_numpy())
+        ]
+        return {
+            'examens': int(examens['examen_id'].nunique()),
+            'professeurs': int(surveillances['professeur_id'].nunique()),
+            'jours': int(examens['date_examen'].nunique())
+        }
+
+    def department_planning(self, dept_id):
+        """Planning d'un département, prêt à afficher"""
+        examens = (self.examens[self.examens['dept_id'] == dept_id]
+                   .sort_values(['date_examen', 'heure_minutes']))
+        heures = examens['heure_minutes'].astype('int32')
+
+        return pd.DataFrame({
+            'Formation': examens['formation'].astype(str),
+            'Module': examens['module'].astype(str),
+            'Date': examens['date_examen'],
+            'Heure': (heures // 60).astype(str).str.zfill(2) + ':' + (heures % 60).astype(str).str.zfill(2),
+            'Durée': examens['duree_minutes'],
+            'Lieu': examens['lieu'].astype(str),
+            'Inscrits': examens['nb_inscrits'],
+        }).reset_index(drop=True)
+
+    @cached_property
+    def utilization(self):
+        """Cube d'utilisation des salles, construit une fois par snapshot (donc par version)"""
+        return UtilizationCube.build(self.examens, self.lieux)
+
+    def utilization_heatmap(self, by='lieu'):
+        """Taux d'occupation (%) par jour, en lignes les salles ou les créneaux
+
+        by='lieu': part du temps où chaque salle est occupée;
+        by='creneau': part des salles occupées à chaque créneau.
+        """
+        if self.examens.empty:
+            return pd.DataFrame()
+        cube = self.utilization
+        occupied = cube.busy > 0
+        columns = cube.dates.strftime('%d/%m')
+        if by == 'lieu':
+            return pd.DataFrame(occupied.mean(axis=2) * 100,
+                                index=cube.lieux['lieu'].astype(str), columns=columns).round(1)
+        return pd.DataFrame(occupied.mean(axis=0).T * 100,
+                            index=cube.slot_labels, columns=columns).round(1)
+
+    def capacity_summary(self):
+        """Utilisation agrégée par type de lieu (offre vs usage)"""
+        rooms = self.utilization.room_statistics()
+        opening = self.utilization.busy.shape[1] * self.utilization.busy.shape[2] * SLOT_MINUTES / 60
+        rooms['heures_occupees'] = opening - rooms['temps_mort_h']
+        summary = rooms.groupby('type').agg(
+            salles=('lieu', 'size'),
+            places=('capacite', 'sum'),
+            heures_occupees=('heures_occupees', 'sum'),
+            temps_mort_h=('temps_mort_h', 'sum'),
+            remplissage_moyen=('remplissage_moyen', 'mean'),
+        )
+        summary['utilisation'] = (summary['heures_occupees']
+                                  / np.maximum(summary['salles'] * opening, 1) * 100)
+        return summary.round(1).reset_index()
+
+    def bottleneck_rooms(self, threshold=80):
+        """Salles occupées au moins `threshold` % du temps, les plus saturées d'abord"""
+        rooms = self.utilization.room_statistics()
+        rooms = rooms[rooms['utilisation'] >= threshold]
+        return rooms.sort_values(['utilisation', 'remplissage_moyen'], ascending=False,
+                                 ignore_index=True)
+
+    def idle_rooms(self, max_capacite=20, threshold=20):
+        """Petites salles occupées moins de `threshold` % du temps"""
+        rooms = self.utilization.room_statistics()
+        rooms = rooms[(rooms['capacite'] <= max_capacite) & (rooms['utilisation'] < threshold)]
+        return rooms.sort_values('temps_mort_h', ascending=False, ignore_index=True)
@@ -0,0 +1,32 @@
+from datetime import time
+
+from optimizer import DayGrid, overlaps
+
+
+def test_overlaps():
+    intervals = [(750, 810)]
+    assert overlaps(intervals, 720, 780)
+    assert not overlaps(intervals, 660, 750)
+    assert not overlaps(intervals, 810, 900)
+
+
+def test_valid_starts_default():
+    grid = DayGrid()
+    # 8h-18h, pause 12h30-13h30, pas de 30 minutes
+    assert grid.valid_starts(90) == [480, 510, 540, 570, 600, 630, 660,
+                                     810, 840, 870, 900, 930, 960, 990]
+    assert grid.valid_starts(90) is grid.valid_starts(90)
+
+
+def test_valid_starts_too_long():
+    assert DayGrid().valid_starts(300) == []
+
+
+def test_valid_starts_without_breaks():
+    grid = DayGrid(start=time(9, 0), end=time(12, 0), breaks=(), granularity=60)
+    assert grid.valid_starts(60) == [540, 600, 660]
+    assert grid.valid_starts(120) == [540, 600]
+
+
+def test_to_time():
+    assert DayGrid().to_time(14 * 60 + 30) == time(14, 30)
@@ -0,0 +1,118 @@
+from collections import Counter
+from itertools import combinations
+
+import numpy as np
+
+import enrollment_matrix
+from enrollment_matrix import EnrollmentMatrix
+
+# (etudiant_id, module_id), triées par étudiant comme la requête de build
+INSCRIPTIONS = [
+    (1, 10), (1, 20), (1, 30),
+    (2, 10), (2, 20),
+    (3, 30),
+    (4, 20), (4, 30), (4, 40),
+    (5, 10), (5, 40),
+]
+MODULES = [10, 20, 30, 40, 50]
+
+
+class FakeCursor:
+    """Curseur serveur minimal: rend les lignes par fetchmany"""
+
+    def __init__(self, rows):
+        self.rows = list(rows)
+
+    def execute(self, query, params):
+        pass
+
+    def fetchmany(self, size):
+        rows, self.rows = self.rows[:size], self.rows[size:]
+        return rows
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def cursor(self, name=None):
+        return FakeCursor(self.rows)
+
+
+def build(tmp_path, rows=INSCRIPTIONS):
+    return EnrollmentMatrix.build(FakeConnection(rows), str(tmp_path), "", (), MODULES)
+
+
+def expected_overlaps(rows):
+    by_student = {}
+    for etudiant, module in rows:
+        by_student.setdefault(etudiant, []).append(module)
+    pairs = Counter()
+    for modules in by_student.values():
+        pairs.update(combinations(sorted(modules), 2))
+    return dict(pairs)
+
+
+def test_build(tmp_path):
+    matrix = build(tmp_path)
+    assert matrix.n_students == 5
+    assert matrix.n_modules == 5
+    assert list(matrix.module_counts()) == [3, 3, 3, 2, 0]
+    assert [int(matrix.student_ids[i]) for i in matrix[10]] == [1, 2, 5]
+    assert len(matrix[50]) == 0
+    assert 40 in matrix and 60 not in matrix
+    assert [int(matrix.module_ids[i]) for i in matrix.modules_of(3)] == [20, 30, 40]
+    assert EnrollmentMatrix.exists(str(tmp_path))
+
+
+def test_build_across_fetches(tmp_path, monkeypatch):
+    """Un étudiant coupé entre deux paquets reste une seule ligne"""
+    monkeypatch.setattr(enrollment_matrix, 'FETCH_SIZE', 2)
+    matrix = build(tmp_path)
+    assert matrix.n_students == 5
+    assert list(np.diff(matrix.csr_indptr)) == [3, 2, 1, 3, 2]
+
+
+def test_overlap_counts(tmp_path):
+    matrix = build(tmp_path)
+    # Blocs d'un et de deux étudiants: même résultat que sans blocs
+    for block_students in (1, 2, 100):
+        a, b, counts = matrix.overlap_counts(block_students)
+        found = {
+            (int(matrix.module_ids[i]), int(matrix.module_ids[j])): int(n)
+            for i, j, n in zip(a, b, counts)
+        }
+        assert found == expected_overlaps(INSCRIPTIONS)
+
+
+def test_overlap_counts_random(tmp_path):
+    rng = np.random.default_rng(0)
+    rows = sorted({(int(e), int(m)) for e, m in zip(rng.integers(0, 200, 1500),
+                                                    rng.choice(MODULES, 1500))})
+    matrix = build(tmp_path, rows)
+    a, b, counts = matrix.overlap_counts(block_students=37)
+    found = {
+        (int(matrix.module_ids[i]), int(matrix.module_ids[j])): int(n)
+        for i, j, n in zip(a, b, counts)
+    }
+    assert found == expected_overlaps(rows)
+
+
+def test_conflict_graph(tmp_path):
+    graph = build(tmp_path).conflict_graph()
+    assert graph == {
+        10: {20, 30, 40},
+        20: {10, 30, 40},
+        30: {10, 20, 40},
+        40: {10, 20, 30},
+        50: set(),
+    }
+
+
+def test_pickle_reopens_files(tmp_path):
+    import pickle
+    matrix = pickle.loads(pickle.dumps(build(tmp_path)))
+    assert list(matrix.module_counts()) == [3, 3, 3, 2, 0]
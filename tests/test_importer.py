@@ -0,0 +1,87 @@
+from decimal import Decimal
+
+import pytest
+
+from importer import (RowError, annee_academique, clean, email, integer, matricule,
+                      normalize_header, note, reference, statut_inscription, text)
+
+
+def test_normalize_header():
+    assert normalize_header('Année académique') == 'annee_academique'
+    assert normalize_header(' E-mail ') == 'e_mail'
+
+
+def test_clean():
+    assert clean(None) is None
+    assert clean('  ') is None
+    assert clean(2024.0) == '2024'
+    assert clean(' INF101 ') == 'INF101'
+
+
+def test_text():
+    assert text(5)('nom', 'Alami') == 'Alami'
+    assert text(5, required=False)('nom', None) is None
+    with pytest.raises(RowError):
+        text(5)('nom', None)
+    with pytest.raises(RowError):
+        text(5)('nom', 'Benali')
+
+
+def test_matricule():
+    assert matricule('matricule', 'e2024/001') == 'E2024/001'
+    with pytest.raises(RowError):
+        matricule('matricule', '-E001')
+
+
+def test_email():
+    assert email('email', None) is None
+    assert email('email', 'a.b@univ.dz') == 'a.b@univ.dz'
+    with pytest.raises(RowError):
+        email('email', 'a.b@univ')
+
+
+def test_integer():
+    check = integer(1950, 2100)
+    assert check('promotion', '2024') == 2024
+    for value in (None, '20x', '1900'):
+        with pytest.raises(RowError):
+            check('promotion', value)
+
+
+def test_note():
+    assert note('note', None) is None
+    assert note('note', '12,5') == Decimal('12.50')
+    assert note('note', '0') == Decimal('0.00')
+    for value in ('abc', '21', '-1'):
+        with pytest.raises(RowError):
+            note('note', value)
+
+
+@pytest.mark.parametrize('value', ['NaN', 'sNaN', 'Infinity', '-inf'])
+def test_note_not_finite(value):
+    with pytest.raises(RowError) as error:
+        note('note', value)
+    assert error.value.champ == 'note'
+    assert str(error.value) == "note invalide"
+
+
+def test_annee_academique():
+    assert annee_academique('annee', '2024-2025') == '2024-2025'
+    for value in (None, '2024-2026', '2024/2025'):
+        with pytest.raises(RowError):
+            annee_academique('annee', value)
+
+
+def test_statut_inscription():
+    assert statut_inscription('statut', None) == 'inscrit'
+    assert statut_inscription('statut', 'Ajourné') == 'ajourne'
+    with pytest.raises(RowError):
+        statut_inscription('statut', 'absent')
+
+
+def test_reference():
+    check = reference('formations', "formation")
+    references = {'formations': {'L1INFO': 3}}
+    assert check('formation', 'l1info', references) == 3
+    with pytest.raises(RowError):
+        check('formation', 'M2', references)
@@ -0,0 +1,78 @@
+import pandas as pd
+
+from snapshot import EXAMENS_DTYPES, SURVEILLANCES_DTYPES, ScheduleSnapshot
+
+
+def make_examens(rows):
+    examens = pd.DataFrame(rows, columns=[
+        'examen_id', 'module_id', 'module_code', 'module',
+        'formation_id', 'formation', 'niveau',
+        'dept_id', 'departement',
+        'lieu_id', 'lieu', 'lieu_type', 'capacite_examen',
+        'date_examen', 'heure_minutes',
+        'duree_minutes', 'nb_inscrits', 'session', 'annee_academique'
+    ]).astype(EXAMENS_DTYPES)
+    examens['date_examen'] = pd.to_datetime(examens['date_examen'])
+    return examens
+
+
+def make_snapshot():
+    examens = make_examens([
+        (1, 10, 'INF101', 'Algo', 1, 'L1 Info', 'L1', 1, 'Informatique',
+         1, 'Amphi A', 'amphitheatre', 100, '2025-01-06', 9 * 60, 90, 80, 'normale', '2024-2025'),
+        (2, 11, 'INF102', 'Systèmes', 1, 'L1 Info', 'L1', 1, 'Informatique',
+         2, 'Salle 1', 'salle', 20, '2025-01-06', 14 * 60 + 30, 120, 10, 'normale', '2024-2025'),
+        (3, 20, 'MAT101', 'Analyse', 2, 'L1 Maths', 'L1', 2, 'Mathématiques',
+         1, 'Amphi A', 'amphitheatre', 100, '2025-01-07', 8 * 60, 90, 50, 'normale', '2024-2025'),
+    ])
+    surveillances = pd.DataFrame([
+        (1, 100, 'responsable'), (2, 100, 'responsable'), (3, 200, 'responsable'),
+    ], columns=['examen_id', 'professeur_id', 'role']).astype(SURVEILLANCES_DTYPES)
+    return ScheduleSnapshot(examens, surveillances)
+
+
+def test_kpis():
+    kpis = make_snapshot().kpis()
+    assert kpis['total_examens'] == 3
+    assert kpis['taux_occupation'] == round((80 + 50 + 50) / 3, 2)
+    assert kpis['professeurs'] == 2
+    # Aucune validation chargée
+    assert kpis['conflits'] is None
+
+
+def test_kpis_empty():
+    snapshot = ScheduleSnapshot(make_examens([]), pd.DataFrame(columns=list(SURVEILLANCES_DTYPES)))
+    assert snapshot.empty
+    assert snapshot.kpis()['total_examens'] == 0
+
+
+def test_exams_by_department():
+    df = make_snapshot().exams_by_department()
+    assert df.to_dict('records') == [
+        {'nom': 'Informatique', 'nb': 2},
+        {'nom': 'Mathématiques', 'nb': 1},
+    ]
+
+
+def test_amphi_occupation():
+    df = make_snapshot().amphi_occupation()
+    assert df.to_dict('records') == [{'nom': 'Amphi A', 'taux': 65.0}]
+
+
+def test_department_stats():
+    assert make_snapshot().department_stats(1) == {'examens': 2, 'professeurs': 1, 'jours': 1}
+
+
+def test_department_planning():
+    df = make_snapshot().department_planning(1)
+    assert list(df['Module']) == ['Algo', 'Systèmes']
+    assert list(df['Heure']) == ['09:00', '14:30']
+
+
+def test_department_planning_empty():
+    """Un département sans examen publié donne un planning vide"""
+    snapshot = make_snapshot()
+    df = snapshot.department_planning(99)
+    assert df.empty
+    assert list(df.columns) == list(snapshot.department_planning(1).columns)
+    assert snapshot.department_stats(99) == {'examens': 0, 'professeurs': 0, 'jours': 0}
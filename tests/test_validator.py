@@ -0,0 +1,104 @@
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+from validator import ScheduleValidator, same_group_pairs, sweep
+
+
+def brute_force_overlaps(groups, debut, fin):
+    """Positions (i, j) des intervalles du même groupe qui se chevauchent"""
+    keys = list(zip(*groups))
+    return {
+        (i, j) for i in range(len(debut)) for j in range(len(debut))
+        if i != j and keys[i] == keys[j]
+        and debut[j] <= debut[i] < fin[j] and (debut[j], j) < (debut[i], i)
+    }
+
+
+def test_sweep():
+    salles = [1, 1, 1, 2, 2]
+    jours = [1, 1, 1, 1, 2]
+    debut = [480, 540, 600, 480, 480]
+    fin = [600, 570, 660, 600, 600]
+    a, b = sweep([salles, jours], debut, fin)
+    # 540 chevauche 480-600, 600 commence à la fin du premier: pas de conflit
+    assert list(zip(a.tolist(), b.tolist())) == [(1, 0)]
+
+
+def test_sweep_reports_longest_previous():
+    """L'intervalle précédent retenu est celui qui atteint la plus grande fin"""
+    a, b = sweep([[1, 1, 1]], [480, 500, 650], [700, 520, 680])
+    assert list(zip(a.tolist(), b.tolist())) == [(1, 0), (2, 0)]
+
+
+def test_sweep_small():
+    for n in (0, 1):
+        a, b = sweep([[1] * n], [480] * n, [600] * n)
+        assert len(a) == 0 and len(b) == 0
+
+
+def test_sweep_random():
+    rng = np.random.default_rng(0)
+    n = 300
+    groups = [rng.integers(0, 5, n), rng.integers(0, 4, n)]
+    debut = rng.integers(0, 600, n)
+    fin = debut + rng.integers(30, 180, n)
+    a, b = sweep(groups, debut, fin)
+    expected = brute_force_overlaps(groups, debut, fin)
+    # Chaque intervalle en conflit est signalé une fois, avec un intervalle qui le recouvre
+    assert set(a.tolist()) == {i for i, _ in expected}
+    assert len(a) == len(set(a.tolist()))
+    assert all((i, j) in expected for i, j in zip(a.tolist(), b.tolist()))
+
+
+def test_same_group_pairs():
+    etudiants = [7, 7, 8, 7]
+    jours = [1, 1, 1, 2]
+    debut = [600, 480, 480, 480]
+    c, d = same_group_pairs([etudiants, jours], debut)
+    assert list(zip(c.tolist(), d.tolist())) == [(0, 1)]
+
+
+def make_validator(inscriptions, surveillances):
+    examens = pd.DataFrame({
+        'examen_id': [1, 2, 3],
+        'lieu_id': [1, 1, 2],
+        'capacite_examen': [50, 50, 10],
+        'date_examen': pd.to_datetime([date(2025, 6, 2)] * 3),
+        'debut': [480, 540, 480],
+        'duree_minutes': [90, 90, 90],
+        'nb_inscrits': [40, 30, 12],
+    })
+    return ScheduleValidator(
+        examens,
+        pd.DataFrame(surveillances, columns=['examen_id', 'professeur_id']),
+        pd.DataFrame(inscriptions, columns=['examen_id', 'etudiant_id']),
+    )
+
+
+def test_validate():
+    validator = make_validator(
+        inscriptions=[(1, 100), (3, 100), (2, 101)],
+        surveillances=[(1, 200), (3, 200), (2, 201)],
+    )
+    result = validator.validate()
+    assert result['nb_examens'] == 3
+    assert result['resultats'] == {
+        'salle_chevauchement': 1,
+        'salle_capacite': 1,
+        'etudiant_chevauchement': 1,
+        'etudiant_meme_jour': 1,
+        'surveillant_chevauchement': 1,
+        'surveillant_max_jour': 0,
+    }
+    assert result['nb_violations'] == 5
+    rooms = [d for d in result['details'] if d['contrainte'] == 'salle_chevauchement']
+    assert (rooms[0]['examen_id'], rooms[0]['autre_examen_id']) == (2, 1)
+
+
+def test_validate_clean():
+    result = make_validator(inscriptions=[], surveillances=[]).validate()
+    assert result['resultats']['salle_chevauchement'] == 1
+    assert result['resultats']['etudiant_chevauchement'] == 0
+    assert result['resultats']['surveillant_chevauchement'] == 0
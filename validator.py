@@ -0,0 +1,377 @@
+"""Validation d'une version du planning
+
+Charge une fois les examens, surveillances et inscriptions d'une version
+puis vérifie chaque contrainte dure par tri et balayage (O(n log n)):
+
+- salle_chevauchement: deux examens dans la même salle dont les horaires
+  (heure_debut + duree_minutes) se recouvrent
+- salle_capacite: plus d'inscrits que la capacité d'examen de la salle
+- etudiant_meme_jour: un étudiant a plusieurs examens le même jour
+- etudiant_chevauchement: deux examens d'un étudiant se recouvrent
+- surveillant_chevauchement: un professeur surveille deux examens en même temps
+- surveillant_max_jour: plus de MAX_SURVEILLANCES_JOUR surveillances par jour
+
+Les résultats sont enregistrés (validations / validation_violations) pour
+les tableaux de bord. Après une génération, la validation est écrite dans
+la transaction qui publie la version.
+
+Usage: python validator.py [version_id ...]   (par défaut: versions publiées)
+"""
+import json
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+import psycopg2
+
+from domain import NOTE_VALIDATION
+from feasibility import MAX_SURVEILLANCES_JOUR
+from versions import PUBLICATION_CHANNEL
+
+# Lignes lues par aller-retour sur le curseur serveur des inscriptions
+FETCH_SIZE = 100000
+# Violations détaillées enregistrées par contrainte (les comptes sont complets)
+MAX_DETAILS = 200
+
+CONSTRAINTS = {
+    'salle_chevauchement': "Examens simultanés dans une salle",
+    'salle_capacite': "Salle trop petite",
+    'etudiant_meme_jour': "Étudiant: plusieurs examens le même jour",
+    'etudiant_chevauchement': "Étudiant: examens simultanés",
+    'surveillant_chevauchement': "Surveillant: surveillances simultanées",
+    'surveillant_max_jour': f"Surveillant: plus de {MAX_SURVEILLANCES_JOUR} surveillances / jour",
+}
+
+VALIDATIONS_DDL = """
+CREATE TABLE IF NOT EXISTS validations (
+    id SERIAL PRIMARY KEY,
+    version_id INTEGER NOT NULL REFERENCES planning_versions(id) ON DELETE CASCADE,
+    nb_examens INTEGER NOT NULL,
+    nb_violations INTEGER NOT NULL,
+    resultats JSONB NOT NULL, -- violations par contrainte
+    duree NUMERIC(8,3),
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+CREATE INDEX IF NOT EXISTS idx_validations_version ON validations(version_id);
+
+CREATE TABLE IF NOT EXISTS validation_violations (
+    id SERIAL PRIMARY KEY,
+    validation_id INTEGER NOT NULL REFERENCES validations(id) ON DELETE CASCADE,
+    contrainte VARCHAR(30) NOT NULL,
+    examen_id INTEGER,
+    autre_examen_id INTEGER,
+    etudiant_id INTEGER,
+    professeur_id INTEGER,
+    date_examen DATE,
+    detail TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_validation_violations_validation
+    ON validation_violations(validation_id);
+"""
+
+# Dernière validation de chaque version publiée
+LATEST_VALIDATIONS = """
+    SELECT DISTINCT ON (v.version_id)
+        v.id, v.version_id, p.annee_academique, p.session,
+        v.nb_examens, v.nb_violations, v.resultats, v.created_at
+    FROM validations v
+    JOIN plannings_publies p ON p.version_id = v.version_id
+    ORDER BY v.version_id, v.id DESC
+"""
+
+
+def ensure_schema(conn):
+    """Crée les tables de validation (idempotent)"""
+    cur = conn.cursor()
+    cur.execute("SELECT to_regclass('validation_violations') IS NOT NULL")
+    if not cur.fetchone()[0]:
+        cur.execute(VALIDATIONS_DDL)
+        conn.commit()
+    cur.close()
+
+
+def sweep(groups, debut, fin):
+    """Intervalles qui chevauchent un intervalle précédent du même groupe
+
+    `groups` est une liste de tableaux de clés (salle, jour...). Après un
+    tri par (groupes, début), un intervalle en recouvre un autre du groupe
+    si son début précède la plus grande fin vue jusque-là dans le groupe
+    (maximum cumulé remis à zéro à chaque groupe). Retourne les positions
+    (dans les tableaux d'entrée) des intervalles en conflit et de
+    l'intervalle précédent qui atteint cette fin.
+    """
+    n = len(debut)
+    if n < 2:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    order = np.lexsort([debut] + list(reversed(groups)))
+    keys = [np.asarray(g)[order] for g in groups]
+    start = np.asarray(debut, dtype=np.int64)[order]
+    end = np.asarray(fin, dtype=np.int64)[order]
+
+    new_group = np.ones(n, dtype=bool)
+    same = np.ones(n - 1, dtype=bool)
+    for key in keys:
+        same &= key[1:] == key[:-1]
+    new_group[1:] = ~same
+    group = np.cumsum(new_group) - 1
+
+    # Fin maximale cumulée par groupe, avec la position qui l'atteint:
+    # (groupe, fin, position) codés dans un entier croissant avec le groupe
+    span = int(end.max()) + 1
+    encoded = (group * span + end) * n + np.arange(n)
+    running = np.maximum.accumulate(encoded)
+    previous_end = (running // n) % span
+    previous_pos = running % n
+
+    conflict = np.zeros(n, dtype=bool)
+    conflict[1:] = same & (start[1:] < previous_end[:-1])
+    idx = np.flatnonzero(conflict)
+    return order[idx], order[previous_pos[idx - 1]]
+
+
+def same_group_pairs(groups, debut):
+    """Éléments précédés d'un élément du même groupe (tri par groupes, début)"""
+    n = len(debut)
+    if n < 2:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    order = np.lexsort([debut] + list(reversed(groups)))
+    same = np.ones(n - 1, dtype=bool)
+    for key in groups:
+        key = np.asarray(key)[order]
+        same &= key[1:] == key[:-1]
+    idx = np.flatnonzero(same) + 1
+    return order[idx], order[idx - 1]
+
+
+class ScheduleValidator:
+    """Contrôles d'une version chargée en tableaux numpy"""
+
+    def __init__(self, examens, surveillances, inscriptions):
+        # examens: DataFrame (examen_id, lieu_id, capacite_examen, date_examen,
+        # debut, duree_minutes, nb_inscrits); surveillances et inscriptions:
+        # DataFrames (examen_id, professeur_id) et (examen_id, etudiant_id)
+        self.examens = examens.sort_values('examen_id').reset_index(drop=True)
+        self.surveillances = surveillances
+        self.inscriptions = inscriptions
+        self.jour = self.examens['date_examen'].map(pd.Timestamp.toordinal).to_numpy(np.int64)
+        self.debut = self.examens['debut'].to_numpy(np.int64)
+        self.fin = self.debut + self.examens['duree_minutes'].to_numpy(np.int64)
+        self.ids = self.examens['examen_id'].to_numpy(np.int64)
+
+    @classmethod
+    def load(cls, conn, version_id):
+        """Charge une version (lecture cohérente, inscriptions en flux)
+
+        À appeler dans la transaction qui a écrit la version pour la
+        valider avant publication.
+        """
+        cur = conn.cursor()
+        cur.execute("""
+            SELECT e.id, e.lieu_id, l.capacite_examen, e.date_examen,
+                (EXTRACT(HOUR FROM e.heure_debut) * 60 + EXTRACT(MINUTE FROM e.heure_debut))::INTEGER,
+                e.duree_minutes, COALESCE(e.nb_inscrits, 0)
+            FROM examens e
+            JOIN lieux_examen l ON l.id = e.lieu_id
+            WHERE e.version_id = %s
+        """, (version_id,))
+        examens = pd.DataFrame(cur.fetchall(), columns=[
+            'examen_id', 'lieu_id', 'capacite_examen', 'date_examen', 'debut',
+            'duree_minutes', 'nb_inscrits'
+        ])
+        examens['date_examen'] = pd.to_datetime(examens['date_examen'])
+
+        cur.execute("""
+            SELECT a.examen_id, a.professeur_id
+            FROM affectations_surveillance a
+            JOIN examens e ON e.id = a.examen_id
+            WHERE e.version_id = %s
+        """, (version_id,))
+        surveillances = pd.DataFrame(cur.fetchall(), columns=['examen_id', 'professeur_id'])
+        cur.close()
+
+        # Étudiants convoqués: même règle que le chargement du problème
+        # (rattrapage: inscriptions ajournées seulement)
+        named = conn.cursor(name=f'validation_{version_id}')
+        named.itersize = FETCH_SIZE
+        named.execute("""
+            SELECT e.id, i.etudiant_id
+            FROM examens e
+            JOIN inscriptions i ON i.module_id = e.module_id
+                               AND i.annee_academique = e.annee_academique
+            WHERE e.version_id = %s
+              AND (e.session <> 'rattrapage' OR i.statut = 'ajourne' OR i.note < %s)
+        """, (version_id, NOTE_VALIDATION))
+        chunks = []
+        while True:
+            rows = named.fetchmany(FETCH_SIZE)
+            if not rows:
+                break
+            chunks.append(np.array(rows, dtype=np.int64))
+        named.close()
+        pairs = np.concatenate(chunks) if chunks else np.zeros((0, 2), dtype=np.int64)
+        inscriptions = pd.DataFrame({'examen_id': pairs[:, 0], 'etudiant_id': pairs[:, 1]})
+
+        return cls(examens, surveillances, inscriptions)
+
+    def _positions(self, examen_ids):
+        return np.searchsorted(self.ids, np.asarray(examen_ids, dtype=np.int64))
+
+    def _details(self, contrainte, a, b=None, person=None, person_key=None, detail=None):
+        """Premières violations sous forme de lignes pour validation_violations"""
+        rows = []
+        dates = self.examens['date_examen']
+        for k in range(min(len(a), MAX_DETAILS)):
+            rows.append({
+                'contrainte': contrainte,
+                'examen_id': int(self.ids[a[k]]),
+                'autre_examen_id': int(self.ids[b[k]]) if b is not None else None,
+                'etudiant_id': int(person[k]) if person_key == 'etudiant' else None,
+                'professeur_id': int(person[k]) if person_key == 'professeur' else None,
+                'date_examen': dates.iloc[a[k]].date(),
+                'detail': detail(k) if detail else None,
+            })
+        return rows
+
+    def check_rooms(self):
+        lieux = self.examens['lieu_id'].to_numpy(np.int64)
+        a, b = sweep([lieux, self.jour], self.debut, self.fin)
+        overlaps = self._details('salle_chevauchement', a, b)
+
+        nb = self.examens['nb_inscrits'].to_numpy(np.int64)
+        # Inscrits réels, qui peuvent avoir changé depuis la génération
+        if len(self.inscriptions):
+            counts = np.bincount(self._positions(self.inscriptions['examen_id']),
+                                 minlength=len(self.ids))
+            nb = np.maximum(nb, counts)
+        capacite = self.examens['capacite_examen'].to_numpy(np.int64)
+        over = np.flatnonzero(nb > capacite)
+        capacity = self._details('salle_capacite', over,
+                                 detail=lambda k: f"{nb[over[k]]} inscrits pour "
+                                                  f"{capacite[over[k]]} places")
+        return {'salle_chevauchement': len(a), 'salle_capacite': len(over)}, overlaps + capacity
+
+    def _check_people(self, pairs, column):
+        x = self._positions(pairs['examen_id'])
+        person = pairs[column].to_numpy(np.int64)
+        jour, debut, fin = self.jour[x], self.debut[x], self.fin[x]
+        a, b = sweep([person, jour], debut, fin)
+        return x, person, jour, debut, a, b
+
+    def check_students(self):
+        x, person, jour, debut, a, b = self._check_people(self.inscriptions, 'etudiant_id')
+        details = self._details('etudiant_chevauchement', x[a], x[b], person[a], 'etudiant')
+        c, d = same_group_pairs([person, jour], debut)
+        details += self._details('etudiant_meme_jour', x[c], x[d], person[c], 'etudiant')
+        return {'etudiant_chevauchement': len(a), 'etudiant_meme_jour': len(c)}, details
+
+    def check_supervisors(self):
+        x, person, jour, _, a, b = self._check_people(self.surveillances, 'professeur_id')
+        details = self._details('surveillant_chevauchement', x[a], x[b], person[a], 'professeur')
+
+        # Surveillances par (professeur, jour): tri puis longueurs des plages
+        order = np.lexsort([jour, person])
+        keys = np.stack([person[order], jour[order]])
+        boundaries = np.flatnonzero(np.any(keys[:, 1:] != keys[:, :-1], axis=0)) + 1
+        starts = np.concatenate([[0], boundaries]) if len(order) else np.zeros(0, dtype=np.int64)
+        counts = np.diff(np.append(starts, len(order)))
+        over = starts[counts > MAX_SURVEILLANCES_JOUR]
+        over_counts = counts[counts > MAX_SURVEILLANCES_JOUR]
+        details += self._details('surveillant_max_jour', x[order[over]], None,
+                                 person[order[over]], 'professeur',
+                                 detail=lambda k: f"{over_counts[k]} surveillances")
+        return ({'surveillant_chevauchement': len(a), 'surveillant_max_jour': len(over)},
+                details)
+
+    def validate(self):
+        """Comptes par contrainte et premières violations détaillées"""
+        start = time.perf_counter()
+        resultats = {}
+        details = []
+        for check in (self.check_rooms, self.check_students, self.check_supervisors):
+            counts, rows = check()
+            resultats.update(counts)
+            details.extend(rows)
+        return {
+            'nb_examens': len(self.ids),
+            'nb_violations': sum(resultats.values()),
+            'resultats': resultats,
+            'details': details,
+            'duree': round(time.perf_counter() - start, 3),
+        }
+
+
+def validate_version(conn, version_id):
+    """Charge et valide une version; retourne le résultat (non enregistré)"""
+    start = time.perf_counter()
+    result = ScheduleValidator.load(conn, version_id).validate()
+    result['version_id'] = version_id
+    result['duree'] = round(time.perf_counter() - start, 3)
+    return result
+
+
+def store_validation(cur, result):
+    """Enregistre une validation (sans commit); retourne son id
+
+    Les caches des tableaux de bord sont invalidés au commit, comme après
+    une publication.
+    """
+    cur.execute("""
+        INSERT INTO validations (version_id, nb_examens, nb_violations, resultats, duree)
+        VALUES (%s, %s, %s, %s, %s)
+        RETURNING id
+    """, (result['version_id'], result['nb_examens'], result['nb_violations'],
+          json.dumps(result['resultats']), result['duree']))
+    validation_id = cur.fetchone()[0]
+    if result['details']:
+        cur.executemany("""
+            INSERT INTO validation_violations (validation_id, contrainte, examen_id,
+                autre_examen_id, etudiant_id, professeur_id, date_examen, detail)
+            VALUES (%(validation_id)s, %(contrainte)s, %(examen_id)s, %(autre_examen_id)s,
+                %(etudiant_id)s, %(professeur_id)s, %(date_examen)s, %(detail)s)
+        """, [dict(row, validation_id=validation_id) for row in result['details']])
+    cur.execute("SELECT pg_notify(%s, %s)", (
+        PUBLICATION_CHANNEL, json.dumps({'validation': validation_id, 'departements': []})
+    ))
+    return validation_id
+
+
+def validate_published(conn, version_ids=None):
+    """Valide et enregistre les versions données (par défaut: publiées)"""
+    ensure_schema(conn)
+    cur = conn.cursor()
+    if not version_ids:
+        cur.execute("SELECT version_id FROM plannings_publies ORDER BY version_id")
+        version_ids = [row[0] for row in cur.fetchall()]
+    results = []
+    for version_id in version_ids:
+        result = validate_version(conn, version_id)
+        store_validation(cur, result)
+        results.append(result)
+    conn.commit()
+    cur.close()
+    return results
+
+
+def print_result(result):
+    print(f"\n=== VALIDATION VERSION {result['version_id']} ===")
+    print(f"  {result['nb_examens']} examens vérifiés en {result['duree']}s")
+    for contrainte, label in CONSTRAINTS.items():
+        print(f"  {label:50s} {result['resultats'][contrainte]}")
+    print(f"  Total: {result['nb_violations']} violations")
+
+
+if __name__ == "__main__":
+    DB_CONFIG = {
+        'dbname': 'examens_db',
+        'user': 'postgres',
+        'password': '5432',
+        'host': 'localhost',
+        'port': '5432'
+    }
+    conn = psycopg2.connect(**DB_CONFIG)
+    try:
+        for result in validate_published(conn, [int(arg) for arg in sys.argv[1:]]):
+            print_result(result)
+    finally:
+        conn.close()
@@ -0,0 +1,230 @@
+"""Versions du planning et publication atomique
+
+Chaque génération écrit ses examens dans une nouvelle version
+(`examens.version_id`), invisible tant qu'elle n'est pas publiée. La
+publication remplace le pointeur de `plannings_publies` pour l'année et
+la session dans une seule transaction: les lecteurs (vue
+`examens_publies`) voient l'ancienne version ou la nouvelle, jamais un
+planning partiel, et ne sont jamais bloqués.
+
+Chaque publication est annoncée sur le canal PUBLICATION_CHANNEL (NOTIFY,
+délivré au commit) pour que les processus applicatifs invalident leurs
+caches (voir cache_bus).
+"""
+import json
+
+# Canal NOTIFY des publications de planning
+PUBLICATION_CHANNEL = 'planning_publie'
+
+VERSIONS_DDL = """
+CREATE TABLE IF NOT EXISTS planning_versions (
+    id SERIAL PRIMARY KEY,
+    annee_academique VARCHAR(9) NOT NULL,
+    session VARCHAR(20) NOT NULL,
+    statut VARCHAR(20) NOT NULL DEFAULT 'brouillon', -- brouillon, publie, archive
+    nb_examens INTEGER DEFAULT 0,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    published_at TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS plannings_publies (
+    annee_academique VARCHAR(9) NOT NULL,
+    session VARCHAR(20) NOT NULL,
+    version_id INTEGER NOT NULL REFERENCES planning_versions(id),
+    precedente_id INTEGER REFERENCES planning_versions(id),
+    published_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (annee_academique, session)
+);
+
+ALTER TABLE examens ADD COLUMN IF NOT EXISTS
+    version_id INTEGER REFERENCES planning_versions(id) ON DELETE CASCADE;
+ALTER TABLE examens DROP CONSTRAINT IF EXISTS examens_module_id_session_annee_academique_key;
+CREATE UNIQUE INDEX IF NOT EXISTS idx_examens_version_module ON examens(version_id, module_id);
+
+CREATE OR REPLACE VIEW examens_publies AS
+SELECT e.*
+FROM examens e
+JOIN plannings_publies p ON p.version_id = e.version_id;
+"""
+
+
+def ensure_schema(conn):
+    """Crée les tables de versions sur une base existante (idempotent)
+
+    Les examens déjà présents sans version sont rattachés à une version
+    publiée par année / session. Rien n'est exécuté si le schéma est à
+    jour, pour ne pas prendre de verrou sur `examens`.
+    """
+    cur = conn.cursor()
+    cur.execute("""
+        SELECT to_regclass('plannings_publies') IS NOT NULL
+           AND EXISTS (SELECT 1 FROM information_schema.columns
+                       WHERE table_name = 'examens' AND column_name = 'version_id')
+    """)
+    if cur.fetchone()[0]:
+        cur.close()
+        return
+
+    cur.execute(VERSIONS_DDL)
+    cur.execute("""
+        SELECT DISTINCT annee_academique, session
+        FROM examens
+        WHERE version_id IS NULL
+    """)
+    for annee_academique, session in cur.fetchall():
+        version_id = create_version(cur, annee_academique, session)
+        cur.execute("""
+            UPDATE examens SET version_id = %s
+            WHERE version_id IS NULL AND annee_academique = %s AND session = %s
+        """, (version_id, annee_academique, session))
+        publish_version(cur, version_id)
+    conn.commit()
+    cur.close()
+
+
+def create_version(cur, annee_academique, session):
+    """Nouvelle version brouillon, retourne son id"""
+    cur.execute("""
+        INSERT INTO planning_versions (annee_academique, session)
+        VALUES (%s, %s)
+        RETURNING id
+    """, (annee_academique, session))
+    return cur.fetchone()[0]
+
+
+def publish_version(cur, version_id):
+    """Fait pointer la publication de l'année / session sur cette version
+
+    À exécuter dans la transaction qui a écrit la version: le changement
+    devient visible d'un coup au commit.
+    """
+    cur.execute("""
+        UPDATE planning_versions
+        SET nb_examens = (SELECT COUNT(*) FROM examens WHERE version_id = %s)
+        WHERE id = %s
+    """, (version_id, version_id))
+    cur.execute("""
+        INSERT INTO plannings_publies (annee_academique, session, version_id)
+        SELECT annee_academique, session, id
+        FROM planning_versions
+        WHERE id = %s
+        ON CONFLICT (annee_academique, session) DO UPDATE
+        SET precedente_id = plannings_publies.version_id,
+            version_id = EXCLUDED.version_id,
+            published_at = CURRENT_TIMESTAMP
+        RETURNING precedente_id
+    """, (version_id,))
+    previous_id = cur.fetchone()[0]
+    _set_status(cur, version_id, previous_id)
+    notify_publication(cur, version_id, previous_id)
+    return previous_id
+
+
+def rollback_publication(conn, annee_academique, session):
+    """Republie la version précédente (échange des deux pointeurs)"""
+    cur = conn.cursor()
+    try:
+        cur.execute("""
+            UPDATE plannings_publies
+            SET version_id = precedente_id,
+                precedente_id = version_id,
+                published_at = CURRENT_TIMESTAMP
+            WHERE annee_academique = %s AND session = %s AND precedente_id IS NOT NULL
+            RETURNING version_id, precedente_id
+        """, (annee_academique, session))
+        row = cur.fetchone()
+        if row is None:
+            conn.rollback()
+            return None
+
+        _set_status(cur, *row)
+        notify_publication(cur, *row)
+        conn.commit()
+        return row[0]
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+
+
+def _set_status(cur, published_id, archived_id):
+    cur.execute("""
+        UPDATE planning_versions
+        SET statut = CASE WHEN id = %s THEN 'publie' ELSE 'archive' END,
+            published_at = CASE WHEN id = %s THEN CURRENT_TIMESTAMP ELSE published_at END
+        WHERE id IN (%s, %s)
+    """, (published_id, published_id, published_id, archived_id))
+
+
+def notify_publication(cur, version_id, previous_id):
+    """Annonce la publication de `version_id` à la place de `previous_id`
+
+    La charge utile liste les départements dont des examens (module, salle,
+    date, heure, durée) diffèrent entre les deux versions. Le NOTIFY part
+    au commit de la transaction: jamais pour une publication annulée.
+    """
+    cur.execute("""
+        WITH nouveaux AS (
+            SELECT module_id, lieu_id, date_examen, heure_debut, duree_minutes
+            FROM examens WHERE version_id = %(new)s
+        ), anciens AS (
+            SELECT module_id, lieu_id, date_examen, heure_debut, duree_minutes
+            FROM examens WHERE version_id = %(old)s
+        )
+        SELECT DISTINCT f.dept_id
+        FROM ((SELECT * FROM nouveaux EXCEPT SELECT * FROM anciens)
+              UNION ALL
+              (SELECT * FROM anciens EXCEPT SELECT * FROM nouveaux)) d
+        JOIN modules m ON m.id = d.module_id
+        JOIN formations f ON f.id = m.formation_id
+        ORDER BY f.dept_id
+    """, {'new': version_id, 'old': previous_id})
+    departements = [row[0] for row in cur.fetchall()]
+    cur.execute("""
+        SELECT annee_academique, session FROM planning_versions WHERE id = %s
+    """, (version_id,))
+    annee_academique, session = cur.fetchone()
+    payload = json.dumps({
+        'annee_academique': annee_academique,
+        'session': session,
+        'version_id': version_id,
+        'precedente_id': previous_id,
+        'departements': departements,
+    })
+    cur.execute("SELECT pg_notify(%s, %s)", (PUBLICATION_CHANNEL, payload))
+
+
+def published_version(cur, annee_academique, session):
+    """Id de la version publiée (None si aucune)"""
+    cur.execute("""
+        SELECT version_id FROM plannings_publies
+        WHERE annee_academique = %s AND session = %s
+    """, (annee_academique, session))
+    row = cur.fetchone()
+    return row[0] if row else None
+
+
+def purge_versions(conn, annee_academique, session, keep=3):
+    """Supprime les versions archivées au-delà des `keep` plus récentes
+
+    Les versions publiée et précédente ainsi que les brouillons sont
+    toujours conservés.
+    """
+    cur = conn.cursor()
+    cur.execute("""
+        DELETE FROM planning_versions v
+        WHERE v.annee_academique = %s AND v.session = %s AND v.statut = 'archive'
+          AND NOT EXISTS (
+              SELECT 1 FROM plannings_publies p
+              WHERE v.id IN (p.version_id, p.precedente_id))
+          AND v.id NOT IN (
+              SELECT id FROM planning_versions
+              WHERE annee_academique = %s AND session = %s AND statut = 'archive'
+              ORDER BY id DESC
+              LIMIT %s)
+    """, (annee_academique, session, annee_academique, session, keep))
+    deleted = cur.rowcount
+    conn.commit()
+    cur.close()
+    return deleted